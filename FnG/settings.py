@@ -1,4 +1,5 @@
 
+import importlib.util
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,25 +40,118 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.profiling.ProfilingMiddleware',  # No-op unless REQUEST_PROFILING
+    'base.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'base.dbrouter.ReplicaMiddleware',  # No-op unless DATABASE_REPLICAS
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
 ]
 
+# Stateless mode authenticates bearer tokens from their role claims without
+# loading the user row. Tokens issued before it was enabled must be refreshed.
+STATELESS_JWT_AUTH = False
+ROLE_CACHE_TIMEOUT = 300  # Seconds another process may serve a cached role
+ROLE_CLAIMS_MAX_AGE = 300  # Seconds before token role claims are re-checked
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'base.authentication.StatelessJWTAuthentication' if STATELESS_JWT_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # Reverse proxies in front of the app that append to X-Forwarded-For. The
+    # throttles' client address is REMOTE_ADDR at 0; behind a proxy set the
+    # count, or clients can pick their own address.
+    'NUM_PROXIES': 0,
+}
+
+# Accept: application/msgpack on the DRF views when the optional msgpack
+# package is installed. The pre-rendered reference lists and async views
+# stay JSON.
+MSGPACK_RENDERER = importlib.util.find_spec('msgpack') is not None
+REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+    'rest_framework.renderers.JSONRenderer',
+    'rest_framework.renderers.BrowsableAPIRenderer',
+] + (['base.renderers.MessagePackRenderer'] if MSGPACK_RENDERER else [])
+
+# GET/HEAD responses of at least COMPRESSION_MIN_SIZE bytes are compressed
+# with brotli (when the optional brotli package is installed) or gzip,
+# whichever the client accepts.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11; higher is smaller but slower
+
+BULK_INGEST_BATCH_SIZE = 500  # Rows per bulk_create/transaction in NDJSON ingestion
+
+# Write-behind feedback: FeedbackAPIView answers 202 once the record is fsynced
+# to the spool and a background thread batch-inserts it into Feedback.
+FEEDBACK_WRITE_BEHIND = False
+FEEDBACK_SPOOL_DIR = BASE_DIR / 'spool' / 'feedback'
+FEEDBACK_SPOOL_FLUSH_INTERVAL = 1.0  # Seconds between flushes
+
+SEARCH_INDEX_MAX_AGE = 300  # Seconds before the in-memory (non-FTS5) search index is rebuilt
+
+DUPLICATE_THRESHOLD = 0.5  # Estimated Jaccard similarity that marks a new grievance as a duplicate
+DUPLICATE_INDEX_MAX_AGE = 300  # Seconds before an in-memory duplicate partition is reloaded
+
+REFERENCE_CACHE_TTL = 3600  # Seconds a process serves cached states/municipalities/departments
+
+# archive_grievances moves grievances CLOSED (and last updated) more than
+# ARCHIVE_AFTER_DAYS ago into the archive tables, ARCHIVE_BATCH_SIZE per
+# transaction.
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_BATCH_SIZE = 500
+
+GRIEVANCE_VERSION_TTL = 60  # Seconds a grievance-list change stamp lives; bounds cross-process staleness
+
+# Token-bucket throttling of submissions (base.throttling), checked before
+# authentication so floods cost no queries. 'N/period' allows bursts of N,
+# refilled at N per period. THROTTLE_ROUTES lists the throttled URL names
+# with overrides of the default rates (None turns a scope off), or the name of
+# a route whose buckets they share. The municipality scope is only charged
+# for requests with a valid bearer token; anonymous ones count against their
+# client address (see NUM_PROXIES).
+THROTTLE_ENABLED = True
+THROTTLE_BACKEND = 'local'  # 'cache' shares buckets between processes through CACHES['default']
+THROTTLE_SHARDS = 16
+THROTTLE_DEFAULT_RATES = {'user': '30/min', 'municipality': '600/min'}
+THROTTLE_ROUTES = {
+    'grievance_api': {},
+    'feedback_api': {},
+    'async_grievance_api': 'grievance_api',
+    'async_feedback_api': 'feedback_api',
+    'grievance_response_api': {'user': '120/min'},
+    'grievance_transitions_api': {'user': '60/min'},
+    'bulk_ingest_api': {'user': '10/min', 'municipality': None},
+}
+
+# Grievance status and response events: SSE at api/events/, long-poll at
+# api/events/poll/. The local hub serves one process; 'cache' shares events
+# through CACHES['default'], which must then be shared between processes.
+EVENTS_BACKEND = 'local'
+EVENTS_BUFFER_SIZE = 1000  # Events kept for Last-Event-ID resume
+EVENTS_TTL = 3600  # Seconds an event is kept by the cache backend
+EVENTS_POLL_INTERVAL = 0.5  # Seconds between cache backend checks for new events
+EVENTS_STREAM_TIMEOUT = 300  # Seconds before an SSE stream ends and the client reconnects
+EVENTS_HEARTBEAT = 15  # Seconds between keep-alive comments on an idle stream
+EVENTS_RETRY = 3  # Seconds EventSource waits before reconnecting
+EVENTS_POLL_TIMEOUT = 30  # Longest a long-poll request is held
+
+REQUEST_PROFILING = False  # Server-Timing headers and per-route metrics at api/admin/metrics/
+PROFILING_WINDOW = 300  # Seconds of samples behind the rolling latency quantiles
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'base.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_USER_CLASS': 'base.authentication.ClaimsUser',
 }
 
 CORS_ALLOW_ALL_ORIGINS = True  # Restrict in production
@@ -67,23 +161,52 @@ ACCOUNT_AUTHENTICATION_METHOD = 'email'
 ACCOUNT_SIGNUP_FIELDS = ['email*', 'password1*', 'password2*']
 ACCOUNT_EMAIL_VERIFICATION = 'none'
 
+# Development logs plain text to the console. With STRUCTURED_LOGGING the root
+# logger writes JSON lines to a size-rotated file from a background thread, so
+# a request only ever enqueues a record.
+STRUCTURED_LOGGING = not DEBUG
+LOG_FILE = BASE_DIR / 'logs' / 'fng.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer; beyond that they are dropped, never waited on
+LOG_LEVELS = {
+    '': 'INFO',
+    'django.request': 'WARNING',
+    'django.db.backends': 'INFO',  # DEBUG logs every SQL statement (only when DEBUG is on); sampled below
+    'base': 'INFO',
+}
+LOG_SAMPLE_RATES = {
+    'django.db.backends': 0.01,  # Fraction of records below WARNING that are kept
+    'django.server': 0.1,
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'C:/Cosmic/Project/FeedbackAndGrievance/debug.log',
-        },
+    'filters': {
+        'sample': {'()': 'base.logs.SamplingFilter', 'rates': LOG_SAMPLE_RATES},
+    },
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'base.logs.JSONFormatter'},
     },
-    'loggers': {
-        '': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
-            'propagate': True,
+    'handlers': {
+        'main': {
+            '()': 'base.logs.BackgroundRotatingFileHandler',
+            'filename': LOG_FILE,
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'json',
+            'filters': ['sample'],
+        } if STRUCTURED_LOGGING else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+            'filters': ['sample'],
         },
     },
+    'root': {'handlers': ['main'], 'level': LOG_LEVELS['']},
+    'loggers': {name: {'level': level} for name, level in LOG_LEVELS.items() if name},
 }
 
 ROOT_URLCONF = 'FnG.urls'
@@ -113,24 +236,6 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'FnG.wsgi.application'
 
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'C:/Cosmic/Project/FeedbackAndGrievance/debug.log',
-        },
-    },
-    'loggers': {
-        '': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-    },
-}
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -141,6 +246,47 @@ DATABASES = {
     }
 }
 
+# Production SQLite: WAL so reads never wait on the writer, IMMEDIATE
+# transactions so writers queue on busy_timeout instead of failing on a lock
+# upgrade, and persistent connections so the pragmas run once per connection.
+SQLITE_PRODUCTION = not DEBUG
+SQLITE_PRODUCTION_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 5,  # Seconds; sets busy_timeout
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=268435456;'
+        'PRAGMA cache_size=-32000;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+}
+if SQLITE_PRODUCTION:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+    })
+
+# Read replicas: aliases in DATABASES that serve safe-method requests to views
+# marked `replica_reads`. Users, groups and sessions are always read from the
+# primary. A local SQLite copy can stand in, refreshed with
+# `manage.py sync_sqlite_replica --interval 5`:
+#   DATABASES['replica'] = {
+#       'ENGINE': 'django.db.backends.sqlite3',
+#       'NAME': BASE_DIR / 'db-replica.sqlite3',
+#       'TEST': {'MIRROR': 'default'},
+#   }
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['base.dbrouter.ReplicaRouter']
+READ_AFTER_WRITE_PIN = 5  # Seconds a user's reads stay on the primary after they write
+
+# Serialized writer path for API writes (base.writer).
+DB_WRITE_LOCK_TIMEOUT = 10  # Seconds a write waits for the in-process writer lock before a 503
+DB_WRITE_RETRIES = 3  # Retries after "database is locked" from another process
+DB_WRITE_RETRY_DELAY = 0.05  # Seconds; doubled per retry, with jitter
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import State, Municipality, Department, Feedback, Grievance, GrievanceResponse, CustomUser
+from .models import (
+    State, District, Municipality, Department, Feedback, Grievance, GrievanceResponse, GrievanceTransition,
+    ArchivedGrievance, CustomUser,
+)
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -24,11 +27,33 @@ class StateAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
-class MunicipalityAdmin(admin.ModelAdmin):
+class DistrictAdmin(admin.ModelAdmin):
     list_display = ('name', 'state')
     search_fields = ('name',)
     list_filter = ('state',)
 
+class MunicipalityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'district', 'state')
+    search_fields = ('name',)
+    list_filter = ('state', 'district')
+
+class GrievanceTransitionAdmin(admin.ModelAdmin):
+    list_display = ('grievance', 'from_status', 'to_status', 'user', 'created')
+    list_filter = ('to_status',)
+    raw_id_fields = ('grievance', 'user')
+
+    def has_change_permission(self, request, obj=None):
+        return False  # Append-only audit
+
+class ArchivedGrievanceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'municipality', 'department', 'status', 'archived')
+    list_filter = ('municipality',)
+    search_fields = ('title',)
+    raw_id_fields = ('user',)
+
+    def has_change_permission(self, request, obj=None):
+        return False  # Written by archive_grievances only
+
 try:
     admin.site.unregister(CustomUser)
 except admin.sites.NotRegistered:
@@ -36,8 +61,11 @@ except admin.sites.NotRegistered:
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(State, StateAdmin)
+admin.site.register(District, DistrictAdmin)
 admin.site.register(Municipality, MunicipalityAdmin)
 admin.site.register(Department)
 admin.site.register(Feedback)
 admin.site.register(Grievance)
-admin.site.register(GrievanceResponse)
\ No newline at end of file
+admin.site.register(GrievanceResponse)
+admin.site.register(GrievanceTransition, GrievanceTransitionAdmin)
+admin.site.register(ArchivedGrievance, ArchivedGrievanceAdmin)
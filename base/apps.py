@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .spool import get_spool, write_behind_enabled
+
+        if write_behind_enabled():
+            get_spool().start()  # Replays segments left by a previous run
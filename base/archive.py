@@ -0,0 +1,86 @@
+import contextvars
+import datetime
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .dedup import get_duplicate_index
+from .models import (
+    ArchivedGrievance, ArchivedGrievanceResponse, ArchivedGrievanceTransition, Grievance, GrievanceResponse,
+    GrievanceTransition,
+)
+from .search import get_search_backend
+from .versions import bump_versions
+
+# Grievances CLOSED (last updated) more than ARCHIVE_AFTER_DAYS ago move to
+# the Archived* tables with their responses and transitions, keeping their
+# ids, so the hot tables and their indexes hold only live work. Detail reads
+# fall through to the archive; lists and exports read it on request.
+_archiving = contextvars.ContextVar('archiving', default=False)
+
+
+def archiving():
+    # True while archive_batch() deletes the rows it has copied, so
+    # base.signals treats the deletes as moves.
+    return _archiving.get()
+
+
+def archive_cutoff(days):
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def archivable(cutoff):
+    # A grievance another hot grievance still points at as its duplicate
+    # waits for that one, so duplicate_of never dangles into nothing.
+    waiting = Grievance.objects.filter(duplicate_of=OuterRef('pk')).exclude(status='CLOSED', updated__lt=cutoff)
+    return Grievance.objects.filter(status='CLOSED', updated__lt=cutoff).exclude(Exists(waiting))
+
+
+def archive_batch(cutoff, batch_size):
+    # Moves up to batch_size archivable grievances; returns how many. Must
+    # run in a transaction (serialized_write). Newest ids go first, so a
+    # duplicate moves no later than the grievance it duplicates and its
+    # duplicate_of is copied before the delete would clear it.
+    rows = archivable(cutoff).order_by('-id')
+    if connection.features.has_select_for_update:
+        rows = rows.select_for_update()
+    grievances = list(rows[:batch_size])
+    if not grievances:
+        return 0
+    ids = [g.pk for g in grievances]
+    now = timezone.now()
+    ArchivedGrievance.objects.bulk_create([
+        ArchivedGrievance(
+            id=g.pk, user_id=g.user_id, department_id=g.department_id, municipality_id=g.municipality_id,
+            title=g.title, description=g.description, created=g.created, updated=g.updated, status=g.status,
+            duplicate_of=g.duplicate_of_id, archived=now,
+        )
+        for g in grievances
+    ])
+    ArchivedGrievanceResponse.objects.bulk_create([
+        ArchivedGrievanceResponse(
+            id=r.pk, grievance_id=r.grievance_id, user_id=r.user_id, response=r.response,
+            created=r.created, updated=r.updated,
+        )
+        for r in GrievanceResponse.objects.filter(grievance_id__in=ids).iterator()
+    ])
+    ArchivedGrievanceTransition.objects.bulk_create([
+        ArchivedGrievanceTransition(
+            id=t.pk, grievance_id=t.grievance_id, user_id=t.user_id, from_status=t.from_status,
+            to_status=t.to_status, created=t.created,
+        )
+        for t in GrievanceTransition.objects.filter(grievance_id__in=ids).iterator()
+    ])
+
+    token = _archiving.set(True)
+    try:
+        Grievance.objects.filter(id__in=ids).delete()  # Cascades to the responses, transitions and signatures
+    finally:
+        _archiving.reset(token)
+    get_search_backend().remove(ids)
+    index = get_duplicate_index()
+    for pk in ids:
+        index.remove(pk)
+    bump_versions({g.municipality_id for g in grievances}, {g.user_id for g in grievances})
+    return len(ids)
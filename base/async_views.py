@@ -0,0 +1,348 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied as DjangoPermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import async_authentication
+from .events import get_event_hub
+from .filters import (
+    expand_grievances, expand_param, fieldset_param, filter_grievances, flag_param, int_param, only_fieldset,
+    only_grievance_fieldset,
+)
+from .models import ArchivedGrievance, Department, Grievance, Municipality, State
+from .pagination import KeysetPagination
+from .permissions import AsyncIsAuthenticated, AsyncIsOfficialForMunicipality
+from .refcache import cached_response, reference_cache
+from .roles import aget_role
+from .serializers import (
+    DepartmentSerializer, FeedbackSerializer, GrievanceSerializer, MunicipalitySerializer, StateSerializer,
+)
+from .throttling import check_throttles
+from .spool import get_spool, write_behind_enabled
+from .versions import apply_validators, validators
+from .views import scoped_grievances
+from .writer import aserialized_write
+
+# Async counterparts of the hot endpoints in base.views, served under
+# /api/async/. Under ASGI a request here holds no thread while it waits on the
+# client; queries run through Django's async ORM. Only bearer tokens are
+# accepted (no session authentication).
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+class AsyncAPIView(View):
+    # The parts of APIView these endpoints use: throttling, token
+    # authentication, async permission classes, request parsing and
+    # APIException handling.
+    permission_classes = [AsyncIsAuthenticated]
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        self.request = request
+        self.authenticator = async_authentication()
+        try:
+            check_throttles(request, kwargs)
+            await self.initial(request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            return await handler(request, *args, **kwargs)
+        except (exceptions.APIException, Http404, DjangoPermissionDenied) as exc:
+            return self.handle_exception(exc)
+
+    async def initial(self, request):
+        result = await self.authenticator.aauthenticate(request)
+        request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+        for permission_class in self.permission_classes:
+            if not await permission_class().has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound()
+        elif isinstance(exc, DjangoPermissionDenied):
+            exc = exceptions.PermissionDenied()
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = json_response(data, exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = self.authenticator.authenticate_header(self.request)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(exc.wait)
+        return response
+
+
+async def preload_related(data):
+    # The payload's municipality and department, fetched up front so the
+    # serializer validates them without a synchronous query.
+    preloaded = {}
+    for field, model in (('municipality', Municipality), ('department', Department)):
+        preloaded[model] = {}
+        try:
+            pk = int(data.get(field))
+        except (TypeError, ValueError):
+            continue  # The serializer reports it
+        try:
+            preloaded[model][pk] = await model.objects.aget(pk=pk)
+        except model.DoesNotExist:
+            pass
+    return preloaded
+
+
+class AsyncStateListView(AsyncAPIView):
+    replica_reads = True
+
+    async def get(self, request):
+        fieldset = fieldset_param(request.query_params, StateSerializer)
+
+        async def load():
+            states = only_fieldset(State.objects.all(), fieldset)
+            return StateSerializer([state async for state in states], many=True, context={'fields': fieldset}).data
+
+        return cached_response(request, await reference_cache.aget(('states', fieldset), load))
+
+
+class AsyncMunicipalityListView(AsyncAPIView):
+    replica_reads = True
+
+    async def get(self, request):
+        params = request.query_params
+        state_id, district_id = int_param(params, 'state'), int_param(params, 'district')
+        fieldset = fieldset_param(params, MunicipalitySerializer)
+
+        async def load():
+            queryset = only_fieldset(Municipality.objects.all(), fieldset)
+            if state_id is not None:
+                queryset = queryset.filter(state_id=state_id)
+            if district_id is not None:
+                queryset = queryset.filter(district_id=district_id)
+            municipalities = [municipality async for municipality in queryset]
+            return MunicipalitySerializer(municipalities, many=True, context={'fields': fieldset}).data
+
+        key = ('municipalities', state_id, district_id, fieldset)
+        return cached_response(request, await reference_cache.aget(key, load))
+
+
+class AsyncMunicipalityDepartmentsView(AsyncAPIView):
+    replica_reads = True
+
+    async def get(self, request, pk):
+        fieldset = fieldset_param(request.query_params, DepartmentSerializer)
+
+        async def load():
+            if not await Municipality.objects.filter(pk=pk).aexists():
+                return None
+            departments = only_fieldset(Department.objects.filter(municipalities=pk).order_by('name', 'id'), fieldset)
+            return DepartmentSerializer(
+                [department async for department in departments], many=True, context={'fields': fieldset},
+            ).data
+
+        response = cached_response(request, await reference_cache.aget(('departments', pk, fieldset), load))
+        if response is None:
+            raise exceptions.NotFound()
+        return response
+
+
+class AsyncUserProfileView(AsyncAPIView):
+    replica_reads = True
+
+    async def get(self, request):
+        user = request.user
+        role = await aget_role(request)
+        return json_response({
+            'username': user.username,
+            'email': user.email,
+            'is_official': role.is_official,
+            'municipality': role.municipality_id,
+            'municipality_name': role.municipality_name,
+        })
+
+
+class AsyncGrievanceListView(AsyncAPIView):
+    # GrievanceListAPIView: same scoping, filters, ?expand=, keyset pages and
+    # conditional responses.
+    permission_classes = [AsyncIsOfficialForMunicipality]
+    replica_reads = True
+
+    async def get(self, request):
+        role = await aget_role(request)  # Memoised, so scoped_grievances() needs no query
+        if role.is_official and role.municipality_id:
+            etag, last_modified = validators('m', role.municipality_id, request)
+        else:
+            etag, last_modified = validators('u', request.user.pk, request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return apply_validators(not_modified, etag, last_modified)
+
+        params = request.query_params
+        expand = expand_param(params)
+        fieldset = fieldset_param(params, GrievanceSerializer)
+        models = [Grievance, ArchivedGrievance] if flag_param(params, 'include_archived') else [Grievance]
+        querysets = [
+            only_grievance_fieldset(
+                expand_grievances(filter_grievances(scoped_grievances(request, model), params), expand), fieldset, expand,
+            )
+            for model in models
+        ]
+        context = {'request': request, 'view': self, 'expand': expand, 'fields': fieldset}
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_querysets(querysets, request, self)
+        if page is None:
+            rows = [grievance for queryset in querysets async for grievance in queryset]
+            rows = sorted(rows, key=lambda row: row.pk) if len(querysets) > 1 else rows
+        else:
+            rows = page
+        data = GrievanceSerializer(rows, many=True, context=context).data
+        if len(querysets) > 1:
+            for row, item in zip(rows, data):
+                item['archived'] = isinstance(row, ArchivedGrievance)
+        if page is not None:
+            data = paginator.get_paginated_response(data).data
+        return apply_validators(json_response(data), etag, last_modified)
+
+
+class AsyncGrievanceCreateView(AsyncAPIView):
+    async def post(self, request, municipality_id, department_id):
+        context = {
+            'request': request, 'view': self, 'preloaded': await preload_related(request.data),
+            'fields': fieldset_param(request.query_params, GrievanceSerializer),
+        }
+        serializer = GrievanceSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        # Not acreate(): the search entry and duplicate link must commit with
+        # the row, on the writer path.
+        await aserialized_write(serializer.save, user_id=request.user.pk)
+        return json_response(serializer.data, status.HTTP_201_CREATED)
+
+
+class AsyncFeedbackCreateView(AsyncAPIView):
+    async def post(self, request, municipality_id, department_id):
+        context = {
+            'request': request, 'view': self, 'preloaded': await preload_related(request.data),
+            'fields': fieldset_param(request.query_params, FeedbackSerializer),
+        }
+        serializer = FeedbackSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        if not write_behind_enabled():
+            await aserialized_write(serializer.save, user_id=request.user.pk)
+            return json_response(serializer.data, status.HTTP_201_CREATED)
+        data = serializer.validated_data
+        # The fsync runs off the event loop; it needs no database connection.
+        provisional_id = await sync_to_async(get_spool().append, thread_sensitive=False)({
+            'user_id': request.user.pk,
+            'municipality_id': data['municipality'].pk,
+            'department_id': data['department'].pk,
+            'rating': data['rating'],
+            'comment': data['comment'],
+        })
+        return json_response(
+            dict(serializer.data, id=None, user=request.user.pk, provisional_id=provisional_id),
+            status.HTTP_202_ACCEPTED,
+        )
+
+
+async def event_channels(request):
+    role = await aget_role(request)
+    channels = {f'u:{request.user.pk}'}
+    if role.is_official and role.municipality_id:
+        channels.add(f'm:{role.municipality_id}')
+    return channels
+
+
+def last_event_id(request):
+    # Last-Event-ID is what EventSource sends when it reconnects.
+    value = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise exceptions.ValidationError({'last_event_id': 'Must be an integer event id.'})
+
+
+def event_json(event):
+    return {'id': event.id, 'type': event.type, 'data': event.data}
+
+
+class AsyncGrievanceEventStreamView(AsyncAPIView):
+    # Server-Sent Events: grievance.status and grievance.response for the
+    # user's own grievances and, for officials, their municipality. A
+    # `reset` event means events were missed and the list should be
+    # reloaded. The stream ends after EVENTS_STREAM_TIMEOUT seconds (or a
+    # shorter ?timeout=) and the client reconnects with Last-Event-ID.
+    async def get(self, request):
+        channels = await event_channels(request)
+        duration = getattr(settings, 'EVENTS_STREAM_TIMEOUT', 300)
+        timeout = int_param(request.query_params, 'timeout')
+        if timeout is not None:
+            duration = max(0, min(timeout, duration))
+        stream = self.stream(channels, last_event_id(request), duration)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx holding events back
+        return response
+
+    def format(self, event_id, type, data):
+        return f'id: {event_id}\nevent: {type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+    async def stream(self, channels, last_id, duration):
+        hub = get_event_hub()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+        yield f'retry: {int(getattr(settings, "EVENTS_RETRY", 3) * 1000)}\n\n'
+        if last_id is None:
+            last_id = hub.cursor()
+            yield self.format(last_id, 'ready', {})
+        while (remaining := deadline - loop.time()) > 0:
+            batch = await hub.wait(last_id, channels, min(heartbeat, remaining))
+            if batch.missed:
+                yield self.format(batch.cursor, 'reset', {})
+            for event in batch.events:
+                yield self.format(event.id, event.type, event.data)
+            if not batch.events and not batch.missed:
+                yield ': keep-alive\n\n'
+            last_id = batch.cursor
+
+
+class AsyncGrievanceEventPollView(AsyncAPIView):
+    # Long-poll form of the event stream for clients without SSE. Answers as
+    # soon as there are events after ?last_event_id=, or after ?timeout=
+    # seconds (at most EVENTS_POLL_TIMEOUT) with none.
+    async def get(self, request):
+        channels = await event_channels(request)
+        hub = get_event_hub()
+        last_id = last_event_id(request)
+        if last_id is None:
+            return json_response({'events': [], 'last_event_id': hub.cursor(), 'reset': False})
+        limit = getattr(settings, 'EVENTS_POLL_TIMEOUT', 30)
+        timeout = int_param(request.query_params, 'timeout')
+        timeout = limit if timeout is None else max(0, min(timeout, limit))
+        batch = await hub.wait(last_id, channels, timeout)
+        return json_response({
+            'events': [event_json(event) for event in batch.events],
+            'last_event_id': batch.cursor,
+            'reset': batch.missed,
+        })
@@ -0,0 +1,144 @@
+import base64
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .roles import Role, aload_role, get_user_role, load_role, role_changed_at
+
+
+def role_claims(user):
+    role = get_user_role(user)
+    return {
+        'username': user.get_username(),
+        'email': user.email,
+        'is_staff': user.is_staff,
+        'is_official': role.is_official,
+        'municipality_id': role.municipality_id,
+        'municipality_name': role.municipality_name,
+        'role_version': time.time(),  # When these claims were resolved
+    }
+
+
+def unverified_user_id(request):
+    # The user id claim of a bearer token, read without checking the
+    # signature. Only for decisions that are harmless to get wrong, such as
+    # which database serves a read.
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(parts) != 2 or parts[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        payload = parts[1].split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+    return claims.get(api_settings.USER_ID_CLAIM) if isinstance(claims, dict) else None
+
+
+class ClaimsUser(TokenUser):
+    @cached_property
+    def is_staff(self):
+        return bool(self.token.get('is_staff', False))
+
+    @cached_property
+    def claims_role(self):
+        return Role(
+            bool(self.token.get('is_official', False)),
+            self.token.get('municipality_id'),
+            self.token.get('municipality_name'),
+        )
+
+
+class AsyncAuthenticationMixin:
+    # authenticate() for Django async views: the same header and token checks
+    # (CPU only), with the user loaded by aget_user().
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class AsyncJWTAuthentication(AsyncAuthenticationMixin, JWTAuthentication):
+    async def aget_user(self, validated_token):
+        from .models import CustomUser
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        user = await CustomUser.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
+
+
+class StatelessJWTAuthentication(AsyncAuthenticationMixin, JWTStatelessUserAuthentication):
+    # Builds the user from role claims instead of loading the CustomUser row.
+    # Claims are rejected once this process knows the role changed after they
+    # were issued, and re-checked against the database (once per token per
+    # window) when they are older than ROLE_CLAIMS_MAX_AGE.
+    def get_user(self, validated_token):
+        user, window = self.claims_user(validated_token)
+        if window is not None:
+            self.verify_claims(user, validated_token, window)
+        return user
+
+    async def aget_user(self, validated_token):
+        user, window = self.claims_user(validated_token)
+        if window is not None:
+            await self.averify_claims(user, validated_token, window)
+        return user
+
+    def claims_user(self, validated_token):
+        # The user, and the verification window if the claims need a check.
+        if 'role_version' not in validated_token:
+            raise AuthenticationFailed('Token carries no role claims', code='no_role_claims')
+        user = ClaimsUser(validated_token)
+        issued = validated_token['role_version']
+        changed = role_changed_at(user.id)
+        if changed is not None and changed > issued:
+            raise AuthenticationFailed('Token role claims are stale', code='stale_role_claims')
+        window = getattr(settings, 'ROLE_CLAIMS_MAX_AGE', 300)
+        return user, (window if time.time() - issued > window else None)
+
+    def verify_claims(self, user, validated_token, window):
+        from .models import CustomUser
+
+        key = f'role:verified:{validated_token[api_settings.JTI_CLAIM]}'
+        if cache.get(key):
+            return
+        db_user = CustomUser.objects.filter(pk=user.id, is_active=True).first()
+        if db_user is None or db_user.is_staff != user.is_staff or load_role(db_user) != user.claims_role:
+            raise AuthenticationFailed('Token role claims are stale', code='stale_role_claims')
+        cache.set(key, True, window)
+
+    async def averify_claims(self, user, validated_token, window):
+        from .models import CustomUser
+
+        key = f'role:verified:{validated_token[api_settings.JTI_CLAIM]}'
+        if cache.get(key):
+            return
+        db_user = await CustomUser.objects.filter(pk=user.id, is_active=True).afirst()
+        if db_user is None or db_user.is_staff != user.is_staff or await aload_role(db_user) != user.claims_role:
+            raise AuthenticationFailed('Token role claims are stale', code='stale_role_claims')
+        cache.set(key, True, window)
+
+
+def async_authentication():
+    # The async counterpart of the configured JWT authentication class.
+    if getattr(settings, 'STATELESS_JWT_AUTH', False):
+        return StatelessJWTAuthentication()
+    return AsyncJWTAuthentication()
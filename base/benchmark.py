@@ -0,0 +1,405 @@
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import compression, renderers
+from .models import CustomUser, Department, Feedback, Grievance, GrievanceResponse, Municipality, State
+from .roles import OFFICIALS_GROUP
+from .serializers import RoleTokenObtainPairSerializer
+from .signals import bulk_created
+
+PASSWORD = 'benchmark-password'
+WORDS = (
+    'water', 'supply', 'road', 'pothole', 'streetlight', 'garbage', 'drain', 'school',
+    'bridge', 'electricity', 'bus', 'ward', 'office', 'permit', 'tax', 'clinic',
+)
+
+# name: label used in reports and baselines
+# route: URL name in base/urls.py the endpoint exercises
+# user: 'official', 'citizen', 'admin' or None for anonymous
+# build: (dataset, i) -> (path, client kwargs) for the i-th request
+Endpoint = namedtuple('Endpoint', ['name', 'route', 'method', 'user', 'build'])
+
+_serial = itertools.count()
+
+
+def _ndjson(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+def _cycle(values, i):
+    return values[i % len(values)]
+
+
+# Reads first so the writes that follow don't change what they measure.
+PLAN = [
+    Endpoint('api_root', 'api-root', 'get', 'citizen', lambda ds, i: ('/api/', {})),
+    Endpoint('states', 'state-list', 'get', 'citizen', lambda ds, i: ('/api/states/', {})),
+    Endpoint('state_detail', 'state-detail', 'get', 'citizen',
+             lambda ds, i: (f'/api/states/{_cycle(ds.state_ids, i)}/', {})),
+    Endpoint('municipalities', 'municipality-list', 'get', 'citizen', lambda ds, i: ('/api/municipalities/', {})),
+    Endpoint('municipality_detail', 'municipality-detail', 'get', 'citizen',
+             lambda ds, i: (f'/api/municipalities/{_cycle(ds.municipality_ids, i)}/', {})),
+    Endpoint('municipality_departments', 'municipality-departments', 'get', 'citizen',
+             lambda ds, i: (f'/api/municipalities/{_cycle(ds.municipality_ids, i)}/departments/', {})),
+    Endpoint('user_profile', 'user_profile', 'get', 'official', lambda ds, i: ('/api/user/profile/', {})),
+    Endpoint('grievance_list', 'grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/', {'data': {'page_size': 100}})),
+    Endpoint('grievance_list_expanded', 'grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/', {'data': {'page_size': 100, 'expand': 'responses,department,municipality'}})),
+    Endpoint('grievance_list_sparse', 'grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/', {'data': {'page_size': 100, 'fields': 'id,title,status'}})),
+    Endpoint('grievance_list_archived', 'grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/', {'data': {'page_size': 100, 'include_archived': 'true'}})),
+    Endpoint('grievance_list_citizen', 'grievance_list_api', 'get', 'citizen', lambda ds, i: ('/api/grievances/', {})),
+    Endpoint('grievance_detail', 'grievance_detail_api', 'get', 'official',
+             lambda ds, i: (f'/api/grievances/{_cycle(ds.official_grievance_ids, i)}/', {})),
+    Endpoint('grievance_search', 'grievance_search_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/search/', {'data': {'q': f'{_cycle(WORDS, i)} {_cycle(WORDS, i + 3)[:3]}'}})),
+    Endpoint('grievance_duplicates', 'grievance_duplicates_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/duplicates/', {})),
+    Endpoint('grievance_export', 'grievance_export_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/export/csv/', {})),
+    Endpoint('feedback_export', 'feedback_export_api', 'get', 'official',
+             lambda ds, i: ('/api/feedback/export/ndjson/', {})),
+    Endpoint('grievance_dashboard', 'grievance_dashboard_api', 'get', 'official',
+             lambda ds, i: ('/api/grievances/dashboard/', {})),
+    Endpoint('feedback_stats', 'feedback_stats_api', 'get', 'official', lambda ds, i: ('/api/feedback/stats/', {})),
+    Endpoint('feedback_spool_metrics', 'feedback_spool_metrics', 'get', 'admin',
+             lambda ds, i: ('/api/admin/feedback-spool/', {})),
+    Endpoint('metrics', 'metrics', 'get', 'admin', lambda ds, i: ('/api/admin/metrics/', {})),
+    Endpoint('async_states', 'async_state_list', 'get', 'citizen', lambda ds, i: ('/api/async/states/', {})),
+    Endpoint('async_municipalities', 'async_municipality_list', 'get', 'citizen',
+             lambda ds, i: ('/api/async/municipalities/', {})),
+    Endpoint('async_municipality_departments', 'async_municipality_departments', 'get', 'citizen',
+             lambda ds, i: (f'/api/async/municipalities/{_cycle(ds.municipality_ids, i)}/departments/', {})),
+    Endpoint('async_user_profile', 'async_user_profile', 'get', 'official', lambda ds, i: ('/api/async/user/profile/', {})),
+    Endpoint('async_grievance_list', 'async_grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/async/grievances/', {'data': {'page_size': 100}})),
+    Endpoint('async_grievance_list_expanded', 'async_grievance_list_api', 'get', 'official',
+             lambda ds, i: ('/api/async/grievances/', {'data': {'page_size': 100, 'expand': 'responses,department,municipality'}})),
+    Endpoint('grievance_events', 'grievance_events', 'get', 'official', lambda ds, i: ('/api/events/', {'data': {'timeout': 0}})),
+    Endpoint('grievance_events_poll', 'grievance_events_poll', 'get', 'official',
+             lambda ds, i: ('/api/events/poll/', {'data': {'last_event_id': 0, 'timeout': 0}})),
+    Endpoint('token_obtain', 'token_obtain_pair', 'post', None,
+             lambda ds, i: ('/api/token/', {'data': {'username': _cycle(ds.citizen_names, i), 'password': PASSWORD}})),
+    Endpoint('token_refresh', 'token_refresh', 'post', None,
+             lambda ds, i: ('/api/token/refresh/', {'data': {'refresh': ds.refresh_token}})),
+    Endpoint('register', 'register', 'post', None, lambda ds, i: ('/api/register/', {'data': {
+        'username': f'bench-new-{next(_serial)}', 'email': 'new@example.com', 'dob': '1990-01-01',
+        'password1': PASSWORD, 'password2': PASSWORD, 'address': 'Ward 1', 'contact': '9800000000',
+    }})),
+    Endpoint('feedback_create', 'feedback_api', 'post', 'citizen', lambda ds, i: (
+        f'/api/municipalities/{ds.municipality_ids[0]}/departments/{ds.department_ids[0]}/feedback/',
+        {'data': {'rating': i % 5 + 1, 'comment': 'benchmark', 'municipality': ds.municipality_ids[0], 'department': ds.department_ids[0]}},
+    )),
+    Endpoint('grievance_create', 'grievance_api', 'post', 'citizen', lambda ds, i: (
+        f'/api/municipalities/{ds.municipality_ids[0]}/departments/{ds.department_ids[0]}/grievance/',
+        {'data': {'title': f'{_cycle(WORDS, i)} problem', 'description': ds.text(i),
+                  'municipality': ds.municipality_ids[0], 'department': ds.department_ids[0]}},
+    )),
+    Endpoint('async_feedback_create', 'async_feedback_api', 'post', 'citizen', lambda ds, i: (
+        f'/api/async/municipalities/{ds.municipality_ids[0]}/departments/{ds.department_ids[0]}/feedback/',
+        {'data': {'rating': i % 5 + 1, 'comment': 'benchmark', 'municipality': ds.municipality_ids[0], 'department': ds.department_ids[0]}},
+    )),
+    Endpoint('async_grievance_create', 'async_grievance_api', 'post', 'citizen', lambda ds, i: (
+        f'/api/async/municipalities/{ds.municipality_ids[0]}/departments/{ds.department_ids[0]}/grievance/',
+        {'data': {'title': f'{_cycle(WORDS, i)} problem', 'description': ds.text(i),
+                  'municipality': ds.municipality_ids[0], 'department': ds.department_ids[0]}},
+    )),
+    Endpoint('grievance_respond', 'grievance_response_api', 'post', 'official', lambda ds, i: (
+        f'/api/grievances/{_cycle(ds.official_grievance_ids, i)}/respond/',
+        {'data': {'grievance': _cycle(ds.official_grievance_ids, i), 'response': 'Looking into it.'}},
+    )),
+    # Each pass over the open grievances takes one allowed step: OPEN -> IN_PROGRESS -> RESOLVED -> IN_PROGRESS ...
+    Endpoint('grievance_status', 'grievance_status_update_api', 'patch', 'official', lambda ds, i: (
+        f'/api/grievances/{_cycle(ds.official_open_ids, i)}/status/',
+        {'data': {'status': ('IN_PROGRESS', 'RESOLVED')[i // len(ds.official_open_ids) % 2]}},
+    )),
+    Endpoint('grievance_transitions', 'grievance_transitions_api', 'post', 'official', lambda ds, i: (
+        '/api/grievances/transitions/',
+        {'data': {'ids': ds.official_grievance_ids[:100], 'status': _cycle(('IN_PROGRESS', 'RESOLVED'), i)}, 'format': 'json'},
+    )),
+    Endpoint('grievance_duplicates_resolve', 'grievance_duplicates_resolve_api', 'post', 'official', lambda ds, i: (
+        f'/api/grievances/{_cycle(ds.official_grievance_ids, i)}/duplicates/resolve/', {'data': {'status': 'IN_PROGRESS'}},
+    )),
+    Endpoint('bulk_ingest', 'bulk_ingest_api', 'post', 'official', lambda ds, i: ('/api/bulk/feedback/', {
+        'data': _ndjson(
+            {'rating': n % 5 + 1, 'comment': 'bulk', 'municipality': ds.municipality_ids[0], 'department': ds.department_ids[0]}
+            for n in range(50)
+        ),
+        'content_type': 'application/x-ndjson',
+    })),
+]
+
+
+def route_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def uncovered_routes():
+    from . import urls
+
+    return sorted(route_names(urls.urlpatterns) - {endpoint.route for endpoint in PLAN})
+
+
+class Dataset:
+    # Ids and users the endpoint builders draw from.
+    def text(self, i):
+        rng = random.Random(i)
+        return ' '.join(rng.choice(WORDS) for _ in range(12))
+
+
+def seed(states=2, municipalities=5, departments=5, citizens=50, officials=1,
+         grievances=2000, responses=2, feedback=2000, random_seed=0):
+    # Builds the synthetic dataset with bulk inserts. Sends bulk_created so the
+    # search index, duplicate signatures and rollups match what the API writes.
+    rng = random.Random(random_seed)
+    ds = Dataset()
+    password = make_password(PASSWORD)  # Hashed once; hashing per user dominates seeding otherwise
+
+    with transaction.atomic():
+        state_rows = State.objects.bulk_create([State(name=f'State {n}') for n in range(states)])
+        municipality_rows = Municipality.objects.bulk_create([
+            Municipality(name=f'Municipality {s.pk}-{n}', state=s) for s in state_rows for n in range(municipalities)
+        ])
+        department_rows = Department.objects.bulk_create([Department(name=f'Department {n}') for n in range(departments)])
+        Department.municipalities.through.objects.bulk_create([
+            Department.municipalities.through(department_id=d.pk, municipality_id=m.pk)
+            for d in department_rows for m in municipality_rows
+        ])
+
+        citizen_rows = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-citizen-{n}', email=f'citizen{n}@example.com', password=password)
+            for n in range(citizens)
+        ])
+        official_rows = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-official-{m.pk}-{n}', email=f'official{m.pk}.{n}@example.com',
+                       password=password, municipality=m)
+            for m in municipality_rows for n in range(officials)
+        ])
+        group, _ = Group.objects.get_or_create(name=OFFICIALS_GROUP)
+        CustomUser.groups.through.objects.bulk_create([
+            CustomUser.groups.through(customuser_id=user.pk, group_id=group.pk) for user in official_rows
+        ])
+        admin = CustomUser.objects.create(username='bench-admin', password=password, is_staff=True, is_superuser=True)
+
+        grievance_rows = Grievance.objects.bulk_create([
+            Grievance(
+                title=f'{rng.choice(WORDS)} {rng.choice(WORDS)}',
+                description=' '.join(rng.choice(WORDS) for _ in range(12)),
+                municipality=rng.choice(municipality_rows),
+                department=rng.choice(department_rows),
+                user=rng.choice(citizen_rows),
+                status=rng.choice(('OPEN', 'OPEN', 'IN_PROGRESS', 'RESOLVED')),
+            )
+            for _ in range(grievances)
+        ], batch_size=1000)
+        bulk_created.send(sender=Grievance, instances=grievance_rows)
+
+        officials_by_municipality = {user.municipality_id: user for user in official_rows}
+        GrievanceResponse.objects.bulk_create([
+            GrievanceResponse(grievance=g, user=officials_by_municipality[g.municipality_id], response=f'Reply {n}')
+            for g in grievance_rows for n in range(responses)
+        ], batch_size=1000)
+
+        feedback_rows = Feedback.objects.bulk_create([
+            Feedback(
+                rating=rng.randint(1, 5), comment='synthetic',
+                municipality=rng.choice(municipality_rows),
+                department=rng.choice(department_rows),
+                user=rng.choice(citizen_rows),
+            )
+            for _ in range(feedback)
+        ], batch_size=1000)
+        bulk_created.send(sender=Feedback, instances=feedback_rows)
+
+    ds.state_ids = [s.pk for s in state_rows]
+    ds.municipality_ids = [m.pk for m in municipality_rows]
+    ds.department_ids = [d.pk for d in department_rows]
+    ds.citizen_names = [u.username for u in citizen_rows]
+    ds.users = {
+        'official': officials_by_municipality[municipality_rows[0].pk],
+        'citizen': citizen_rows[0],
+        'admin': admin,
+        None: None,
+    }
+    ds.official_grievance_ids = [g.pk for g in grievance_rows if g.municipality_id == municipality_rows[0].pk] or [0]
+    ds.official_open_ids = [
+        g.pk for g in grievance_rows if g.municipality_id == municipality_rows[0].pk and g.status == 'OPEN'
+    ] or [0]
+    ds.refresh_token = str(RefreshToken.for_user(citizen_rows[0]))
+    ds.access_tokens = {
+        role: str(RoleTokenObtainPairSerializer.get_token(user).access_token)
+        for role, user in ds.users.items() if user is not None
+    }
+    return ds
+
+
+def _call(client, endpoint, ds, i):
+    path, kwargs = endpoint.build(ds, i)
+    response = getattr(client, endpoint.method)(path, **kwargs)
+    if response.streaming:
+        b''.join(response)  # Exports, bulk ingest and event streams do their work here
+    return response.status_code
+
+
+def _client(ds, endpoint):
+    client = APIClient()
+    user = ds.users[endpoint.user]
+    if user is not None:
+        client.force_authenticate(user)
+        # force_authenticate only reaches DRF views; the async views read the token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ds.access_tokens[endpoint.user]}')
+    return client
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_endpoint(endpoint, ds, requests=50, concurrency=4):
+    # One warm-up call, one under tracemalloc for peak memory, then `requests`
+    # timed calls spread over `concurrency` threads with their own connections.
+    client = _client(ds, endpoint)
+    _call(client, endpoint, ds, 0)
+    tracemalloc.start()
+    try:
+        _call(client, endpoint, ds, 1)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    counter = itertools.count(2)
+
+    def worker(count):
+        thread_client = _client(ds, endpoint)
+        try:
+            for _ in range(count):
+                i = next(counter)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    try:
+                        status = _call(thread_client, endpoint, ds, i)
+                    except Exception as exc:
+                        status = type(exc).__name__
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(len(captured))
+                    if not isinstance(status, int) or status >= 400:
+                        errors.append(status)
+        finally:
+            connection.close()
+
+    shares = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(share,)) for share in shares if share]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        'route': endpoint.route,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_statuses': sorted({str(status) for status in errors}),
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'queries': max(queries),
+        'queries_median': statistics.median(queries),
+        'peak_memory_kb': peak_memory / 1024,
+    }
+
+
+# Response bodies the payload benchmark weighs, each against the full list
+# it trims (`baseline`).
+Payload = namedtuple('Payload', ['name', 'user', 'path', 'params', 'baseline'])
+
+PAYLOADS = [
+    Payload('grievance_list', 'official', '/api/grievances/', {'page_size': 100}, None),
+    Payload('grievance_list_sparse', 'official', '/api/grievances/',
+            {'page_size': 100, 'fields': 'id,title,status'}, 'grievance_list'),
+    Payload('grievance_list_expanded', 'official', '/api/grievances/',
+            {'page_size': 100, 'expand': 'department,municipality'}, None),
+    Payload('grievance_list_expanded_sparse', 'official', '/api/grievances/',
+            {'page_size': 100, 'expand': 'department,municipality', 'omit': 'description,user,duplicate_of'},
+            'grievance_list_expanded'),
+    Payload('municipalities', 'citizen', '/api/municipalities/', {}, None),
+    Payload('municipalities_sparse', 'citizen', '/api/municipalities/', {'fields': 'id,name'}, 'municipalities'),
+]
+
+
+def payload_variants():
+    # (format, Accept, Accept-Encoding) for the renderers and codings
+    # installed here.
+    formats = [('json', 'application/json')]
+    if renderers.msgpack is not None:
+        formats.append(('msgpack', 'application/msgpack'))
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli is not None else [])
+    return [(fmt, accept, encoding) for fmt, accept in formats for encoding in encodings]
+
+
+def measure_payload(payload, ds, accept, encoding, requests=20):
+    # Body size and median CPU time per request: queries, serialization,
+    # rendering and compression all run in this thread. None when the view
+    # does not render `accept` (the pre-rendered reference lists are JSON).
+    client = _client(ds, payload)
+    headers = {'HTTP_ACCEPT': accept, 'HTTP_ACCEPT_ENCODING': encoding}
+    response = client.get(payload.path, payload.params, **headers)
+    if response.status_code != 200 or not response['Content-Type'].startswith(accept):
+        return None
+    size = len(response.content)
+    cpu = []
+    for _ in range(requests):
+        started = time.process_time()
+        client.get(payload.path, payload.params, **headers)
+        cpu.append(time.process_time() - started)
+    return {'bytes': size, 'cpu_ms': statistics.median(cpu) * 1000}
+
+
+def compare(results, baseline, tolerance=0.25, memory_tolerance=0.25):
+    # Query counts must not grow at all; timings and memory may drift by the
+    # given fraction before they count as a regression.
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s")
+        if current['peak_memory_kb'] > previous['peak_memory_kb'] * (1 + memory_tolerance):
+            regressions.append(f"{name}: peak memory {previous['peak_memory_kb']:.0f}KB -> {current['peak_memory_kb']:.0f}KB")
+    return regressions
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:  # Optional; gzip only
+        brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def accepts_encoding(request, coding):
+    # Whether Accept-Encoding lists `coding` without q=0.
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = item.partition(';')
+        if name.strip().lower() != coding:
+            continue
+        quality = params.strip().lower()
+        return not (quality.startswith('q=') and quality[2:].strip('0. ') == '')
+    return False
+
+
+class CompressionMiddleware(GZipMiddleware):
+    # brotli (when the package is installed) or gzip for GET and HEAD
+    # responses of at least COMPRESSION_MIN_SIZE bytes. Responses to other
+    # methods are left alone: they can echo submitted text next to tokens,
+    # which is what BREACH-style attacks rely on. Event streams are never
+    # compressed, as the compressor would hold events back.
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        if brotli is None or not accepts_encoding(request, 'br'):
+            if accepts_encoding(request, 'gzip'):
+                return super().process_response(request, response)
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, quality)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag  # As GZipMiddleware does
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+    def compress_stream(self, response, quality):
+        compressor = brotli.Compressor(quality=quality)
+        chunks = response.streaming_content
+        if response.is_async:
+            async def stream():
+                async for chunk in chunks:
+                    yield compressor.process(chunk)
+                yield compressor.finish()
+        else:
+            def stream():
+                for chunk in chunks:
+                    yield compressor.process(chunk)
+                yield compressor.finish()
+        return stream()
@@ -0,0 +1,108 @@
+from collections import Counter
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+
+from .models import ArchivedGrievance, Grievance, GrievanceStatusCount
+
+
+def status_deltas(grievances, sign=1):
+    # Counter({(municipality_id, department_id, status): +/-n})
+    return Counter({
+        key: sign * n for key, n in
+        Counter((g.municipality_id, g.department_id, g.status) for g in grievances).items()
+    })
+
+
+def saved_counter_key(instance, loaded_key, update_fields):
+    # The row's key after save(update_fields=...), which writes only those
+    # fields.
+    fields = (('municipality', 'municipality_id'), ('department', 'department_id'), ('status', 'status'))
+    return tuple(
+        getattr(instance, attname) if update_fields is None or {name, attname} & set(update_fields) else loaded
+        for (name, attname), loaded in zip(fields, loaded_key)
+    )
+
+
+def transition_deltas(transitions, municipality_id, departments):
+    # The moves reported by grievances_transitioned; departments maps
+    # grievance id -> department id.
+    deltas = Counter()
+    for t in transitions:
+        department_id = departments[t.grievance_id]
+        deltas[municipality_id, department_id, t.from_status] -= 1
+        deltas[municipality_id, department_id, t.to_status] += 1
+    return deltas
+
+
+def apply_status_deltas(deltas):
+    # One UPDATE ... SET count = count + n per key, so concurrent writers
+    # never overwrite each other's increments. A key's row is created on its
+    # first increment; a decrement with no row (e.g. its municipality is
+    # being deleted) is dropped and left to reconcile_counters().
+    with transaction.atomic():
+        for (municipality_id, department_id, status), n in sorted(deltas.items()):
+            if not n:
+                continue
+            rows = GrievanceStatusCount.objects.filter(
+                municipality_id=municipality_id, department_id=department_id, status=status,
+            )
+            if rows.update(count=F('count') + n) or n < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    GrievanceStatusCount.objects.create(
+                        municipality_id=municipality_id, department_id=department_id, status=status, count=n,
+                    )
+            except IntegrityError:
+                rows.update(count=F('count') + n)  # Created meanwhile by another writer
+
+
+def record_grievances(grievances, sign=1):
+    apply_status_deltas(status_deltas(grievances, sign))
+
+
+def counted_statuses(municipality_id=None):
+    # {(municipality_id, department_id, status): count} from the grievance
+    # tables themselves; archived grievances stay counted.
+    counts = Counter()
+    for model in (Grievance, ArchivedGrievance):
+        rows = model.objects.all()
+        if municipality_id is not None:
+            rows = rows.filter(municipality_id=municipality_id)
+        rows = rows.values_list('municipality_id', 'department_id', 'status').annotate(n=Count('id')).order_by()
+        counts.update({(m, d, status): n for m, d, status, n in rows.iterator()})
+    return dict(counts)
+
+
+def reconcile_counters(municipality_id=None, repair=False):
+    # Compares the counters with a GROUP BY over the grievances and returns
+    # {key: (counter or None, actual)} for every key that drifted; with
+    # repair, corrects them. The counter rows are locked first, so a writer
+    # cannot commit a grievance between the two reads and have its increment
+    # counted twice.
+    with transaction.atomic():
+        counters = GrievanceStatusCount.objects.all()
+        if municipality_id is not None:
+            counters = counters.filter(municipality_id=municipality_id)
+        if connection.features.has_select_for_update:
+            counters = counters.select_for_update()
+        stored = {
+            (m, d, status): (pk, count)
+            for pk, m, d, status, count in counters.values_list('pk', 'municipality_id', 'department_id', 'status', 'count')
+        }
+        actual = counted_statuses(municipality_id)
+        drift = {}
+        for key in stored.keys() | actual.keys():
+            counter = stored[key][1] if key in stored else None
+            if (counter or 0) != actual.get(key, 0):
+                drift[key] = (counter, actual.get(key, 0))
+        if repair:
+            for key, (counter, count) in drift.items():
+                if counter is None:
+                    GrievanceStatusCount.objects.create(
+                        municipality_id=key[0], department_id=key[1], status=key[2], count=count,
+                    )
+                else:
+                    GrievanceStatusCount.objects.filter(pk=stored[key][0]).update(count=count)
+    return drift
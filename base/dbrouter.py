@@ -0,0 +1,120 @@
+import contextlib
+import contextvars
+import itertools
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+from .authentication import unverified_user_id
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Reads that decide who may do what always see the primary: users, groups,
+# permissions, sessions and tokens.
+PRIMARY_APPS = {'auth', 'admin', 'contenttypes', 'sessions', 'authtoken', 'account', 'socialaccount', 'sites'}
+PRIMARY_MODELS = {'base.customuser'}
+
+_replica = contextvars.ContextVar('read_replica', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def _primary_only(model):
+    meta = model._meta
+    if meta.auto_created:  # m2m through tables follow the model that owns them
+        meta = meta.auto_created._meta
+    return meta.app_label in PRIMARY_APPS or meta.label_lower in PRIMARY_MODELS
+
+
+class ReplicaRouter:
+    # Writes go to the primary. Reads go to the replica ReplicaMiddleware
+    # picked for the current request, if any, and otherwise to the primary.
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or _primary_only(model):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()  # Replicas are copies of the primary
+
+
+@contextlib.contextmanager
+def primary_reads():
+    # For reads whose results outlive the request, such as process caches.
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    # Keeps the user's reads on the primary while replicas catch up with
+    # their write.
+    cache.set(_pin_key(user_id), True, getattr(settings, 'READ_AFTER_WRITE_PIN', 5))
+
+
+def is_pinned(user_id):
+    return user_id is not None and bool(cache.get(_pin_key(user_id)))
+
+
+def _request_user_id(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return unverified_user_id(request)
+
+
+class ReplicaMiddleware:
+    # Safe-method requests to views with `replica_reads = True` read from a
+    # replica, round-robin, unless the user wrote within READ_AFTER_WRITE_PIN
+    # seconds. A successful unsafe request pins its user to the primary.
+    # Streaming bodies are produced after the middleware returns and read
+    # from the primary.
+    def __init__(self, get_response):
+        self.aliases = replicas()
+        if not self.aliases:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._next = itertools.cycle(self.aliases)
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _replica.reset(request._replica_token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = _request_user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if request.method not in SAFE_METHODS or not getattr(view_class, 'replica_reads', False):
+            return None
+        if is_pinned(_request_user_id(request)):
+            return None
+        with self._lock:
+            alias = next(self._next)
+        request._replica_token = _replica.set(alias)
+        return None
@@ -0,0 +1,259 @@
+import random
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+ACTIVE_STATUSES = ('OPEN', 'IN_PROGRESS')
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250823)  # Fixed so stored signatures stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def shingles(text):
+    text = _NON_WORD_RE.sub(' ', text.lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature_for(title, description):
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(f'{title} {description}')]
+    return tuple(min((a * x + b) % _PRIME for x in hashes) & 0xFFFFFFFF for a, b in _PERMUTATIONS)
+
+
+def pack(signature):
+    return array('I', signature).tobytes()
+
+
+def unpack(data):
+    values = array('I')
+    values.frombytes(bytes(data))
+    return tuple(values)
+
+
+def similarity(left, right):
+    # Fraction of matching MinHash slots estimates the Jaccard similarity.
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERMUTATIONS
+
+
+def _threshold():
+    return getattr(settings, 'DUPLICATE_THRESHOLD', 0.5)
+
+
+class Partition:
+    # LSH buckets for one (municipality, department).
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+        self.loaded_at = time.monotonic()
+
+    def add(self, pk, signature):
+        self.remove(pk)
+        self.signatures[pk] = signature
+        for band in range(BANDS):
+            self.buckets[band, signature[band * ROWS:(band + 1) * ROWS]].add(pk)
+
+    def remove(self, pk):
+        signature = self.signatures.pop(pk, None)
+        if signature is None:
+            return
+        for band in range(BANDS):
+            key = band, signature[band * ROWS:(band + 1) * ROWS]
+            self.buckets[key].discard(pk)
+            if not self.buckets[key]:
+                del self.buckets[key]
+
+    def query(self, signature, exclude=None):
+        candidates = set()
+        for band in range(BANDS):
+            candidates |= self.buckets.get((band, signature[band * ROWS:(band + 1) * ROWS]), set())
+        candidates.discard(exclude)
+        scored = [(pk, similarity(signature, self.signatures[pk])) for pk in candidates]
+        return sorted(scored, key=lambda item: (-item[1], item[0]))
+
+
+class DuplicateIndex:
+    # In-memory LSH over the stored signatures of active grievances, loaded per
+    # partition on first use and reloaded after DUPLICATE_INDEX_MAX_AGE seconds
+    # so changes made by other processes show up.
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._where = {}  # pk -> partition key
+
+    def _partition(self, key):
+        from .models import GrievanceSignature
+
+        max_age = getattr(settings, 'DUPLICATE_INDEX_MAX_AGE', 300)
+        partition = self._partitions.get(key)
+        if partition is None or time.monotonic() - partition.loaded_at > max_age:
+            if partition is not None:
+                for pk in partition.signatures:
+                    self._where.pop(pk, None)
+            partition = Partition()
+            rows = GrievanceSignature.objects.filter(
+                municipality_id=key[0], department_id=key[1], active=True,
+            ).values_list('grievance_id', 'signature')
+            for pk, data in rows.iterator(chunk_size=2000):
+                partition.add(pk, unpack(data))
+                self._where[pk] = key
+            self._partitions[key] = partition
+        return partition
+
+    def query(self, municipality_id, department_id, signature, exclude=None):
+        with self._lock:
+            return self._partition((municipality_id, department_id)).query(signature, exclude)
+
+    def add(self, pk, municipality_id, department_id, signature):
+        with self._lock:
+            self.remove(pk)
+            key = (municipality_id, department_id)
+            if key in self._partitions:
+                self._partitions[key].add(pk, signature)
+                self._where[pk] = key
+
+    def remove(self, pk):
+        with self._lock:
+            key = self._where.pop(pk, None)
+            if key in self._partitions:
+                self._partitions[key].remove(pk)
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._where.clear()
+
+
+_index = DuplicateIndex()
+
+
+def get_duplicate_index():
+    return _index
+
+
+def _confirm(pk, signature, threshold):
+    # The in-memory index can hold rows from rolled-back transactions or
+    # edits made elsewhere, so candidates are checked against the stored
+    # signature. Returns the canonical grievance id, or None.
+    from .models import GrievanceSignature
+
+    row = (
+        GrievanceSignature.objects.filter(grievance_id=pk, active=True)
+        .values_list('signature', 'grievance__duplicate_of_id').first()
+    )
+    if row is None or similarity(signature, unpack(row[0])) < threshold:
+        _index.remove(pk)
+        return None
+    return row[1] or pk
+
+
+def link_new_grievances(grievances):
+    # Points each new grievance at the open grievance it most likely repeats,
+    # then indexes it. Runs inside the caller's transaction.
+    from .models import Grievance, GrievanceSignature
+
+    threshold = _threshold()
+    rows, linked = [], []
+    for grievance in grievances:
+        signature = signature_for(grievance.title, grievance.description)
+        for pk, score in _index.query(grievance.municipality_id, grievance.department_id, signature, exclude=grievance.pk):
+            if score < threshold:
+                break
+            canonical_id = _confirm(pk, signature, threshold)
+            if canonical_id is not None:
+                grievance.duplicate_of_id = canonical_id
+                linked.append(grievance)
+                break
+        active = grievance.status in ACTIVE_STATUSES
+        rows.append(GrievanceSignature(
+            grievance_id=grievance.pk,
+            municipality_id=grievance.municipality_id,
+            department_id=grievance.department_id,
+            active=active,
+            signature=pack(signature),
+        ))
+        if active:
+            _index.add(grievance.pk, grievance.municipality_id, grievance.department_id, signature)
+
+    with transaction.atomic():
+        GrievanceSignature.objects.bulk_create(rows, batch_size=500)
+        for grievance in linked:
+            Grievance.objects.filter(pk=grievance.pk).update(duplicate_of_id=grievance.duplicate_of_id)
+
+
+def refresh_grievance(grievance, text_changed=True):
+    from .models import GrievanceSignature
+
+    active = grievance.status in ACTIVE_STATUSES
+    signatures = GrievanceSignature.objects.filter(grievance_id=grievance.pk)
+    if text_changed:
+        signature = signature_for(grievance.title, grievance.description)
+        values = {
+            'municipality_id': grievance.municipality_id,
+            'department_id': grievance.department_id,
+            'active': active,
+            'signature': pack(signature),
+        }
+        if not signatures.update(**values):
+            GrievanceSignature.objects.create(grievance_id=grievance.pk, **values)
+    else:
+        signatures.update(active=active)
+        signature = None
+        if active:
+            data = signatures.values_list('signature', flat=True).first()
+            signature = unpack(data) if data is not None else None
+    if active and signature is not None:
+        _index.add(grievance.pk, grievance.municipality_id, grievance.department_id, signature)
+    else:
+        _index.remove(grievance.pk)
+
+
+def deactivate(pks):
+    from .models import GrievanceSignature
+
+    GrievanceSignature.objects.filter(grievance_id__in=pks).update(active=False)
+    for pk in pks:
+        _index.remove(pk)
+
+
+def activate(pks):
+    from .models import GrievanceSignature
+
+    signatures = GrievanceSignature.objects.filter(grievance_id__in=pks)
+    signatures.update(active=True)
+    for pk, municipality_id, department_id, data in signatures.values_list(
+        'grievance_id', 'municipality_id', 'department_id', 'signature',
+    ):
+        _index.add(pk, municipality_id, department_id, unpack(data))
+
+
+def rebuild_signatures(batch_size=1000):
+    from .models import Grievance, GrievanceSignature
+
+    rows = []
+    fields = ('id', 'title', 'description', 'municipality_id', 'department_id', 'status')
+    for grievance in Grievance.objects.only(*fields).iterator(chunk_size=batch_size):
+        rows.append(GrievanceSignature(
+            grievance_id=grievance.pk,
+            municipality_id=grievance.municipality_id,
+            department_id=grievance.department_id,
+            active=grievance.status in ACTIVE_STATUSES,
+            signature=pack(signature_for(grievance.title, grievance.description)),
+        ))
+    with transaction.atomic():
+        GrievanceSignature.objects.all().delete()
+        GrievanceSignature.objects.bulk_create(rows, batch_size=batch_size)
+    _index.clear()
+    return len(rows)
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+from collections import defaultdict, deque, namedtuple
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Grievance events for the SSE and long-poll streams in base.async_views.
+# Each event goes to channels 'm:<municipality_id>' (officials) and
+# 'u:<user_id>' (the citizen who filed the grievance). Ids increase by one per
+# event, so a client resumes with the last id it saw. When events it missed
+# are gone (evicted, or the hub restarted) the batch is flagged `missed` and
+# the client should reload the grievance list once.
+Event = namedtuple('Event', ['id', 'type', 'data', 'channels'])
+Batch = namedtuple('Batch', ['events', 'cursor', 'missed'])
+
+
+def grievance_channels(municipality_id, user_id):
+    return frozenset({f'm:{municipality_id}', f'u:{user_id}'})
+
+
+def _buffer_size():
+    return getattr(settings, 'EVENTS_BUFFER_SIZE', 1000)
+
+
+def _select(events, last_id, channels, cursor, oldest):
+    # Events after last_id on any of channels, as a Batch.
+    if last_id is None:
+        return Batch([], cursor, False)
+    if last_id > cursor:
+        return Batch([], cursor, True)  # Ids from before a restart
+    matching = [event for event in events if event.id > last_id and not event.channels.isdisjoint(channels)]
+    return Batch(matching, cursor, last_id < oldest - 1)
+
+
+class LocalEventHub:
+    # Ring buffer of the last EVENTS_BUFFER_SIZE events in this process.
+    # Waiters are woken per channel, from whichever thread publishes.
+    def __init__(self, size):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=size)
+        self._last_id = 0
+        self._waiters = defaultdict(set)
+
+    def cursor(self):
+        return self._last_id
+
+    def publish(self, type, data, channels):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, type, data, frozenset(channels))
+            self._events.append(event)
+            waiters = set().union(*(self._waiters.get(channel, ()) for channel in event.channels))
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+        return event
+
+    def since(self, last_id, channels):
+        with self._lock:
+            events, cursor = list(self._events), self._last_id
+        oldest = events[0].id if events else cursor + 1
+        return _select(events, last_id, channels, cursor, oldest)
+
+    async def wait(self, last_id, channels, timeout):
+        # since(), or once timeout passes without a matching event, an empty
+        # batch with the cursor moved past anything on other channels.
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            for channel in channels:
+                self._waiters[channel].add(waiter)
+        try:
+            deadline = loop.time() + timeout
+            while True:
+                waiter[1].clear()
+                batch = self.since(last_id, channels)
+                remaining = deadline - loop.time()
+                if batch.events or batch.missed or remaining <= 0:
+                    return batch
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                for channel in channels:
+                    self._waiters[channel].discard(waiter)
+                    if not self._waiters[channel]:
+                        del self._waiters[channel]
+
+
+class CacheEventHub:
+    # Shares events between processes through the default cache, which must
+    # then be one all processes see (Redis, Memcached or the database cache).
+    # Subscribers poll every EVENTS_POLL_INTERVAL seconds.
+    counter_key = 'events:last'
+
+    def __init__(self, size):
+        self.size = size
+
+    def _key(self, event_id):
+        return f'events:{event_id}'
+
+    def cursor(self):
+        return cache.get(self.counter_key, 0)
+
+    def publish(self, type, data, channels):
+        try:
+            event_id = cache.incr(self.counter_key)
+        except ValueError:
+            cache.add(self.counter_key, 0, None)
+            event_id = cache.incr(self.counter_key)
+        event = Event(event_id, type, data, frozenset(channels))
+        cache.set(self._key(event_id), event, getattr(settings, 'EVENTS_TTL', 3600))
+        return event
+
+    def since(self, last_id, channels):
+        cursor = self.cursor()
+        if last_id is None or last_id >= cursor:
+            return _select([], last_id, channels, cursor, cursor + 1)
+        first = max(last_id + 1, cursor - self.size + 1)
+        stored = cache.get_many([self._key(event_id) for event_id in range(first, cursor + 1)])
+        events = [stored[self._key(event_id)] for event_id in range(first, cursor + 1) if self._key(event_id) in stored]
+        oldest = first if len(events) == cursor - first + 1 else cursor + 1  # Expired entries count as missed
+        return _select(events, last_id, channels, cursor, oldest)
+
+    async def wait(self, last_id, channels, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        interval = getattr(settings, 'EVENTS_POLL_INTERVAL', 0.5)
+        while True:
+            batch = await sync_to_async(self.since, thread_sensitive=False)(last_id, channels)
+            remaining = deadline - loop.time()
+            if batch.events or batch.missed or remaining <= 0:
+                return batch
+            await asyncio.sleep(min(interval, remaining))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_event_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                backend = getattr(settings, 'EVENTS_BACKEND', 'local')
+                _hub = (CacheEventHub if backend == 'cache' else LocalEventHub)(_buffer_size())
+    return _hub
+
+
+def publish_event(type, data, channels):
+    # Published once the surrounding transaction commits, so a client that
+    # reloads on an event sees the change.
+    transaction.on_commit(partial(get_event_hub().publish, type, data, channels))
+
+
+def publish_status_change(grievance_id, municipality_id, user_id, status, previous_status):
+    publish_event('grievance.status', {
+        'grievance': grievance_id,
+        'municipality': municipality_id,
+        'status': status,
+        'previous_status': previous_status,
+    }, grievance_channels(municipality_id, user_id))
@@ -0,0 +1,66 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .filters import filter_created_range, filter_grievances, int_param
+from .models import ArchivedGrievance, Feedback, Grievance
+
+EXPORT_FIELDS = {
+    'grievances': [
+        'id', 'title', 'description', 'status', 'municipality_id', 'department_id', 'user_id', 'created', 'updated',
+    ],
+    'feedback': [
+        'id', 'rating', 'comment', 'municipality_id', 'department_id', 'user_id', 'created', 'updated',
+    ],
+}
+
+EXPORT_MODELS = {
+    'grievances': Grievance,
+    'feedback': Feedback,
+}
+
+# Archive tables exports read with ?include_archived=true.
+ARCHIVE_MODELS = {
+    'grievances': ArchivedGrievance,
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def filter_export(kind, queryset, params):
+    if kind == 'grievances':
+        queryset = filter_grievances(queryset, params)
+    else:
+        department_id = int_param(params, 'department')
+        if department_id is not None:
+            queryset = queryset.filter(department_id=department_id)
+    return filter_created_range(queryset, params)
+
+
+def export_rows(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Tuples straight from the cursor; nothing is cached on the queryset.
+    return queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
@@ -0,0 +1,142 @@
+import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import Grievance
+
+GRIEVANCE_STATUSES = {value for value, _ in Grievance._meta.get_field('status').choices}
+GRIEVANCE_EXPANSIONS = ('responses', 'department', 'municipality')
+
+
+def filter_grievances(queryset, params):
+    status = params.get('status')
+    if status:
+        if status not in GRIEVANCE_STATUSES:
+            raise ValidationError({'status': f'Unknown status "{status}".'})
+        queryset = queryset.filter(status=status)
+    department_id = int_param(params, 'department')
+    if department_id is not None:
+        queryset = queryset.filter(department_id=department_id)
+    return queryset
+
+
+def expand_param(params):
+    # ?expand=responses,department,municipality
+    value = params.get('expand')
+    if not value:
+        return ()
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in GRIEVANCE_EXPANSIONS]
+    if unknown:
+        raise ValidationError({'expand': f'Unknown expansion "{unknown[0]}".'})
+    return names
+
+
+def expand_grievances(queryset, expand):
+    # Loads what the expanded serializer fields read: one JOIN for the names
+    # and one extra query for all responses on the page, however long it is.
+    # Works for Grievance and ArchivedGrievance querysets alike.
+    related = [name for name in ('department', 'municipality') if name in expand]
+    if related:
+        queryset = queryset.select_related(*related)
+    if 'responses' in expand:
+        responses = queryset.model._meta.get_field('responses').related_model
+        queryset = queryset.prefetch_related(
+            Prefetch('responses', queryset=responses.objects.order_by('created', 'id'))
+        )
+    return queryset
+
+
+def fieldset_param(params, serializer_class):
+    # ?fields=id,title,status keeps only those fields; ?omit=description
+    # drops fields. Returns the kept names in Meta.fields order (None when
+    # neither is given), so equal selections compare and cache equal.
+    available = serializer_class.Meta.fields
+    selected = {}
+    for name in ('fields', 'omit'):
+        value = params.get(name)
+        if not value:
+            continue
+        selected[name] = {field.strip() for field in value.split(',') if field.strip()}
+        unknown = sorted(selected[name] - set(available))
+        if unknown:
+            raise ValidationError({name: f'Unknown field "{unknown[0]}".'})
+    if not selected:
+        return None
+    keep = selected.get('fields', available)
+    return tuple(name for name in available if name in keep and name not in selected.get('omit', ()))
+
+
+def only_fieldset(queryset, fieldset, keep=()):
+    # Loads just the columns the selected fields read, plus `keep` (columns
+    # the view itself uses).
+    if fieldset is None:
+        return queryset
+    columns = {'id', *keep}
+    for name in fieldset:
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete:
+            columns.add(name)
+    return queryset.only(*columns)
+
+
+def only_grievance_fieldset(queryset, fieldset, expand):
+    # Keyset pages read `created` for the next cursor, and select_related()
+    # cannot follow a deferred foreign key.
+    keep = ['created'] + [name for name in ('department', 'municipality') if name in expand]
+    return only_fieldset(queryset, fieldset, keep)
+
+
+def flag_param(params, name):
+    # ?include_archived=true (or 1, yes)
+    value = params.get(name, '').lower()
+    if value in ('', '0', 'false', 'no'):
+        return False
+    if value in ('1', 'true', 'yes'):
+        return True
+    raise ValidationError({name: 'Must be true or false.'})
+
+
+def int_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be an integer id.'})
+
+
+def date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Must be a date in YYYY-MM-DD format.'})
+    return parsed
+
+
+def filter_created_range(queryset, params):
+    # ?start= and ?end= are inclusive dates; compared as datetime bounds so
+    # the (…, created) indexes still apply.
+    start, end = date_param(params, 'start'), date_param(params, 'end')
+    if start:
+        queryset = queryset.filter(created__gte=_day_start(start))
+    if end:
+        queryset = queryset.filter(created__lt=_day_start(end + datetime.timedelta(days=1)))
+    return queryset
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
@@ -0,0 +1,126 @@
+import csv
+import json
+from pathlib import Path
+
+from django.db import transaction
+
+from .models import Department, District, Municipality, State
+from .refcache import reference_cache
+
+DATA_DIR = Path(__file__).resolve().parent / 'data' / 'nepal'
+
+
+def load_records(path):
+    # A JSON array of objects, or a CSV file with a header row.
+    path = Path(path)
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == '.csv':
+            return [{key: (value or '').strip() for key, value in row.items()} for row in csv.DictReader(f)]
+        records = json.load(f)
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise ValueError(f'{path.name}: expected a JSON array of objects.')
+    return records
+
+
+def _required(record, field, source):
+    value = str(record.get(field) or '').strip()
+    if not value:
+        raise ValueError(f'{source}: every record needs "{field}".')
+    return value
+
+
+def _name(record, source):
+    return _required(record, 'name', source)
+
+
+def import_admin_data(provinces, districts, local_levels, departments=()):
+    # Upserts provinces (State), districts and local levels (Municipality) in a
+    # few bulk statements: one read per table, then bulk_create for new rows
+    # and bulk_update for local levels whose district changed. Re-running with
+    # the same files writes nothing. Every imported local level gets every department.
+    stats = {}
+    with transaction.atomic():
+        # Provinces, matched by name.
+        state_ids = dict(State.objects.values_list('name', 'id'))
+        new_states = [State(name=name) for name in dict.fromkeys(_name(p, 'provinces') for p in provinces) if name not in state_ids]
+        State.objects.bulk_create(new_states)
+        state_ids.update((state.name, state.pk) for state in new_states)
+        province_states = {_required(p, 'id', 'provinces'): state_ids[_name(p, 'provinces')] for p in provinces}
+        stats['provinces'] = (len(new_states), 0)
+
+        # Districts, matched by (province, name): a name may recur in another
+        # province.
+        existing = {(d.state_id, d.name): d for d in District.objects.only('id', 'name', 'state_id')}
+        new_districts = []
+        for record in districts:
+            name = _name(record, 'districts')
+            state_id = province_states.get(str(record.get('province_id')))
+            if state_id is None:
+                raise ValueError(f'District "{name}": unknown province_id {record.get("province_id")!r}.')
+            if (state_id, name) not in existing:
+                district = existing[state_id, name] = District(name=name, state_id=state_id)
+                new_districts.append(district)
+        District.objects.bulk_create(new_districts)
+        stats['districts'] = (len(new_districts), 0)
+        districts_by_name = {}
+        for district in existing.values():
+            districts_by_name.setdefault(district.name, []).append(district)
+
+        # Local levels, matched by (district, name). Rows from before districts
+        # existed are matched by (province, name) and adopted.
+        by_district, legacy = {}, {}
+        for municipality in Municipality.objects.only('id', 'name', 'state_id', 'district_id'):
+            if municipality.district_id is None:
+                legacy.setdefault((municipality.state_id, municipality.name), municipality)
+            else:
+                by_district[municipality.district_id, municipality.name] = municipality
+        new_municipalities, changed, imported = [], [], []
+        for record in local_levels:
+            name = _name(record, 'local levels')
+            candidates = districts_by_name.get(str(record.get('district') or '').strip(), [])
+            if record.get('province_id') not in (None, ''):
+                state_id = province_states.get(str(record['province_id']))
+                candidates = [district for district in candidates if district.state_id == state_id]
+            if len(candidates) != 1:
+                problem = 'ambiguous' if candidates else 'unknown'
+                raise ValueError(f'Local level "{name}": {problem} district {record.get("district")!r}; give its province_id.')
+            district = candidates[0]
+            municipality = by_district.get((district.pk, name)) or legacy.pop((district.state_id, name), None)
+            if municipality is None:
+                municipality = Municipality(name=name, state_id=district.state_id, district_id=district.pk)
+                new_municipalities.append(municipality)
+            elif (municipality.state_id, municipality.district_id) != (district.state_id, district.pk):
+                municipality.state_id, municipality.district_id = district.state_id, district.pk
+                changed.append(municipality)
+            by_district[district.pk, name] = municipality
+            imported.append(municipality)
+        Municipality.objects.bulk_create(new_municipalities, batch_size=500)
+        Municipality.objects.bulk_update(changed, ['state', 'district'], batch_size=500)
+        stats['local_levels'] = (len(new_municipalities), len(changed))
+
+        # Departments, matched by name, linked through one bulk insert.
+        department_ids = dict(Department.objects.values_list('name', 'id'))
+        names = list(dict.fromkeys(_name(d, 'departments') for d in departments))
+        new_departments = [Department(name=name) for name in names if name not in department_ids]
+        Department.objects.bulk_create(new_departments)
+        department_ids.update((department.name, department.pk) for department in new_departments)
+        stats['departments'] = (len(new_departments), 0)
+
+        through = Department.municipalities.through
+        wanted = {(department_ids[name], municipality.pk) for name in names for municipality in imported}
+        if wanted:
+            linked = set(
+                through.objects
+                .filter(department_id__in={d for d, _ in wanted}, municipality_id__in={m for _, m in wanted})
+                .values_list('department_id', 'municipality_id')
+            )
+            links = [through(department_id=d, municipality_id=m) for d, m in sorted(wanted - linked)]
+            through.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+        else:
+            links = []
+        stats['department_links'] = (len(links), 0)
+
+        # bulk_* skips the signals that keep the reference cache current.
+        if any(created or updated for created, updated in stats.values()):
+            transaction.on_commit(reference_cache.invalidate)
+    return stats
@@ -0,0 +1,87 @@
+import json
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .models import Department, Feedback, Grievance, Municipality
+from .signals import bulk_created
+from .serializers import FeedbackSerializer, GrievanceSerializer
+from .writer import DatabaseBusy, serialized_write
+
+INGEST_TARGETS = {
+    'feedback': (Feedback, FeedbackSerializer),
+    'grievance': (Grievance, GrievanceSerializer),
+}
+
+MAX_BATCH_SIZE = 5000
+
+
+def default_batch_size():
+    return getattr(settings, 'BULK_INGEST_BATCH_SIZE', 500)
+
+
+def preload_related():
+    return {
+        Municipality: Municipality.objects.only('id').in_bulk(),
+        Department: Department.objects.only('id').in_bulk(),
+    }
+
+
+def ingest_ndjson(kind, lines, user_id, batch_size=None, municipality_id=None):
+    # Yields one result dict per non-blank input line, in input order.
+    model, serializer_class = INGEST_TARGETS[kind]
+    batch_size = min(batch_size or default_batch_size(), MAX_BATCH_SIZE)
+    context = {'preloaded': preload_related()}
+    pending = []
+
+    for line_no, raw in enumerate(lines, 1):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            yield _error(line_no, f'Invalid JSON: {exc}')
+            continue
+        if not isinstance(data, dict):
+            yield _error(line_no, 'Each line must be a JSON object.')
+            continue
+
+        serializer = serializer_class(data=data, context=context)
+        if not serializer.is_valid():
+            yield {'line': line_no, 'status': 'error', 'errors': serializer.errors}
+            continue
+        if municipality_id is not None and serializer.validated_data['municipality'].pk != municipality_id:
+            yield _error(line_no, 'Records must belong to your municipality.')
+            continue
+
+        pending.append((line_no, model(user_id=user_id, **serializer.validated_data)))
+        if len(pending) >= batch_size:
+            yield from _write_batch(model, pending)
+            pending = []
+
+    if pending:
+        yield from _write_batch(model, pending)
+
+
+def _insert(model, objs):
+    created = model.objects.bulk_create(objs)
+    bulk_created.send(sender=model, instances=created)
+    return created
+
+
+def _write_batch(model, pending):
+    try:
+        created = serialized_write(_insert, model, [obj for _, obj in pending])
+    except (DatabaseError, DatabaseBusy) as exc:
+        for line_no, _ in pending:
+            yield _error(line_no, f'Batch failed: {exc}')
+        return
+    for (line_no, _), obj in zip(pending, created):
+        yield {'line': line_no, 'status': 'created', 'id': obj.pk}
+
+
+def _error(line_no, message):
+    return {'line': line_no, 'status': 'error', 'errors': {'non_field_errors': [message]}}
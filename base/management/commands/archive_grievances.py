@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base.archive import archivable, archive_batch, archive_cutoff
+from base.writer import serialized_write
+
+
+class Command(BaseCommand):
+    help = (
+        'Move grievances closed more than --days ago, with their responses and transitions, '
+        'into the archive tables in batched transactions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', 180))
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'ARCHIVE_BATCH_SIZE', 500),
+                            help='Grievances moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must not be negative and --batch-size must be positive.')
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{archivable(cutoff).count()} grievances would be archived.')
+            return
+        total = 0
+        while True:
+            # One transaction per batch; other writers get the lock in between
+            moved = serialized_write(archive_batch, cutoff, options['batch_size'])
+            total += moved
+            if moved:
+                self.stdout.write(f'Archived {total} grievances...')
+            if moved < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} grievances closed before {cutoff:%Y-%m-%d}.'))
@@ -0,0 +1,121 @@
+import contextlib
+import json
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from base.benchmark import PLAN, compare, run_endpoint, seed, uncovered_routes
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with synthetic data and drive every API route, '
+        'reporting latency percentiles, throughput, SQL query counts and peak memory.'
+    )
+
+    def add_arguments(self, parser):
+        self.add_dataset_arguments(parser)
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Run only these endpoints.')
+        parser.add_argument('--baseline', help='JSON results to compare against; regressions fail the command.')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write these results as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed fractional drift in p95 latency and throughput.')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25)
+
+    def add_dataset_arguments(self, parser):
+        parser.add_argument('--states', type=int, default=2)
+        parser.add_argument('--municipalities', type=int, default=5, help='Per state.')
+        parser.add_argument('--departments', type=int, default=5)
+        parser.add_argument('--citizens', type=int, default=50)
+        parser.add_argument('--officials', type=int, default=1, help='Per municipality.')
+        parser.add_argument('--grievances', type=int, default=2000)
+        parser.add_argument('--responses', type=int, default=2, help='Per grievance.')
+        parser.add_argument('--feedback', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f'No benchmark for routes: {", ".join(missing)}. Add them to base.benchmark.PLAN.')
+        plan = PLAN
+        if options['only']:
+            unknown = set(options['only']) - {endpoint.name for endpoint in PLAN}
+            if unknown:
+                raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+            plan = [endpoint for endpoint in PLAN if endpoint.name in options['only']]
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)['endpoints']
+
+        results = self.run(plan, options)
+
+        self.stdout.write(f"{'endpoint':30} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>7} {'peak KB':>9} {'errors':>6}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:30} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} "
+                f"{r['throughput_rps']:8.1f} {r['queries']:7} {r['peak_memory_kb']:9.0f} {r['errors']:6}"
+            )
+            if r['errors']:
+                self.stdout.write(self.style.WARNING(f"  {name} failures: {', '.join(r['error_statuses'])}"))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as f:
+                json.dump({'options': self.dataset_options(options), 'endpoints': results}, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}.")
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'], options['memory_tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def dataset_options(self, options):
+        names = ('states', 'municipalities', 'departments', 'citizens', 'officials', 'grievances',
+                 'responses', 'feedback', 'seed', 'requests', 'concurrency')
+        return {name: options[name] for name in names}
+
+    def run(self, plan, options):
+        with self.dataset(options) as ds:
+            results = {}
+            for endpoint in plan:
+                self.stdout.write(f'Running {endpoint.name}...')
+                results[endpoint.name] = run_endpoint(endpoint, ds, options['requests'], options['concurrency'])
+            return results
+
+    @contextlib.contextmanager
+    def dataset(self, options):
+        # Never touches the configured database: the data goes into a test
+        # database that is destroyed afterwards. SQLite gets a file rather than
+        # shared memory so concurrent writers wait on locks instead of failing.
+        tmpdir = None
+        if connection.vendor == 'sqlite':
+            tmpdir = tempfile.TemporaryDirectory()
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir.name, 'benchmark.sqlite3')
+        setup_test_environment()
+        throttling = override_settings(THROTTLE_ENABLED=False)  # Every request must reach the view
+        throttling.enable()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cache.clear()
+        try:
+            self.stdout.write('Seeding synthetic data...')
+            yield seed(
+                states=options['states'], municipalities=options['municipalities'],
+                departments=options['departments'], citizens=options['citizens'],
+                officials=options['officials'], grievances=options['grievances'],
+                responses=options['responses'], feedback=options['feedback'], random_seed=options['seed'],
+            )
+        finally:
+            cache.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            throttling.disable()
+            teardown_test_environment()
+            if tmpdir is not None:
+                tmpdir.cleanup()
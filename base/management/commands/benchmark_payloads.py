@@ -0,0 +1,44 @@
+from django.core.management.base import CommandError
+
+from base.benchmark import PAYLOADS, measure_payload, payload_variants
+
+from .benchmark_api import Command as BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Seed a throwaway test database and compare list responses in full and with ?fields=/?omit=, '
+        'per renderer and compression: bytes on the wire and CPU time per request.'
+    )
+
+    def add_arguments(self, parser):
+        self.add_dataset_arguments(parser)
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per variant.')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Measure only these payloads.')
+
+    def handle(self, *args, **options):
+        payloads = PAYLOADS
+        if options['only']:
+            unknown = set(options['only']) - {payload.name for payload in PAYLOADS}
+            if unknown:
+                raise CommandError(f'Unknown payloads: {", ".join(sorted(unknown))}')
+            payloads = [payload for payload in PAYLOADS if payload.name in options['only']]
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+
+        with self.dataset(options) as ds:
+            results = {}
+            for payload in payloads:
+                self.stdout.write(f'Measuring {payload.name}...')
+                for fmt, accept, encoding in payload_variants():
+                    result = measure_payload(payload, ds, accept, encoding, options['requests'])
+                    if result is not None:
+                        results[payload.name, fmt, encoding] = result
+
+        # Sizes relative to the full JSON list, uncompressed.
+        self.stdout.write(f"{'payload':32} {'format':8} {'encoding':9} {'bytes':>9} {'of full':>8} {'cpu ms':>8}")
+        for (name, fmt, encoding), r in results.items():
+            payload = next(payload for payload in payloads if payload.name == name)
+            full = results.get((payload.baseline or name, 'json', 'identity'))
+            share = f"{100 * r['bytes'] / full['bytes']:7.1f}%" if full else f"{'-':>8}"
+            self.stdout.write(f"{name:32} {fmt:8} {encoding:9} {r['bytes']:9} {share} {r['cpu_ms']:8.2f}")
@@ -0,0 +1,59 @@
+import contextlib
+import itertools
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from base.exports import (
+    ARCHIVE_MODELS, DEFAULT_CHUNK_SIZE, EXPORT_FIELDS, EXPORT_FORMATS, EXPORT_MODELS, export_rows, filter_export,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream grievances or feedback to CSV/NDJSON without loading them into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORT_MODELS))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help='File to write, "-" for stdout.')
+        parser.add_argument('--municipality', type=int)
+        parser.add_argument('--department')
+        parser.add_argument('--status')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD).')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--include-archived', action='store_true', help='Add archived grievances after the live ones.')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        if options['status'] and kind != 'grievances':
+            raise CommandError(f'--status only applies to grievances, not {kind}.')
+        models = [EXPORT_MODELS[kind]]
+        if options['include_archived']:
+            if kind not in ARCHIVE_MODELS:
+                raise CommandError(f'{kind} has no archive.')
+            models.append(ARCHIVE_MODELS[kind])
+        params = {name: options[name] for name in ('department', 'status', 'start', 'end') if options[name]}
+        querysets = []
+        for model in models:
+            queryset = model.objects.all()
+            if options['municipality'] is not None:
+                queryset = queryset.filter(municipality_id=options['municipality'])
+            try:
+                querysets.append(filter_export(kind, queryset, params))
+            except ValidationError as exc:
+                raise CommandError(exc.detail)
+
+        render_lines, _ = EXPORT_FORMATS[options['format']]
+        fields = EXPORT_FIELDS[kind]
+        if options['output'] == '-':
+            target = contextlib.nullcontext(sys.stdout)
+        else:
+            target = open(options['output'], 'w', encoding='utf-8', newline='')
+        with target as out:
+            rows = itertools.chain.from_iterable(
+                export_rows(queryset, fields, options['chunk_size']) for queryset in querysets
+            )
+            for line in render_lines(fields, rows):
+                out.write(line)
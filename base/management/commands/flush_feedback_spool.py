@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from base.spool import get_spool
+
+
+class Command(BaseCommand):
+    help = 'Insert every spooled write-behind feedback record into the database now.'
+
+    def handle(self, *args, **options):
+        spool = get_spool()
+        spool.recover_orphans()
+        spool.flush()
+        metrics = spool.metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f'Flushed {metrics["flushed_total"]} feedback records; {metrics["queue_depth"]} still queued.'
+        ))
+        if metrics['failed_records']:
+            self.stderr.write(f'{metrics["failed_records"]} records were rejected and set aside in .failed files.')
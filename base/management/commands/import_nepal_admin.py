@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.geography import DATA_DIR, import_admin_data, load_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Load provinces, districts, local levels and departments from local JSON/CSV files. '
+        'Idempotent: only new or moved rows are written.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provinces', default=DATA_DIR / 'provinces.json',
+                            help='Records with "id" and "name".')
+        parser.add_argument('--districts', default=DATA_DIR / 'districts.json',
+                            help='Records with "name" and "province_id".')
+        parser.add_argument('--local-levels', default=DATA_DIR / 'local_levels.csv',
+                            help='Records with "name" and "district" (the district name), '
+                                 'and "province_id" where that name is used in more than one province.')
+        parser.add_argument('--departments', default=DATA_DIR / 'departments.json',
+                            help='Records with "name"; linked to every imported local level.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            stats = import_admin_data(
+                load_records(options['provinces']),
+                load_records(options['districts']),
+                load_records(options['local_levels']),
+                load_records(options['departments']),
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+        for name, (created, updated) in stats.items():
+            self.stdout.write(f'{name}: {created} created, {updated} updated')
+        self.stdout.write(self.style.SUCCESS(f'Imported in {elapsed:.3f}s.'))
@@ -0,0 +1,45 @@
+import contextlib
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.ingest import INGEST_TARGETS, default_batch_size, ingest_ndjson
+from base.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load feedback or grievance records from an NDJSON file ("-" for stdin).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(INGEST_TARGETS))
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Username the records are filed under.')
+        parser.add_argument('--batch-size', type=int, default=default_batch_size())
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['user'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" does not exist.')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive.')
+
+        if options['path'] == '-':
+            source = contextlib.nullcontext(sys.stdin)
+        else:
+            try:
+                source = open(options['path'], encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        created = failed = 0
+        with source as lines:
+            for result in ingest_ndjson(options['kind'], lines, user.pk, batch_size=options['batch_size']):
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+                    self.stderr.write(json.dumps(result))
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} {options["kind"]} records, {failed} failed.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from base.dedup import rebuild_signatures
+
+
+class Command(BaseCommand):
+    help = 'Recompute the MinHash signature of every grievance for duplicate detection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_signatures(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} grievance signatures.'))
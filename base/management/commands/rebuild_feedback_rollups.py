@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from base.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute every feedback rating rollup from the Feedback table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} feedback rollups.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from base.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the grievance full-text search index from the Grievance table.'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} grievances ({backend.name} backend).'))
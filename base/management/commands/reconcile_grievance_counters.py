@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from base.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the dashboard grievance counters with the grievance tables and report drift; '
+        'with --repair, correct it. Fails when drift is found and not repaired.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--municipality', type=int, help='Check only this municipality.')
+        parser.add_argument('--repair', action='store_true', help='Correct the counters that drifted.')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(options['municipality'], repair=options['repair'])
+        for (municipality_id, department_id, status), (counter, actual) in sorted(drift.items()):
+            counter = 'missing' if counter is None else counter
+            self.stdout.write(f'{municipality_id}/{department_id} {status}: counter {counter}, actual {actual}')
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Grievance counters match.'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(drift)} grievance counters.'))
+        else:
+            raise CommandError(f'{len(drift)} grievance counters drifted; rerun with --repair to correct them.')
@@ -0,0 +1,53 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from base.dbrouter import replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into replica files with the SQLite online backup API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replica aliases; defaults to DATABASE_REPLICAS.')
+        parser.add_argument('--interval', type=float, help='Keep running, syncing every N seconds.')
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages copied per step, so the primary is never locked for long.')
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or replicas()
+        if not aliases:
+            raise CommandError('No replicas: pass aliases or set DATABASE_REPLICAS.')
+        paths = [self.sqlite_path(alias) for alias in aliases]
+        primary = self.sqlite_path(DEFAULT_DB_ALIAS)
+        while True:
+            for alias, path in zip(aliases, paths):
+                started = time.perf_counter()
+                self.sync(primary, path, options['pages'])
+                self.stdout.write(f'Synced {alias} in {time.perf_counter() - started:.3f}s.')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sqlite_path(self, alias):
+        config = settings.DATABASES.get(alias)
+        if config is None:
+            raise CommandError(f'Unknown database alias "{alias}".')
+        if config['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError(f'"{alias}" is not a SQLite database.')
+        return str(config['NAME'])
+
+    def sync(self, primary, replica, pages):
+        # backup() restarts by itself if the primary changes mid-copy, and the
+        # replica is locked while pages are written, so readers there see
+        # either the old copy or the new one.
+        source = sqlite3.connect(primary)
+        target = sqlite3.connect(replica)
+        try:
+            source.backup(target, pages=pages, sleep=0.005)
+        finally:
+            target.close()
+            source.close()
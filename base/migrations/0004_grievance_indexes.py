@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0003_customuser_municipality'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['municipality', 'created'], name='grievance_muni_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['municipality', 'status', 'created'], name='grievance_muni_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['municipality', 'department', 'created'], name='grievance_muni_dept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['user', 'created'], name='grievance_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_feedbackspoolbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.BigIntegerField(default=0)),
+                ('rating_sum_sq', models.BigIntegerField(default=0)),
+                ('histogram', models.JSONField(default=dict)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.department')),
+                ('municipality', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.municipality')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['municipality', 'day'], name='feedback_rollup_muni_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('municipality', 'department', 'day'), name='feedback_rollup_key')],
+            },
+        ),
+    ]
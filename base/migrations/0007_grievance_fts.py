@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    # SQLite only, and only when the library was built with FTS5; other
+    # setups fall back to base.search.MemoryBackend.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS base_grievance_fts USING fts5("
+            "title, description, municipality_id UNINDEXED, user_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        return
+    schema_editor.execute(
+        "INSERT INTO base_grievance_fts (rowid, title, description, municipality_id, user_id) "
+        "SELECT id, title, description, municipality_id, user_id FROM base_grievance"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS base_grievance_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_feedbackrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
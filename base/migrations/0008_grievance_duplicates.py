@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_grievance_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grievance',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='base.grievance'),
+        ),
+        migrations.CreateModel(
+            name='GrievanceSignature',
+            fields=[
+                ('grievance', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='base.grievance')),
+                ('municipality_id', models.BigIntegerField()),
+                ('department_id', models.BigIntegerField()),
+                ('active', models.BooleanField(default=True)),
+                ('signature', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['municipality_id', 'department_id', 'active'], name='grievance_sig_partition_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_district'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('grievance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='base.grievance')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grievance', 'created'], name='transition_grievance_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing(apps, schema_editor):
+    Grievance = apps.get_model('base', 'Grievance')
+    GrievanceStatusCount = apps.get_model('base', 'GrievanceStatusCount')
+    rows = Grievance.objects.values_list('municipality_id', 'department_id', 'status').annotate(n=Count('id')).order_by()
+    GrievanceStatusCount.objects.bulk_create(
+        GrievanceStatusCount(municipality_id=m, department_id=d, status=status, count=n) for m, d, status, n in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_grievancetransition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.department')),
+                ('municipality', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.municipality')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('municipality', 'department', 'status'), name='grievance_status_count_key')],
+            },
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_grievancestatuscount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGrievance',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('duplicate_of', models.BigIntegerField(blank=True, null=True)),
+                ('archived', models.DateTimeField()),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.department')),
+                ('municipality', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.municipality')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedGrievanceResponse',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('response', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('grievance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='base.archivedgrievance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedGrievanceTransition',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('from_status', models.CharField(max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('created', models.DateTimeField()),
+                ('grievance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='base.archivedgrievance')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedgrievance',
+            index=models.Index(fields=['municipality', 'created'], name='archived_muni_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedgrievance',
+            index=models.Index(fields=['user', 'created'], name='archived_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+SEEDED_DEPARTMENTS = ['Health Services', 'Education', 'Public Works']
+
+
+def link_seeded_departments(apps, schema_editor):
+    # 0002 linked its departments to the municipalities before seeding any,
+    # so they were left with none. Link those still unlinked to every
+    # municipality, as 0002 meant to.
+    Department = apps.get_model('base', 'Department')
+    Municipality = apps.get_model('base', 'Municipality')
+    Link = Department.municipalities.through
+    unlinked = Department.objects.filter(name__in=SEEDED_DEPARTMENTS, municipalities__isnull=True)
+    municipality_ids = list(Municipality.objects.values_list('id', flat=True))
+    Link.objects.bulk_create(
+        [Link(department_id=department_id, municipality_id=municipality_id)
+         for department_id in unlinked.values_list('id', flat=True) for municipality_id in municipality_ids],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_seeded_departments, migrations.RunPython.noop),
+    ]
@@ -23,9 +23,22 @@ class State(models.Model):
     def __str__(self):
         return self.name
 
+class District(models.Model):
+    name = models.CharField(max_length=100)
+    state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='districts')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'name'], name='district_state_name_uniq'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 class Municipality(models.Model):
     name = models.CharField(max_length=100)
     state = models.ForeignKey(State, on_delete=models.CASCADE, related_name='municipalities')
+    district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, related_name='municipalities')
 
     def __str__(self):
         return self.name
@@ -68,10 +81,52 @@ class Grievance(models.Model):
         ],
         default='OPEN'
     )
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )  # Set when submitted as a likely duplicate of an open grievance
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['municipality', 'created'], name='grievance_muni_created_idx'),
+            models.Index(fields=['municipality', 'status', 'created'], name='grievance_muni_status_idx'),
+            models.Index(fields=['municipality', 'department', 'created'], name='grievance_muni_dept_idx'),
+            models.Index(fields=['user', 'created'], name='grievance_user_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status and counter key, so base.signals can tell when a
+        # save changes them
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_counter_key = tuple(
+            instance.__dict__.get(name) for name in ('municipality_id', 'department_id', 'status')
+        )
+        return instance
 
     def __str__(self):
         return self.title
 
+class GrievanceSignature(models.Model):
+    # MinHash signature used by base.dedup to find near-duplicate grievances.
+    grievance = models.OneToOneField(Grievance, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    municipality_id = models.BigIntegerField()
+    department_id = models.BigIntegerField()
+    active = models.BooleanField(default=True)  # Only open grievances attract duplicates
+    signature = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['municipality_id', 'department_id', 'active'], name='grievance_sig_partition_idx'),
+        ]
+
+    def __str__(self):
+        return f"Signature of grievance {self.grievance_id}"
+
 class GrievanceResponse(models.Model):
     grievance = models.ForeignKey(Grievance, on_delete=models.CASCADE, related_name='responses')
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -80,4 +135,118 @@ class GrievanceResponse(models.Model):
     updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Response to {self.grievance}"
\ No newline at end of file
+        return f"Response to {self.grievance}"
+
+class GrievanceTransition(models.Model):
+    # Append-only audit of status changes, written by base.transitions.
+    grievance = models.ForeignKey(Grievance, on_delete=models.CASCADE, related_name='transitions')
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grievance', 'created'], name='transition_grievance_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Grievance transitions cannot be changed.')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Grievance {self.grievance_id}: {self.from_status} -> {self.to_status}"
+
+class FeedbackSpoolBatch(models.Model):
+    # Marks a write-behind spool segment as flushed into Feedback, so a
+    # segment replayed after a crash is not inserted twice.
+    segment = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.segment
+
+class FeedbackRollup(models.Model):
+    # Daily rating aggregates kept in step with Feedback by base.rollups.
+    municipality = models.ForeignKey(Municipality, on_delete=models.CASCADE, related_name='+')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    rating_sum = models.BigIntegerField(default=0)
+    rating_sum_sq = models.BigIntegerField(default=0)
+    histogram = models.JSONField(default=dict)  # {"<rating>": count}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['municipality', 'department', 'day'], name='feedback_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['municipality', 'day'], name='feedback_rollup_muni_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.municipality_id}/{self.department_id} on {self.day}"
+
+class GrievanceStatusCount(models.Model):
+    # Grievances per (municipality, department, status), kept in step with
+    # Grievance by base.counters for the dashboard.
+    municipality = models.ForeignKey(Municipality, on_delete=models.CASCADE, related_name='+')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['municipality', 'department', 'status'], name='grievance_status_count_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.municipality_id}/{self.department_id} {self.status}: {self.count}"
+
+class ArchivedGrievance(models.Model):
+    # CLOSED grievances moved out of Grievance by base.archive, keeping their
+    # ids. Still counted in GrievanceStatusCount.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+    municipality = models.ForeignKey(Municipality, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    duplicate_of = models.BigIntegerField(null=True, blank=True)  # A Grievance or ArchivedGrievance id
+    archived = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['municipality', 'created'], name='archived_muni_created_idx'),
+            models.Index(fields=['user', 'created'], name='archived_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+class ArchivedGrievanceResponse(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    grievance = models.ForeignKey(ArchivedGrievance, on_delete=models.CASCADE, related_name='responses')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    response = models.TextField()
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+
+    def __str__(self):
+        return f"Response to {self.grievance}"
+
+class ArchivedGrievanceTransition(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    grievance = models.ForeignKey(ArchivedGrievance, on_delete=models.CASCADE, related_name='transitions')
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    created = models.DateTimeField()
+
+    def __str__(self):
+        return f"Grievance {self.grievance_id}: {self.from_status} -> {self.to_status}"
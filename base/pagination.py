@@ -0,0 +1,125 @@
+import base64
+import heapq
+from urllib import parse
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Newest first on (created, id). Only used when the client sends `cursor`
+    # or `page_size`, so existing callers still get the plain list.
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        # One page across querysets whose ids never collide (live and
+        # archived grievances), merged newest first.
+        limited = [self.page_queryset(queryset, request) for queryset in querysets]
+        if limited[0] is None:
+            return None
+        return self.set_page(merge_newest_first([list(queryset) for queryset in limited]))
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        limited = [self.page_queryset(queryset, request) for queryset in querysets]
+        if limited[0] is None:
+            return None
+        return self.set_page(merge_newest_first([[row async for row in queryset] for queryset in limited]))
+
+    def page_queryset(self, queryset, request):
+        # The page plus one row to tell whether there is a next page.
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.limit = self.get_page_size(request)
+        queryset = self.filter_after(queryset.order_by('-created', '-id'), self.decode_cursor(request))
+        return queryset[:self.limit + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def filter_after(self, queryset, position):
+        if position is None:
+            return queryset
+        created, pk = position
+        # A range on `created` keeps the (…, created) indexes usable; the
+        # exclude only trims ties on the boundary timestamp.
+        return queryset.filter(created__lte=created).exclude(created=created, id__gte=pk)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            querystring = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created = parse_datetime(tokens['c'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created, pk
+
+    def encode_cursor(self, created, pk):
+        querystring = parse.urlencode({'c': created.isoformat(), 'i': pk}, doseq=True)
+        encoded = base64.urlsafe_b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(last.created, last.pk)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def merge_newest_first(pages):
+    # Rows from pages that are each ordered by (-created, -id).
+    return list(heapq.merge(*pages, key=lambda row: (row.created, row.pk), reverse=True))
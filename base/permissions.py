@@ -1,5 +1,6 @@
 from rest_framework import permissions
-from django.contrib.auth.models import Group
+
+from .roles import aget_role, get_role
 
 class IsOfficialForMunicipality(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -9,14 +10,37 @@ class IsOfficialForMunicipality(permissions.BasePermission):
         # For POST/PATCH, check if user is in Officials group and has a municipality
         if not request.user.is_authenticated:
             return False
-        return request.user.groups.filter(name='Officials').exists() and request.user.municipality is not None
+        role = get_role(request)
+        return role.is_official and role.municipality_id is not None
 
     def has_object_permission(self, request, view, obj):
         # Allow GET for all authenticated users
         if request.method in permissions.SAFE_METHODS:
             return request.user.is_authenticated
         # For POST/PATCH, ensure the object's municipality matches the user's
-        return (
-            request.user.groups.filter(name='Officials').exists() and
-            request.user.municipality == obj.municipality
-        )
\ No newline at end of file
+        role = get_role(request)
+        return role.is_official and role.municipality_id == obj.municipality_id
+
+class AsyncIsOfficialForMunicipality:
+    # IsOfficialForMunicipality for the async views in base.async_views.
+    async def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return request.user.is_authenticated
+        if not request.user.is_authenticated:
+            return False
+        role = await aget_role(request)
+        return role.is_official and role.municipality_id is not None
+
+    async def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return request.user.is_authenticated
+        role = await aget_role(request)
+        return role.is_official and role.municipality_id == obj.municipality_id
+
+
+class AsyncIsAuthenticated:
+    async def has_permission(self, request, view):
+        return request.user.is_authenticated
+
+    async def has_object_permission(self, request, view, obj):
+        return True
@@ -0,0 +1,266 @@
+import contextlib
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.response import Response
+
+# Upper bounds in seconds for the request duration histogram.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+PHASES = ('auth', 'perm', 'db', 'ser', 'render')
+MAX_RECENT = 2048  # Samples per route kept for the rolling quantiles
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def profiling_enabled():
+    return getattr(settings, 'REQUEST_PROFILING', False)
+
+
+class RequestProfile:
+    # Time per phase for one request. Phases include the SQL they run, so db
+    # overlaps auth/perm/ser.
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.queries = 0
+        self._depth = defaultdict(int)
+
+    def server_timing(self, total):
+        metrics = []
+        for name in PHASES:
+            if name in self.durations:
+                metric = f'{name};dur={self.durations[name] * 1000:.1f}'
+                if name == 'db':
+                    metric += f';desc="{self.queries} queries"'
+                metrics.append(metric)
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextlib.contextmanager
+def phase(name):
+    # Only the outermost entry into a phase is timed, so nested serializers
+    # or permission checks are not counted twice.
+    profile = _current.get()
+    if profile is None or profile._depth[name]:
+        yield
+        return
+    profile._depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.durations[name] += time.perf_counter() - started
+        profile._depth[name] -= 1
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.queries += 1
+            profile.durations['db'] += time.perf_counter() - started
+
+
+class ProfiledViewMixin:
+    # For APIViews: times authentication and permission checks, and renders
+    # the response inside the view so rendering is timed too. Each hook costs
+    # one ContextVar lookup when the request is not being profiled.
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with phase('perm'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with phase('perm'):
+            super().check_object_permissions(request, obj)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if _current.get() is not None and isinstance(response, Response):
+            with phase('render'):
+                response.render()
+        return response
+
+
+class ProfiledSerializerMixin:
+    # Times validation and representation, per item for many=True.
+    def run_validation(self, *args, **kwargs):
+        with phase('ser'):
+            return super().run_validation(*args, **kwargs)
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with phase('ser'):
+            return super().to_representation(instance)
+
+
+class RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.phases = defaultdict(float)
+        self.queries = 0
+        self.statuses = defaultdict(int)
+        self.recent = deque(maxlen=MAX_RECENT)  # (monotonic time, seconds)
+
+
+class ProfileRegistry:
+    # Cumulative per-route histograms and phase totals for Prometheus, plus
+    # quantiles over the last PROFILING_WINDOW seconds.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(RouteStats)
+
+    def record(self, route, method, status, seconds, profile):
+        now = time.monotonic()
+        with self._lock:
+            stats = self._routes[route, method]
+            stats.count += 1
+            stats.total += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+            for name, value in profile.durations.items():
+                stats.phases[name] += value
+            stats.queries += profile.queries
+            stats.statuses[status // 100] += 1
+            stats.recent.append((now, seconds))
+
+    def snapshot(self):
+        window = getattr(settings, 'PROFILING_WINDOW', 300)
+        cutoff = time.monotonic() - window
+        with self._lock:
+            rows = []
+            for (route, method), stats in sorted(self._routes.items()):
+                recent = sorted(seconds for at, seconds in stats.recent if at >= cutoff)
+                rows.append((route, method, stats, list(stats.buckets), dict(stats.phases), dict(stats.statuses), recent))
+            return rows
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+registry = ProfileRegistry()
+
+
+class ProfilingMiddleware:
+    # Opt in with REQUEST_PROFILING = True. Adds a Server-Timing header and
+    # feeds the registry behind api/admin/metrics/. Phases other than db are
+    # timed by views with ProfiledViewMixin and serializers with
+    # ProfiledSerializerMixin. Streaming bodies are
+    # produced after the middleware returns, so their SQL is not counted.
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None and match.view_name else 'unmatched'
+        registry.record(route, request.method, response.status_code, total, profile)
+        response['Server-Timing'] = profile.server_timing(total)
+        return response
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def prometheus_text(extra=None):
+    # Prometheus text exposition format (version 0.0.4).
+    lines = [
+        '# HELP fng_request_duration_seconds Request latency by route.',
+        '# TYPE fng_request_duration_seconds histogram',
+    ]
+    rows = registry.snapshot()
+    for route, method, stats, buckets, _, _, _ in rows:
+        labels = f'route="{_label(route)}",method="{method}"'
+        for bound, count in zip(BUCKETS, buckets):
+            lines.append(f'fng_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'fng_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+        lines.append(f'fng_request_duration_seconds_sum{{{labels}}} {stats.total}')
+        lines.append(f'fng_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+    lines += [
+        '# HELP fng_request_recent_duration_seconds Request latency quantiles over the profiling window.',
+        '# TYPE fng_request_recent_duration_seconds summary',
+    ]
+    for route, method, _, _, _, _, recent in rows:
+        labels = f'route="{_label(route)}",method="{method}"'
+        for q in QUANTILES:
+            if recent:
+                lines.append(f'fng_request_recent_duration_seconds{{{labels},quantile="{q}"}} {_quantile(recent, q)}')
+        lines.append(f'fng_request_recent_duration_seconds_sum{{{labels}}} {sum(recent)}')
+        lines.append(f'fng_request_recent_duration_seconds_count{{{labels}}} {len(recent)}')
+
+    lines += [
+        '# HELP fng_request_phase_seconds_total Time spent per request phase by route.',
+        '# TYPE fng_request_phase_seconds_total counter',
+    ]
+    for route, method, _, _, phases, _, _ in rows:
+        for name in PHASES:
+            if name in phases:
+                lines.append(
+                    f'fng_request_phase_seconds_total{{route="{_label(route)}",method="{method}",phase="{name}"}} {phases[name]}'
+                )
+
+    lines += [
+        '# HELP fng_request_queries_total SQL queries run by route.',
+        '# TYPE fng_request_queries_total counter',
+    ]
+    for route, method, stats, _, _, _, _ in rows:
+        lines.append(f'fng_request_queries_total{{route="{_label(route)}",method="{method}"}} {stats.queries}')
+
+    lines += [
+        '# HELP fng_requests_total Requests by route and status class.',
+        '# TYPE fng_requests_total counter',
+    ]
+    for route, method, _, _, _, statuses, _ in rows:
+        for status_class, count in sorted(statuses.items()):
+            lines.append(
+                f'fng_requests_total{{route="{_label(route)}",method="{method}",status="{status_class}xx"}} {count}'
+            )
+
+    # extra: name -> (type, help, value), where value may be a dict of
+    # ((label, value), ...) -> sample for labelled series.
+    for name, (kind, help_text, value) in (extra or {}).items():
+        if value is None:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if isinstance(value, dict):
+            for labels, sample in sorted(value.items()):
+                label_text = ','.join(f'{key}="{_label(str(label))}"' for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {sample}')
+        else:
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
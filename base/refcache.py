@@ -0,0 +1,78 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .dbrouter import primary_reads
+
+Entry = namedtuple('Entry', ['version', 'loaded_at', 'data', 'body', 'etag'])
+
+
+class ReferenceCache:
+    # Serialized states, municipalities and departments, kept per process.
+    # Any write to those tables bumps the version (see base.signals); entries
+    # also expire after REFERENCE_CACHE_TTL so other processes' writes show up.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.version = 0
+
+    def get(self, key, loader):
+        entry = self._fresh(key)
+        if entry is not None:
+            return entry
+        version = self.version
+        with primary_reads():  # A lagging replica would be cached for the whole TTL
+            data = loader()
+        return self._store(key, version, data)
+
+    async def aget(self, key, loader):
+        # get() for async views; loader is a coroutine function. Entries are
+        # shared with the sync views.
+        entry = self._fresh(key)
+        if entry is not None:
+            return entry
+        version = self.version
+        with primary_reads():
+            data = await loader()
+        return self._store(key, version, data)
+
+    def _fresh(self, key):
+        ttl = getattr(settings, 'REFERENCE_CACHE_TTL', 3600)
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == self.version and time.monotonic() - entry.loaded_at < ttl:
+            return entry
+        return None
+
+    def _store(self, key, version, data):
+        body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+        etag = '"{}-{}"'.format(key[0], hashlib.sha1(body).hexdigest())
+        entry = Entry(version, time.monotonic(), data, body, etag)
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def cached_response(request, entry):
+    # 304 when If-None-Match carries the entry's ETag; otherwise the
+    # pre-rendered JSON body.
+    if entry.data is None:
+        return None
+    response = HttpResponse(entry.body, content_type='application/json')
+    response['ETag'] = entry.etag
+    return get_conditional_response(request, etag=entry.etag, response=response)
@@ -0,0 +1,28 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # Optional; the renderer is only registered when installed (see MSGPACK_RENDERER)
+    msgpack = None
+
+_encoder = DjangoJSONEncoder()
+
+
+def _encode(value):
+    # Dates, decimals, UUIDs and lazy strings as the JSON responses write them.
+    return _encoder.default(value)
+
+
+class MessagePackRenderer(BaseRenderer):
+    # Accept: application/msgpack (or ?format=msgpack). Same data as the JSON
+    # responses in a smaller body.
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode, use_bin_type=True)
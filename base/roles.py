@@ -0,0 +1,127 @@
+from collections import namedtuple
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+OFFICIALS_GROUP = 'Officials'
+
+Role = namedtuple('Role', ['is_official', 'municipality_id', 'municipality_name'])
+
+ANONYMOUS_ROLE = Role(False, None, None)
+
+_GENERATION_KEY = 'role:generation'
+_CHANGED_ALL_KEY = 'role:changed'
+
+
+def _timeout():
+    return getattr(settings, 'ROLE_CACHE_TIMEOUT', 300)
+
+
+def _generation():
+    generation = cache.get(_GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(_GENERATION_KEY, generation, None)
+    return generation
+
+
+def _cache_key(user_id):
+    return f'role:{_generation()}:{user_id}'
+
+
+def load_role(user):
+    from .models import Municipality
+
+    is_official = user.groups.filter(name=OFFICIALS_GROUP).exists()
+    municipality_name = None
+    if user.municipality_id is not None:
+        municipality_name = (
+            Municipality.objects.filter(pk=user.municipality_id).values_list('name', flat=True).first()
+        )
+    return Role(is_official, user.municipality_id if municipality_name is not None else None, municipality_name)
+
+
+async def aload_role(user):
+    from .models import Municipality
+
+    is_official = await user.groups.filter(name=OFFICIALS_GROUP).aexists()
+    municipality_name = None
+    if user.municipality_id is not None:
+        municipality_name = (
+            await Municipality.objects.filter(pk=user.municipality_id).values_list('name', flat=True).afirst()
+        )
+    return Role(is_official, user.municipality_id if municipality_name is not None else None, municipality_name)
+
+
+def get_role(request):
+    # Memoised on the request so permissions, views and serializers share one
+    # lookup; the cache shares the result across requests.
+    role = getattr(request, '_role', None)
+    if role is None:
+        role = get_user_role(request.user)
+        request._role = role
+    return role
+
+
+def get_user_role(user):
+    if not user.is_authenticated:
+        return ANONYMOUS_ROLE
+    claims_role = getattr(user, 'claims_role', None)  # Stateless token users carry their role
+    if claims_role is not None:
+        return claims_role
+    key = _cache_key(user.pk)
+    role = cache.get(key)
+    if role is None:
+        role = load_role(user)
+        cache.set(key, role, _timeout())
+    return role
+
+
+async def aget_role(request):
+    role = getattr(request, '_role', None)
+    if role is None:
+        role = await aget_user_role(request.user)
+        request._role = role
+    return role
+
+
+async def aget_user_role(user):
+    # Shares cache entries with get_user_role. Cache calls stay synchronous:
+    # the cache is in-process, where a thread hop costs more than the lookup.
+    if not user.is_authenticated:
+        return ANONYMOUS_ROLE
+    claims_role = getattr(user, 'claims_role', None)
+    if claims_role is not None:
+        return claims_role
+    key = _cache_key(user.pk)
+    role = cache.get(key)
+    if role is None:
+        role = await aload_role(user)
+        cache.set(key, role, _timeout())
+    return role
+
+
+def role_changed_at(user_id):
+    # When this process last saw the user's role change, if it still remembers.
+    stamps = cache.get_many([f'role:changed:{user_id}', _CHANGED_ALL_KEY])
+    return max(stamps.values(), default=None)
+
+
+def _claims_window():
+    return getattr(settings, 'ROLE_CLAIMS_MAX_AGE', 300)
+
+
+def invalidate_role(*user_ids):
+    generation = _generation()
+    cache.delete_many([f'role:{generation}:{user_id}' for user_id in user_ids])
+    now = time.time()
+    cache.set_many({f'role:changed:{user_id}': now for user_id in user_ids}, _claims_window())
+
+
+def invalidate_all_roles():
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, 1, None)
+    cache.set(_CHANGED_ALL_KEY, time.time(), _claims_window())
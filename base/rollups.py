@@ -0,0 +1,98 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Feedback, FeedbackRollup
+
+
+def rollup_key(municipality_id, department_id, created):
+    return municipality_id, department_id, timezone.localdate(created)
+
+
+def feedback_deltas(feedback, sign=1):
+    # {(municipality_id, department_id, day): Counter({rating: +/-n})}
+    deltas = defaultdict(Counter)
+    for item in feedback:
+        deltas[rollup_key(item.municipality_id, item.department_id, item.created)][item.rating] += sign
+    return deltas
+
+
+def apply_deltas(deltas):
+    with transaction.atomic():
+        for (municipality_id, department_id, day), ratings in deltas.items():
+            ratings = {rating: n for rating, n in ratings.items() if n}
+            if not ratings:
+                continue
+            key = {'municipality_id': municipality_id, 'department_id': department_id, 'day': day}
+            rollup = FeedbackRollup.objects.select_for_update().filter(**key).first()
+            if rollup is None:
+                # A missing rollup has nothing to take away from: deleting a
+                # department or municipality removes its rollups before the
+                # feedback whose post_delete lands here.
+                ratings = {rating: n for rating, n in ratings.items() if n > 0}
+                if not ratings:
+                    continue
+                rollup, _ = FeedbackRollup.objects.get_or_create(**key)
+            histogram = Counter(rollup.histogram)
+            for rating, n in ratings.items():
+                rollup.count += n
+                rollup.rating_sum += rating * n
+                rollup.rating_sum_sq += rating * rating * n
+                histogram[str(rating)] += n
+            rollup.histogram = {rating: n for rating, n in sorted(histogram.items()) if n}
+            if rollup.count:
+                rollup.save()
+            else:
+                rollup.delete()
+
+
+def record_feedback(feedback, sign=1):
+    apply_deltas(feedback_deltas(feedback, sign))
+
+
+def summarize(rollups):
+    count = rating_sum = rating_sum_sq = 0
+    histogram = Counter()
+    for rollup in rollups:
+        count += rollup.count
+        rating_sum += rollup.rating_sum
+        rating_sum_sq += rollup.rating_sum_sq
+        histogram.update(rollup.histogram)
+    mean = rating_sum / count if count else None
+    variance = max(rating_sum_sq / count - mean * mean, 0.0) if count else None
+    return {
+        'count': count,
+        'mean': mean,
+        'variance': variance,
+        'histogram': dict(sorted(histogram.items(), key=lambda item: int(item[0]))),
+    }
+
+
+def rebuild_rollups(batch_size=1000):
+    rows = (
+        Feedback.objects
+        .annotate(day=TruncDate('created'))
+        .values('municipality_id', 'department_id', 'day', 'rating')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    rollups = {}
+    for row in rows.iterator():
+        key = (row['municipality_id'], row['department_id'], row['day'])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = FeedbackRollup(
+                municipality_id=key[0], department_id=key[1], day=key[2], histogram={},
+            )
+        rating, n = row['rating'], row['n']
+        rollup.count += n
+        rollup.rating_sum += rating * n
+        rollup.rating_sum_sq += rating * rating * n
+        rollup.histogram[str(rating)] = rollup.histogram.get(str(rating), 0) + n
+    with transaction.atomic():
+        FeedbackRollup.objects.all().delete()
+        FeedbackRollup.objects.bulk_create(rollups.values(), batch_size=batch_size)
+    return len(rollups)
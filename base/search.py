@@ -0,0 +1,229 @@
+import bisect
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+FTS_TABLE = 'base_grievance_fts'
+TITLE_WEIGHT = 2.0
+
+_TOKEN_RE = re.compile(r'\w+\*?')
+_WORD_RE = re.compile(r'\w+')
+
+
+def parse_query(query):
+    # [(term, is_prefix)]. A trailing * asks for a prefix match and the last
+    # term is always one, so results follow the user as they type.
+    terms = []
+    for token in _TOKEN_RE.findall(query.lower()):
+        prefix = token.endswith('*')
+        term = token.rstrip('*')
+        if term:
+            terms.append([term, prefix])
+    if terms:
+        terms[-1][1] = True
+    return [tuple(term) for term in terms]
+
+
+def tokenize(text):
+    return _WORD_RE.findall(text.lower())
+
+
+class FTS5Backend:
+    # SQLite FTS5 table keyed by grievance id, written in the same transaction
+    # as the grievance row.
+    name = 'fts5'
+
+    def index(self, grievances):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, title, description, municipality_id, user_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [(g.pk, g.title, g.description, g.municipality_id, g.user_id) for g in grievances],
+            )
+
+    def remove(self, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in pks])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description, municipality_id, user_id) '
+                'SELECT id, title, description, municipality_id, user_id FROM base_grievance'
+            )
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def search(self, query, municipality_id=None, user_id=None, limit=20, offset=0):
+        terms = parse_query(query)
+        if not terms:
+            return []
+        match = ' AND '.join('"{}"{}'.format(term.replace('"', '""'), '*' if prefix else '') for term, prefix in terms)
+        sql = [
+            f'SELECT rowid, bm25({FTS_TABLE}, %s, 1.0) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        ]
+        params = [TITLE_WEIGHT, match]
+        if municipality_id is not None:
+            sql.append('AND municipality_id = %s')
+            params.append(municipality_id)
+        if user_id is not None:
+            sql.append('AND user_id = %s')
+            params.append(user_id)
+        sql.append('ORDER BY rank, rowid LIMIT %s OFFSET %s')
+        params += [limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(' '.join(sql), params)
+            # FTS5 reports bm25 as negative; flip it so higher is better.
+            return [(pk, -rank) for pk, rank in cursor.fetchall()]
+
+
+class MemoryBackend:
+    # Pure-Python inverted index with Okapi BM25 for databases without FTS5.
+    # Built from the database on first use and kept current by the signal
+    # handlers; rebuilt after SEARCH_INDEX_MAX_AGE seconds so changes made by
+    # other processes show up eventually.
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._reset()
+
+    def _reset(self):
+        self.postings = defaultdict(dict)  # term -> {pk: weighted tf}
+        self.doc_terms = {}  # pk -> Counter of weighted tf
+        self.doc_length = {}
+        self.scope = {}  # pk -> (municipality_id, user_id)
+        self.total_length = 0.0
+        self._vocabulary = None
+
+    def _ensure_built(self):
+        max_age = getattr(settings, 'SEARCH_INDEX_MAX_AGE', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > max_age:
+            self.rebuild()
+
+    def _add(self, grievance):
+        self._discard(grievance.pk)
+        terms = Counter()
+        for term in tokenize(grievance.title):
+            terms[term] += TITLE_WEIGHT
+        for term in tokenize(grievance.description):
+            terms[term] += 1.0
+        for term, tf in terms.items():
+            if term not in self.postings:
+                self._vocabulary = None
+            self.postings[term][grievance.pk] = tf
+        self.doc_terms[grievance.pk] = terms
+        self.doc_length[grievance.pk] = sum(terms.values())
+        self.total_length += self.doc_length[grievance.pk]
+        self.scope[grievance.pk] = (grievance.municipality_id, grievance.user_id)
+
+    def _discard(self, pk):
+        terms = self.doc_terms.pop(pk, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(pk, None)
+            if not docs:
+                del self.postings[term]
+                self._vocabulary = None
+        self.total_length -= self.doc_length.pop(pk)
+        self.scope.pop(pk, None)
+
+    def index(self, grievances):
+        with self._lock:
+            if self._built_at is not None:
+                for grievance in grievances:
+                    self._add(grievance)
+
+    def remove(self, pks):
+        with self._lock:
+            for pk in pks:
+                self._discard(pk)
+
+    def rebuild(self):
+        from .models import Grievance
+
+        with self._lock:
+            self._reset()
+            fields = ('id', 'title', 'description', 'municipality_id', 'user_id')
+            for grievance in Grievance.objects.only(*fields).iterator(chunk_size=2000):
+                self._add(grievance)
+            self._built_at = time.monotonic()
+            return len(self.doc_terms)
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = bisect.bisect_left(self._vocabulary, term + '\uffff')
+        return self._vocabulary[start:end]
+
+    def search(self, query, municipality_id=None, user_id=None, limit=20, offset=0):
+        terms = parse_query(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_built()
+            doc_count = len(self.doc_terms)
+            if not doc_count:
+                return []
+            average_length = self.total_length / doc_count
+            scores = None
+            for term, prefix in terms:
+                # Every query term must match (AND), as in the FTS5 backend.
+                term_scores = Counter()
+                for expanded in self._expand(term, prefix):
+                    docs = self.postings[expanded]
+                    idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for pk, tf in docs.items():
+                        norm = self.k1 * (1 - self.b + self.b * self.doc_length[pk] / average_length)
+                        term_scores[pk] += idf * tf * (self.k1 + 1) / (tf + norm)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = Counter({pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores})
+                if not scores:
+                    return []
+            hits = [
+                (pk, score) for pk, score in scores.items()
+                if (municipality_id is None or self.scope[pk][0] == municipality_id)
+                and (user_id is None or self.scope[pk][1] == user_id)
+            ]
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits[offset:offset + limit]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+    except DatabaseError:
+        return False
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = FTS5Backend() if _fts5_available() else MemoryBackend()
+    return _backend
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import State, Municipality, Feedback, Grievance, GrievanceResponse, CustomUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import State, Municipality, Department, Feedback, Grievance, GrievanceResponse, CustomUser
+from .roles import get_role
+from .authentication import role_claims
+from .profiling import ProfiledSerializerMixin
 
 class CustomRegisterSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
@@ -32,30 +36,98 @@ class CustomRegisterSerializer(serializers.Serializer):
         )
         return user
 
-class StateSerializer(serializers.ModelSerializer):
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in role_claims(user).items():
+            token[claim] = value
+        return token
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves ids from context['preloaded'][Model] when a caller has loaded
+    # the related rows up front, e.g. bulk ingestion.
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.get_queryset().model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            instance = preloaded.get(self.pk_field.to_internal_value(data) if self.pk_field else int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+class SparseFieldsMixin:
+    # Renders only the fields named in context['fields'] (see
+    # base.filters.fieldset_param); ?expand= fields are always kept. Input
+    # fields are untouched, so writes validate as usual.
+    @property
+    def _readable_fields(self):
+        selected = self.context.get('fields')
+        for field in super()._readable_fields:
+            if selected is None or field.field_name in selected or field.field_name not in self.Meta.fields:
+                yield field
+
+class StateSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = State
         fields = ['id', 'name']
 
-class MunicipalitySerializer(serializers.ModelSerializer):
+class MunicipalitySerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Municipality
-        fields = ['id', 'name', 'state']
+        fields = ['id', 'name', 'state', 'district']
+
+class DepartmentSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Department
+        fields = ['id', 'name']
+
+class FeedbackSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    municipality = PreloadedPrimaryKeyRelatedField(queryset=Municipality.objects.all())
+    department = PreloadedPrimaryKeyRelatedField(queryset=Department.objects.all())
 
-class FeedbackSerializer(serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = ['id', 'rating', 'comment', 'municipality', 'department', 'user']
         read_only_fields = ['user']
 
-class GrievanceSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Grievance
-        fields = ['id', 'title', 'description', 'status', 'municipality', 'department', 'user']
-        read_only_fields = ['user', 'status']
-
-class GrievanceResponseSerializer(serializers.ModelSerializer):
+class GrievanceResponseSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = GrievanceResponse
         fields = ['id', 'response', 'grievance', 'user']
-        read_only_fields = ['user']
\ No newline at end of file
+        read_only_fields = ['user']
+
+    def validate_grievance(self, grievance):
+        request = self.context.get('request')
+        if request is not None and get_role(request).municipality_id != grievance.municipality_id:
+            raise serializers.ValidationError('You can only respond to grievances in your municipality.')
+        return grievance
+
+class GrievanceSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    municipality = PreloadedPrimaryKeyRelatedField(queryset=Municipality.objects.all())
+    department = PreloadedPrimaryKeyRelatedField(queryset=Department.objects.all())
+
+    class Meta:
+        model = Grievance
+        fields = ['id', 'title', 'description', 'status', 'municipality', 'department', 'user', 'duplicate_of']
+        read_only_fields = ['user', 'status', 'duplicate_of']
+
+    # ?expand= options: name -> (field name, field factory). Views pass the
+    # requested names as context['expand'] and load the matching relations.
+    expansions = {
+        'responses': ('responses', lambda: GrievanceResponseSerializer(many=True, read_only=True)),
+        'department': ('department_name', lambda: serializers.CharField(source='department.name', read_only=True)),
+        'municipality': ('municipality_name', lambda: serializers.CharField(source='municipality.name', read_only=True)),
+    }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.context.get('expand', ()):
+            field_name, factory = self.expansions[name]
+            fields[field_name] = factory()
+        return fields
@@ -0,0 +1,176 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import (
+    ArchivedGrievance, CustomUser, Department, Feedback, Grievance, GrievanceResponse, Municipality, State,
+)
+from .roles import invalidate_all_roles, invalidate_role
+from .rollups import apply_deltas, feedback_deltas, record_feedback
+from .search import get_search_backend
+from .refcache import reference_cache
+from .versions import bump_versions
+from .dedup import ACTIVE_STATUSES, activate, deactivate, get_duplicate_index, link_new_grievances, refresh_grievance
+from .events import grievance_channels, publish_event, publish_status_change
+from .counters import apply_status_deltas, record_grievances, saved_counter_key, transition_deltas
+from .archive import archiving
+
+# Sent by bulk writers (NDJSON ingestion, the feedback spool) after
+# bulk_create, which skips post_save. Receivers run inside the batch's
+# transaction. Arguments: sender (the model), instances.
+bulk_created = Signal()
+
+# Sent by base.transitions after a set-based status UPDATE, inside its
+# transaction. Arguments: sender (Grievance), transitions (the new
+# GrievanceTransition rows), municipality_id, owners (grievance id -> the user
+# who filed it), departments (grievance id -> its department).
+grievances_transitioned = Signal()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    invalidate_role(instance.pk)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_role(instance.pk)
+    elif pk_set:
+        invalidate_role(*pk_set)
+    else:
+        # group.user_set.clear() does not report which users were removed
+        invalidate_all_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+def role_source_changed(sender, **kwargs):
+    invalidate_all_roles()
+
+
+@receiver(pre_save, sender=Feedback)
+def feedback_before_save(sender, instance, **kwargs):
+    # Remember the stored row so an edit can move its rating between rollups.
+    instance._rollup_previous = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._rollup_previous = Feedback.objects.filter(pk=instance.pk).only(
+            'municipality_id', 'department_id', 'created', 'rating',
+        ).first()
+
+
+@receiver(post_save, sender=Feedback)
+def feedback_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if created or previous is None:
+        record_feedback([instance])
+        return
+    deltas = feedback_deltas([previous], sign=-1)
+    for key, ratings in feedback_deltas([instance]).items():
+        deltas[key].update(ratings)
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Feedback)
+def feedback_deleted(sender, instance, **kwargs):
+    record_feedback([instance], sign=-1)
+
+
+@receiver(bulk_created, sender=Feedback)
+def feedback_bulk_created(sender, instances, **kwargs):
+    record_feedback(instances)
+
+
+@receiver(post_save, sender=Grievance)
+def grievance_saved(sender, instance, created, update_fields=None, **kwargs):
+    bump_versions([instance.municipality_id], [instance.user_id])
+    if created:
+        record_grievances([instance])
+        instance._loaded_counter_key = (instance.municipality_id, instance.department_id, instance.status)
+        get_search_backend().index([instance])
+        link_new_grievances([instance])
+        return
+    loaded_key = getattr(instance, '_loaded_counter_key', (None,))
+    if None not in loaded_key:  # Otherwise unknown; reconcile_grievance_counters catches it
+        counter_key = saved_counter_key(instance, loaded_key, update_fields)
+        if counter_key != loaded_key:
+            apply_status_deltas({loaded_key: -1, counter_key: 1})
+            instance._loaded_counter_key = counter_key
+    previous_status = getattr(instance, '_loaded_status', None)
+    if previous_status is not None and previous_status != instance.status and (update_fields is None or 'status' in update_fields):
+        publish_status_change(instance.pk, instance.municipality_id, instance.user_id, instance.status, previous_status)
+        instance._loaded_status = instance.status
+    text_changed = update_fields is None or bool({'title', 'description', 'municipality', 'department'} & set(update_fields))
+    if text_changed:
+        get_search_backend().index([instance])
+    refresh_grievance(instance, text_changed=text_changed)
+
+
+@receiver(post_delete, sender=Grievance)
+def grievance_deleted(sender, instance, **kwargs):
+    if archiving():
+        return  # Moved, not gone; base.archive updates the indexes per batch
+    bump_versions([instance.municipality_id], [instance.user_id])
+    record_grievances([instance], sign=-1)
+    get_search_backend().remove([instance.pk])
+    get_duplicate_index().remove(instance.pk)
+
+
+@receiver(post_delete, sender=ArchivedGrievance)
+def archived_grievance_deleted(sender, instance, **kwargs):
+    record_grievances([instance], sign=-1)
+
+
+@receiver(bulk_created, sender=Grievance)
+def grievance_bulk_created(sender, instances, **kwargs):
+    bump_versions([g.municipality_id for g in instances], [g.user_id for g in instances])
+    record_grievances(instances)
+    get_search_backend().index(instances)
+    link_new_grievances(instances)
+
+
+@receiver(grievances_transitioned, sender=Grievance)
+def grievances_status_changed(sender, transitions, municipality_id, owners, departments, **kwargs):
+    bump_versions([municipality_id], owners.values())
+    apply_status_deltas(transition_deltas(transitions, municipality_id, departments))
+    activated = [t.grievance_id for t in transitions if t.to_status in ACTIVE_STATUSES and t.from_status not in ACTIVE_STATUSES]
+    deactivated = [t.grievance_id for t in transitions if t.to_status not in ACTIVE_STATUSES and t.from_status in ACTIVE_STATUSES]
+    if activated:
+        activate(activated)
+    if deactivated:
+        deactivate(deactivated)
+    for t in transitions:
+        publish_status_change(t.grievance_id, municipality_id, owners[t.grievance_id], t.to_status, t.from_status)
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=Municipality)
+@receiver(post_delete, sender=Municipality)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(m2m_changed, sender=Department.municipalities.through)
+def reference_data_changed(sender, **kwargs):
+    reference_cache.invalidate()
+
+
+@receiver(post_save, sender=GrievanceResponse)
+@receiver(post_delete, sender=GrievanceResponse)
+def grievance_response_changed(sender, instance, created=False, **kwargs):
+    if archiving():
+        return
+    owner = Grievance.objects.filter(pk=instance.grievance_id).values_list('municipality_id', 'user_id').first()
+    if owner is None:
+        return
+    bump_versions([owner[0]], [owner[1]])
+    if created:
+        publish_event('grievance.response', {
+            'grievance': instance.grievance_id,
+            'municipality': owner[0],
+            'response': {'id': instance.pk, 'response': instance.response, 'user': instance.user_id},
+        }, grievance_channels(*owner))
@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Segment files:
+#   current-<pid>.ndjson       appended to by one process, fsynced per record
+#   <time_ns>-<pid>.pending    rotated out, waiting to be inserted
+#   <name>.<pid>.flushing      claimed by the flusher in process <pid>
+#   <time_ns>-<pid>.failed     records the database rejected, kept for inspection
+#
+# A flusher claims a segment by renaming it, which only one process can do,
+# so two flushers (workers, or flush_feedback_spool beside the server) never
+# insert the same segment. Claims left by a process that died go back to
+# .pending, and the FeedbackSpoolBatch marker tells whether that segment was
+# committed before the crash.
+
+# Errors that will recur on every retry of a record. Anything else (a locked
+# or unreachable database) leaves the segment pending for the next flush.
+RECORD_ERRORS = (IntegrityError, DataError, KeyError, TypeError, ValueError)
+
+
+class FeedbackSpool:
+    def __init__(self, directory, flush_interval=1.0, batch_size=500):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self.flushed_total = 0
+        self.failed_records = 0
+        self.flush_count = 0
+        self.flush_seconds_total = 0.0
+        self.last_flush_seconds = None
+        self.last_error = None
+
+    @property
+    def current_path(self):
+        return self.directory / f'current-{os.getpid()}.ndjson'
+
+    def append(self, record):
+        record = dict(record, provisional_id=uuid.uuid4().hex)
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.current_path, 'ab')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self.start()
+        return record['provisional_id']
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.recover_orphans()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='feedback-spool', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:  # Keep the flusher alive; the spool is retried next cycle
+                self.last_error = str(exc)
+                logger.exception('Feedback spool flush failed')
+            finally:
+                close_old_connections()
+
+    def recover_orphans(self):
+        # Rotate current files left behind by processes that are gone, so their
+        # records are replayed by the next flush, and release their claims.
+        for path in self.directory.glob('current-*.ndjson'):
+            pid = int(path.stem.split('-', 1)[1])
+            if pid == os.getpid() or _pid_alive(pid):
+                continue
+            path.rename(self.directory / f'{time.time_ns()}-{pid}.pending')
+        for path in self.directory.glob('*.flushing'):
+            name, pid = path.stem.rsplit('.', 1)
+            if int(pid) == os.getpid() or _pid_alive(int(pid)):
+                continue
+            path.rename(self.directory / f'{name}.pending')
+
+    def rotate(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            self.current_path.rename(self.directory / f'{time.time_ns()}-{os.getpid()}.pending')
+
+    def flush(self):
+        with self._flush_lock:
+            self.rotate()
+            for path in sorted(self.directory.glob('*.pending')):
+                claimed = path.with_name(f'{path.stem}.{os.getpid()}.flushing')
+                try:
+                    path.rename(claimed)
+                except FileNotFoundError:
+                    continue  # Claimed by another process
+                try:
+                    self._flush_segment(claimed, path.name)
+                except Exception:
+                    claimed.rename(path)  # Back in the queue for the next flush
+                    raise
+
+    def _flush_segment(self, path, segment):
+        from .models import FeedbackSpoolBatch
+
+        started = time.perf_counter()
+        records, failed = _read_segment(path), []
+        if FeedbackSpoolBatch.objects.filter(segment=segment).exists():
+            count = 0  # Committed before a crash; only the file survived
+        else:
+            try:
+                count = self._insert(segment, [_feedback(record) for record in records])
+            except RECORD_ERRORS:
+                # Every record was acknowledged with a 202, so one the
+                # database rejects must not take the others down with it.
+                failed = self._insert_each(segment, records)
+                count = len(records) - len(failed)
+                if failed:
+                    self._set_aside(segment, failed)
+        path.unlink(missing_ok=True)
+        FeedbackSpoolBatch.objects.filter(segment=segment).delete()
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.flushed_total += count
+            self.flush_count += 1
+            self.flush_seconds_total += elapsed
+            self.last_flush_seconds = elapsed
+            if not failed:
+                self.last_error = None
+
+    def _insert(self, segment, feedback):
+        from .models import Feedback, FeedbackSpoolBatch
+        from .signals import bulk_created
+        from .writer import writer_lock
+
+        with writer_lock(), transaction.atomic():
+            Feedback.objects.bulk_create(feedback, batch_size=self.batch_size)
+            bulk_created.send(sender=Feedback, instances=feedback)
+            FeedbackSpoolBatch.objects.create(segment=segment, count=len(feedback))
+        return len(feedback)
+
+    def _insert_each(self, segment, records):
+        # Inserts the records one savepoint at a time in one transaction and
+        # returns [(record, error)] for those rejected. Foreign keys are
+        # checked up front: SQLite defers them to the commit.
+        from .models import CustomUser, Department, Feedback, FeedbackSpoolBatch, Municipality
+        from .signals import bulk_created
+        from .writer import writer_lock
+
+        parents = {'user_id': CustomUser, 'municipality_id': Municipality, 'department_id': Department}
+        inserted, failed = [], []
+        with writer_lock(), transaction.atomic():
+            present = {}
+            for field, model in parents.items():
+                ids = {record.get(field) for record in records if isinstance(record, dict)}
+                ids = {pk for pk in ids if isinstance(pk, int)}
+                present[field] = set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            for record in records:
+                try:
+                    feedback = _feedback(record)
+                    missing = [field for field in parents if getattr(feedback, field) not in present[field]]
+                    if missing:
+                        raise IntegrityError(f'No such {", ".join(missing)}')
+                    with transaction.atomic():
+                        Feedback.objects.bulk_create([feedback])
+                except RECORD_ERRORS as exc:
+                    failed.append((record, exc))
+                else:
+                    inserted.append(feedback)
+            bulk_created.send(sender=Feedback, instances=inserted)
+            FeedbackSpoolBatch.objects.create(segment=segment, count=len(inserted))
+        return failed
+
+    def _set_aside(self, segment, failed):
+        # The rejected records go to <segment>.failed for inspection or
+        # replay; the rest of the segment is in.
+        path = (self.directory / segment).with_suffix('.failed')
+        with open(path, 'ab') as f:
+            for record, exc in failed:
+                logger.error('Feedback spool record %s from %s was rejected: %r', _provisional_id(record), segment, exc)
+                f.write((json.dumps(record, default=str) + '\n').encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.failed_records += len(failed)
+            self.last_error = f'{segment}: {failed[-1][1]!r}'
+
+    def metrics(self):
+        segments = [
+            path for pattern in ('*.pending', '*.flushing', 'current-*.ndjson') for path in self.directory.glob(pattern)
+        ]
+        queue_depth = sum(_count_lines(path) for path in segments if path.exists())
+        with self._lock:
+            return {
+                'enabled': True,
+                'queue_depth': queue_depth,
+                'pending_segments': len(segments),
+                'flushed_total': self.flushed_total,
+                'failed_records': self.failed_records,
+                'flush_count': self.flush_count,
+                'last_flush_seconds': self.last_flush_seconds,
+                'mean_flush_seconds': self.flush_seconds_total / self.flush_count if self.flush_count else None,
+                'last_error': self.last_error,
+                'running': self._thread is not None and self._thread.is_alive(),
+            }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _feedback(record):
+    from .models import Feedback
+
+    return Feedback(
+        user_id=record['user_id'],
+        municipality_id=record['municipality_id'],
+        department_id=record['department_id'],
+        rating=record['rating'],
+        comment=record['comment'],
+    )
+
+
+def _provisional_id(record):
+    return record.get('provisional_id') if isinstance(record, dict) else None
+
+
+def _read_segment(path):
+    records = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn final write from a crash; the client was never acknowledged.
+                logger.warning('Skipping unreadable line in feedback spool segment %s', path.name)
+    return records
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'FEEDBACK_WRITE_BEHIND', False)
+
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = FeedbackSpool(
+                    getattr(settings, 'FEEDBACK_SPOOL_DIR', Path(settings.BASE_DIR) / 'spool' / 'feedback'),
+                    flush_interval=getattr(settings, 'FEEDBACK_SPOOL_FLUSH_INTERVAL', 1.0),
+                    batch_size=getattr(settings, 'BULK_INGEST_BATCH_SIZE', 500),
+                )
+    return _spool
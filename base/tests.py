@@ -1,3 +1,1181 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from . import events, search, throttling
+from .authentication import StatelessJWTAuthentication
+from .versions import bump_versions
+from .counters import reconcile_counters
+from .dedup import get_duplicate_index
+from .models import (
+    ArchivedGrievance, CustomUser, Department, Feedback, FeedbackRollup, FeedbackSpoolBatch, Grievance, GrievanceResponse, GrievanceStatusCount,
+    GrievanceTransition, Municipality, State,
+)
+from .roles import OFFICIALS_GROUP
+from .serializers import RoleTokenObtainPairSerializer
+from .spool import FeedbackSpool
+from .transitions import transition_grievances
+from .views import GrievanceDashboardAPIView
+from .writer import serialized_write
+
+
+class GrievanceExpandQueryCountTests(TestCase):
+    # A page of grievances with every expansion must cost the same number of
+    # queries however many grievances and responses it holds.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        department = Department.objects.create(name='Roads')
+        department.municipalities.add(cls.municipality)
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        grievances = Grievance.objects.bulk_create([
+            Grievance(
+                title=f'Pothole {i}', description=f'Street {i} needs repair',
+                municipality=cls.municipality, department=department, user=citizen,
+            )
+            for i in range(100)
+        ])
+        GrievanceResponse.objects.bulk_create([
+            GrievanceResponse(grievance=grievance, user=cls.official, response=f'Reply {n}')
+            for grievance in grievances for n in range(3)
+        ])
+        cls.grievance = grievances[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.official)
+        self.client.get('/api/user/profile/')  # Warm the role cache
+
+    def test_list_expanded_page(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/grievances/', {
+                'expand': 'responses,department,municipality', 'page_size': 100,
+            })
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 100)
+        self.assertEqual(len(results[0]['responses']), 3)
+        self.assertEqual(results[0]['department_name'], 'Roads')
+        self.assertEqual(results[0]['municipality_name'], 'Lalitpur')
+
+    def test_list_expanded_unpaginated(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/grievances/', {'expand': 'responses,department,municipality'})
+        self.assertEqual(len(response.data), 100)
+
+    def test_list_names_only(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/grievances/', {'expand': 'department,municipality'})
+        self.assertNotIn('responses', response.data[0])
+
+    def test_list_unknown_expansion(self):
+        response = self.client.get('/api/grievances/', {'expand': 'user'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/grievances/{self.grievance.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['response'] for r in response.data['responses']], ['Reply 0', 'Reply 1', 'Reply 2'])
+        self.assertEqual(response.data['department_name'], 'Roads')
+        self.assertEqual(response.data['municipality_name'], 'Lalitpur')
+
+    def test_detail_outside_scope(self):
+        other = CustomUser.objects.create_user('other', 'other@example.com', 'pass')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/api/grievances/{self.grievance.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+
+@contextlib.contextmanager
+def production_sqlite():
+    # Points the default connection, and those threads open, at a migrated
+    # temporary file database with SQLITE_PRODUCTION_OPTIONS (WAL,
+    # busy_timeout, IMMEDIATE transactions). The in-memory test database is
+    # kept open meanwhile; closing it would discard it.
+    settings_dict = connection.settings_dict
+    saved, memory = dict(settings_dict), connection.connection
+    with tempfile.TemporaryDirectory() as directory:
+        connection.connection = None
+        settings_dict.update(NAME=str(Path(directory) / 'production.sqlite3'), OPTIONS=settings.SQLITE_PRODUCTION_OPTIONS)
+        try:
+            call_command('migrate', verbosity=0, interactive=False)
+            yield
+        finally:
+            connection.close()
+            settings_dict.clear()
+            settings_dict.update(saved)
+            connection.connection = memory
+
+
+def process_writer(start, results, user_id, path, payloads):
+    # Runs in a forked child, which opens its own connection to the file
+    # database on first use.
+    try:
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.get(pk=user_id))
+        start.wait()
+        results.put([client.post(path, payload, format='json').status_code for payload in payloads])
+    except Exception as exc:
+        results.put(repr(exc))
+    finally:
+        connection.close()
+
+
+def hold_write_lock(name, held, release):
+    # Another process mid-write: holds SQLite's write lock until released.
+    db = sqlite3.connect(name, isolation_level=None)
+    db.execute('BEGIN IMMEDIATE')
+    held.set()
+    release.wait()
+    db.rollback()
+    db.close()
+
+
+@override_settings(THROTTLE_ENABLED=False)  # Measures the writer path, not the limits
+class ConcurrentWriteTests(TransactionTestCase):
+    # Parallel submissions through the serialized writer path must all commit
+    # without "database is locked" errors, on the production SQLite profile.
+    writers = 8
+    per_writer = 10
+
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(production_sqlite())
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+        state = State.objects.create(name='Bagmati')
+        self.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        self.department = Department.objects.create(name='Roads')
+        self.department.municipalities.add(self.municipality)
+        self.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=self.municipality)
+        self.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        self.citizens = [
+            CustomUser.objects.create_user(f'citizen{n}', f'citizen{n}@example.com', 'pass')
+            for n in range(self.writers)
+        ]
+        self.grievance = Grievance.objects.create(
+            title='Pothole', description='Main road', municipality=self.municipality,
+            department=self.department, user=self.citizens[0],
+        )
+
+    def run_writers(self, user_for, request):
+        statuses, errors = [], []
+        start = threading.Barrier(self.writers)
+
+        def writer(n):
+            client = APIClient()
+            client.force_authenticate(user_for(n))
+            start.wait()
+            try:
+                for i in range(self.per_writer):
+                    statuses.append(request(client, n, i).status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [201] * self.writers * self.per_writer)
+
+    def test_parallel_grievances(self):
+        path = f'/api/municipalities/{self.municipality.pk}/departments/{self.department.pk}/grievance/'
+        self.run_writers(lambda n: self.citizens[n], lambda client, n, i: client.post(path, {
+            'title': f'Streetlight {n}-{i}', 'description': f'Broken light number {n * 100 + i}',
+            'municipality': self.municipality.pk, 'department': self.department.pk,
+        }, format='json'))
+        self.assertEqual(Grievance.objects.count(), 1 + self.writers * self.per_writer)
+
+    def test_parallel_feedback(self):
+        path = f'/api/municipalities/{self.municipality.pk}/departments/{self.department.pk}/feedback/'
+        self.run_writers(lambda n: self.citizens[n], lambda client, n, i: client.post(path, {
+            'rating': i % 5 + 1, 'comment': 'ok', 'municipality': self.municipality.pk, 'department': self.department.pk,
+        }, format='json'))
+        self.assertEqual(Feedback.objects.count(), self.writers * self.per_writer)
+
+    def test_parallel_responses(self):
+        path = f'/api/grievances/{self.grievance.pk}/respond/'
+        self.run_writers(lambda n: self.official, lambda client, n, i: client.post(path, {
+            'grievance': self.grievance.pk, 'response': f'Update {n}-{i}',
+        }, format='json'))
+        self.assertEqual(GrievanceResponse.objects.count(), self.writers * self.per_writer)
+
+    def test_parallel_processes(self):
+        # Writers in separate processes only share the file: no in-process
+        # lock between them, just busy_timeout and the retries.
+        path = f'/api/municipalities/{self.municipality.pk}/departments/{self.department.pk}/grievance/'
+        context = multiprocessing.get_context('fork')
+        start, results = context.Barrier(self.writers), context.Queue()
+        connection.close()  # Children must not inherit an open connection
+        processes = [
+            context.Process(target=process_writer, args=(start, results, self.citizens[n].pk, path, [
+                {
+                    'title': f'Streetlight {n}-{i}', 'description': f'Broken light number {n * 100 + i}',
+                    'municipality': self.municipality.pk, 'department': self.department.pk,
+                }
+                for i in range(self.per_writer)
+            ]))
+            for n in range(self.writers)
+        ]
+        for process in processes:
+            process.start()
+        statuses = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+        self.assertEqual(statuses, [[201] * self.per_writer] * self.writers)
+        self.assertEqual(Grievance.objects.count(), 1 + self.writers * self.per_writer)
+        self.assertEqual(
+            set(Grievance.objects.exclude(pk=self.grievance.pk).values_list('title', flat=True)),
+            {f'Streetlight {n}-{i}' for n in range(self.writers) for i in range(self.per_writer)},
+        )
+
+    @override_settings(DB_WRITE_RETRIES=1, DB_WRITE_RETRY_DELAY=0.01)
+    def test_busy_is_503(self):
+        path = f'/api/municipalities/{self.municipality.pk}/departments/{self.department.pk}/grievance/'
+        payload = {
+            'title': 'Streetlight', 'description': 'Broken light',
+            'municipality': self.municipality.pk, 'department': self.department.pk,
+        }
+        client = APIClient()
+        client.force_authenticate(self.citizens[1])
+        context = multiprocessing.get_context('fork')
+        held, release = context.Event(), context.Event()
+        connection.close()
+        holder = context.Process(target=hold_write_lock, args=(connection.settings_dict['NAME'], held, release))
+        options = dict(settings.SQLITE_PRODUCTION_OPTIONS, timeout=0.1)
+        with mock.patch.dict(connection.settings_dict, OPTIONS=options):
+            holder.start()
+            try:
+                self.assertTrue(held.wait(10))
+                response = client.post(path, payload, format='json')
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.data['detail'].code, 'database_busy')
+            finally:
+                release.set()
+                holder.join()
+            self.assertEqual(client.post(path, payload, format='json').status_code, 201)
+            connection.close()
+        self.assertEqual(Grievance.objects.count(), 2)
+
+    def test_profile(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(
+    THROTTLE_DEFAULT_RATES={'user': '1/min', 'municipality': '3/min'},
+    THROTTLE_ROUTES={'grievance_api': {}},
+)
+class SubmissionThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.department = Department.objects.create(name='Roads')
+        cls.department.municipalities.add(cls.municipality)
+        cls.path = f'/api/municipalities/{cls.municipality.pk}/departments/{cls.department.pk}/grievance/'
+        cls.citizens = [
+            CustomUser.objects.create_user(f'citizen{n}', f'citizen{n}@example.com', 'pass') for n in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        for name, fresh in (('_store', throttling.LocalBucketStore()), ('_rejections', throttling.Counter())):
+            patcher = mock.patch.object(throttling, name, fresh)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def submit(self, user=None, **extra):
+        if user is not None:
+            token = RoleTokenObtainPairSerializer.get_token(user).access_token
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        return self.client.post(self.path, {
+            'title': 'Pothole', 'description': f'Road needs repair {Grievance.objects.count()}',
+            'municipality': self.municipality.pk, 'department': self.department.pk,
+        }, format='json', **extra)
+
+    def test_rejected_with_retry_after(self):
+        self.assertEqual(self.submit(self.citizens[0]).status_code, 201)
+        response = self.submit(self.citizens[0])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(throttling.rejections()[('grievance_api', 'user')], 1)
+
+    def test_idents(self):
+        request = mock.Mock(META={'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '10.9.9.9'})
+        with mock.patch.object(throttling, 'token_claims', return_value=None):
+            self.assertEqual(throttling.throttle_idents(request, {'municipality_id': 7}), {'user': 'ip10.0.0.1'})
+        with mock.patch.object(throttling, 'token_claims', return_value={'user_id': 5, 'municipality_id': 3}):
+            self.assertEqual(throttling.throttle_idents(request, {'municipality_id': 7}), {'user': 'u5', 'municipality': 7})
+            self.assertEqual(throttling.throttle_idents(request, {}), {'user': 'u5', 'municipality': 3})
+
+    def test_anonymous_requests_spare_the_municipality(self):
+        for n in range(4):
+            self.assertEqual(self.submit(REMOTE_ADDR=f'10.0.0.{n}').status_code, 401)
+        self.assertEqual(self.submit(self.citizens[0]).status_code, 201)
+
+    def test_forwarded_for_is_not_trusted(self):
+        self.assertEqual(self.submit(HTTP_X_FORWARDED_FOR='10.9.9.1').status_code, 401)
+        self.assertEqual(self.submit(HTTP_X_FORWARDED_FOR='10.9.9.2').status_code, 429)
+
+    def test_rejected_requests_spend_no_tokens(self):
+        # The first citizen's retries are rejected by their user bucket and
+        # must leave the municipality's tokens to the others.
+        self.assertEqual(self.submit(self.citizens[0]).status_code, 201)
+        for _ in range(3):
+            self.assertEqual(self.submit(self.citizens[0]).status_code, 429)
+        self.assertEqual(self.submit(self.citizens[1]).status_code, 201)
+        self.assertEqual(self.submit(self.citizens[2]).status_code, 201)
+        self.assertEqual(self.submit(self.citizens[2]).status_code, 429)
+
+
+class GrievanceTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        department = Department.objects.create(name='Roads')
+        department.municipalities.add(cls.municipality)
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        cls.grievances = Grievance.objects.bulk_create([
+            Grievance(
+                title=f'Pothole {i}', description=f'Street {i}', municipality=cls.municipality,
+                department=department, user=citizen, status=status,
+            )
+            for i, status in enumerate(['OPEN', 'OPEN', 'CLOSED'])
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.official)
+
+    def test_bulk_transition(self):
+        first, second, closed = self.grievances
+        response = self.client.post('/api/grievances/transitions/', {
+            'ids': [first.pk, second.pk, closed.pk, 0], 'status': 'IN_PROGRESS',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ids'], [first.pk, second.pk])
+        self.assertEqual(response.data['not_allowed'], [closed.pk])
+        self.assertEqual(response.data['not_found'], [0])
+        self.assertEqual(
+            set(GrievanceTransition.objects.values_list('grievance_id', 'user_id', 'from_status', 'to_status')),
+            {(first.pk, self.official.pk, 'OPEN', 'IN_PROGRESS'), (second.pk, self.official.pk, 'OPEN', 'IN_PROGRESS')},
+        )
+        self.assertEqual(Grievance.objects.get(pk=closed.pk).status, 'CLOSED')
+
+    def test_patch(self):
+        first = self.grievances[0]
+        response = self.client.patch(f'/api/grievances/{first.pk}/status/', {'status': 'RESOLVED'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'RESOLVED')
+        self.assertEqual(GrievanceTransition.objects.get().from_status, 'OPEN')
+
+    def test_patch_not_allowed(self):
+        closed = self.grievances[2]
+        response = self.client.patch(f'/api/grievances/{closed.pk}/status/', {'status': 'OPEN'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(GrievanceTransition.objects.exists())
+
+    def test_patch_same_status(self):
+        # A retried PATCH finds the status already set and succeeds unchanged.
+        for grievance in (self.grievances[0], self.grievances[2]):
+            response = self.client.patch(
+                f'/api/grievances/{grievance.pk}/status/', {'status': grievance.status}, format='json',
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(GrievanceTransition.objects.exists())
+
+    def test_status_changed_before_update(self):
+        # Another writer resolves the second grievance between the read and
+        # the UPDATE: only the first is moved, audited and reported.
+        first, second, _ = self.grievances
+        pending = [second.pk]
+
+        def concurrent_write(execute, sql, params, many, context):
+            if pending and sql.startswith('UPDATE "base_grievance"'):
+                Grievance.objects.filter(pk=pending.pop()).update(status='RESOLVED')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(concurrent_write):
+            result = serialized_write(
+                transition_grievances, [first.pk, second.pk], 'IN_PROGRESS', self.official.pk, self.municipality.pk,
+            )
+        self.assertEqual([transition.grievance_id for transition in result.transitions], [first.pk])
+        self.assertEqual(result.not_allowed, [second.pk])
+        self.assertEqual(list(GrievanceTransition.objects.values_list('grievance_id', flat=True)), [first.pk])
+        self.assertEqual(Grievance.objects.get(pk=second.pk).status, 'RESOLVED')
+
+
+class MunicipalityScopeTests(TestCase):
+    # Aggregate views report on the official's own municipality; only admins
+    # may pick another with ?municipality=.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.other = Municipality.objects.create(name='Bhaktapur', state=state)
+        department = Department.objects.create(name='Roads')
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        cls.admin = CustomUser.objects.create_user('admin', 'admin@example.com', 'pass', is_staff=True)
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass', municipality=cls.municipality)
+        for municipality, count in ((cls.municipality, 2), (cls.other, 3)):
+            for i in range(count):
+                Grievance.objects.create(
+                    title=f'Pothole {i}', description=f'Street {i}', municipality=municipality,
+                    department=department, user=cls.citizen,
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, user, path, **params):
+        self.client.force_authenticate(user)
+        return self.client.get(path, params)
+
+    def test_dashboard(self):
+        path = '/api/grievances/dashboard/'
+        response = self.get(self.official, path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['municipality'], response.data['total']), (self.municipality.pk, 2))
+        self.assertEqual(self.get(self.official, path, municipality=self.municipality.pk).status_code, 200)
+        self.assertEqual(self.get(self.official, path, municipality=self.other.pk).status_code, 403)
+        self.assertEqual(self.get(self.citizen, path).status_code, 403)
+        self.assertEqual(self.get(self.citizen, path, municipality=self.other.pk).status_code, 403)
+        response = self.get(self.admin, path, municipality=self.other.pk)
+        self.assertEqual((response.data['municipality'], response.data['total']), (self.other.pk, 3))
+        self.assertEqual(self.get(self.admin, path).status_code, 400)
+
+    def test_feedback_stats(self):
+        path = '/api/feedback/stats/'
+        self.assertEqual(self.get(self.official, path).data['municipality'], self.municipality.pk)
+        self.assertEqual(self.get(self.official, path, municipality=self.other.pk).status_code, 403)
+        self.assertEqual(self.get(self.citizen, path).status_code, 403)
+        self.assertEqual(self.get(self.admin, path, municipality=self.other.pk).data['municipality'], self.other.pk)
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    # With STATELESS_JWT_AUTH the token's claims stand in for the user row.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.officials = Group.objects.get_or_create(name=OFFICIALS_GROUP)[0]
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(cls.officials)
+        cls.admin = CustomUser.objects.create_user('admin', 'admin@example.com', 'pass', is_staff=True)
+
+    def setUp(self):
+        cache.clear()  # Forget the role changes setUpTestData made
+        self.auth = StatelessJWTAuthentication()
+
+    def token(self, user, age=0):
+        token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        token['role_version'] -= age
+        return str(token)
+
+    def authenticate(self, raw_token):
+        return self.auth.get_user(self.auth.get_validated_token(raw_token))
+
+    def test_claims(self):
+        user = self.authenticate(self.token(self.official))
+        self.assertEqual(str(user.id), str(self.official.pk))
+        self.assertEqual(user.claims_role, (True, self.municipality.pk, 'Lalitpur'))
+        self.assertFalse(user.is_staff)
+        admin = self.authenticate(self.token(self.admin))
+        self.assertEqual(admin.claims_role, (False, None, None))
+        self.assertTrue(admin.is_staff)
+
+    def test_admin_branch(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token(self.admin)}')
+        with mock.patch.object(GrievanceDashboardAPIView, 'authentication_classes', [StatelessJWTAuthentication]):
+            response = client.get('/api/grievances/dashboard/', {'municipality': self.municipality.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['municipality'], self.municipality.pk)
+
+    def test_stale_after_role_change(self):
+        raw_token = self.token(self.official)
+        with self.assertNumQueries(0):
+            self.authenticate(raw_token)
+        self.official.groups.remove(self.officials)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(raw_token)
+        admin_token = self.token(self.admin)
+        self.admin.is_staff = False
+        self.admin.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(admin_token)
+
+    def test_reverify_once_per_window(self):
+        raw_token = self.token(self.official, age=settings.ROLE_CLAIMS_MAX_AGE + 1)
+        with self.assertNumQueries(3):  # User, group membership, municipality
+            self.authenticate(raw_token)
+        with self.assertNumQueries(0):
+            self.authenticate(raw_token)
+        # A change this process never heard of is caught by the next window's check
+        self.official.groups.remove(self.officials)
+        cache.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(raw_token)
+        admin_token = self.token(self.admin, age=settings.ROLE_CLAIMS_MAX_AGE + 1)
+        CustomUser.objects.filter(pk=self.admin.pk).update(is_staff=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(admin_token)
+
+
+class GrievanceKeysetPaginationTests(TestCase):
+    # Following `next` must visit every grievance exactly once, newest first,
+    # even when many share a `created` timestamp and rows arrive meanwhile.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.department = Department.objects.create(name='Roads')
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        Grievance.objects.bulk_create([
+            Grievance(
+                title=f'Pothole {i}', description=f'Street {i}', municipality=cls.municipality,
+                department=cls.department, user=cls.citizen,
+            )
+            for i in range(11)
+        ])
+        # Two timestamps, each shared by several grievances
+        ids = list(Grievance.objects.order_by('id').values_list('id', flat=True))
+        tie = timezone.now() - datetime.timedelta(hours=1)
+        Grievance.objects.filter(id__in=ids[:4]).update(created=tie - datetime.timedelta(minutes=1))
+        Grievance.objects.filter(id__in=ids[4:]).update(created=tie)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.citizen)
+
+    def test_ties(self):
+        expected = list(Grievance.objects.order_by('-created', '-id').values_list('id', flat=True))
+        seen, path, params = [], '/api/grievances/', {'page_size': 3}
+        while path:
+            response = self.client.get(path, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            if len(seen) == 3:
+                Grievance.objects.create(
+                    title='Late', description='Filed while paging', municipality=self.municipality,
+                    department=self.department, user=self.citizen,
+                )
+            path, params = response.data['next'], None
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/grievances/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class GrievanceListConditionalTests(TestCase):
+    # Polls that send the list's validators back get a 304 without the list
+    # query, until a grievance write bumps the change stamp.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.department = Department.objects.create(name='Roads')
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.official)
+        self.client.get('/api/user/profile/')  # Warm the role cache
+
+    def file_grievance(self):
+        # Committed: the change stamp moves on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return Grievance.objects.create(
+                title='Pothole', description='Main road', municipality=self.municipality,
+                department=self.department, user=self.citizen,
+            )
+
+    def test_etag(self):
+        self.file_grievance()
+        response = self.client.get('/api/grievances/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/grievances/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        etag = response['ETag']
+        self.file_grievance()
+        response = self.client.get('/api/grievances/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_stamp_waits_for_commit(self):
+        # Until the write commits, polls keep the old validators.
+        etag = self.client.get('/api/grievances/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Grievance.objects.create(
+                title='Pothole', description='Main road', municipality=self.municipality,
+                department=self.department, user=self.citizen,
+            )
+            self.assertEqual(self.client.get('/api/grievances/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/grievances/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_with_query(self):
+        etag = self.client.get('/api/grievances/')['ETag']
+        response = self.client.get('/api/grievances/', {'status': 'OPEN'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        # Last-Modified is only sent once the stamp's second has passed.
+        with mock.patch('base.versions.time.time', return_value=timezone.now().timestamp() - 10):
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_versions([self.municipality.pk])
+        response = self.client.get('/api/grievances/')
+        self.assertIn('Last-Modified', response)
+        response = self.client.get('/api/grievances/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.file_grievance()
+        response = self.client.get('/api/grievances/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+
+class GrievanceArchiveTests(TestCase):
+    # Archived grievances keep their ids: details fall through to the
+    # archive, lists include it on request, and the counters still add up.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        department = Department.objects.create(name='Roads')
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        cls.old, cls.recent, cls.live = [
+            Grievance.objects.create(
+                title=title, description=f'{title} pothole on street {i}', municipality=cls.municipality,
+                department=department, user=cls.citizen, status=status,
+            )
+            for i, (title, status) in enumerate([('Old', 'CLOSED'), ('Recent', 'CLOSED'), ('Live', 'OPEN')])
+        ]
+        Grievance.objects.update(duplicate_of=None)
+        GrievanceResponse.objects.create(grievance=cls.old, user=cls.official, response='Fixed')
+        Grievance.objects.filter(pk=cls.old.pk).update(updated=timezone.now() - datetime.timedelta(days=400))
+
+    def setUp(self):
+        cache.clear()
+        call_command('archive_grievances', days=180, stdout=io.StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.official)
+
+    def test_moved(self):
+        self.assertEqual(list(ArchivedGrievance.objects.values_list('id', flat=True)), [self.old.pk])
+        self.assertFalse(Grievance.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_detail(self):
+        response = self.client.get(f'/api/grievances/{self.old.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual([r['response'] for r in response.data['responses']], ['Fixed'])
+        self.assertNotIn('archived', self.client.get(f'/api/grievances/{self.live.pk}/').data)
+
+    def test_detail_outside_scope(self):
+        other = CustomUser.objects.create_user('other', 'other@example.com', 'pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f'/api/grievances/{self.old.pk}/').status_code, 404)
+
+    def test_list(self):
+        response = self.client.get('/api/grievances/')
+        self.assertEqual({row['id'] for row in response.data}, {self.recent.pk, self.live.pk})
+        for params in ({'include_archived': 'true'}, {'include_archived': 'true', 'page_size': 10}):
+            response = self.client.get('/api/grievances/', params)
+            rows = response.data['results'] if 'page_size' in params else response.data
+            self.assertEqual(
+                {row['id']: row['archived'] for row in rows},
+                {self.old.pk: True, self.recent.pk: False, self.live.pk: False},
+            )
+
+
+class GrievanceCounterReconcileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.department = Department.objects.create(name='Roads')
+        citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        for i, status in enumerate(['OPEN', 'OPEN', 'RESOLVED']):
+            Grievance.objects.create(
+                title=f'Pothole {i}', description=f'Street {i}', municipality=cls.municipality,
+                department=cls.department, user=citizen, status=status,
+            )
+
+    def test_repairs_drift(self):
+        self.assertEqual(reconcile_counters(), {})
+        key = (self.municipality.pk, self.department.pk)
+        GrievanceStatusCount.objects.filter(status='OPEN').update(count=5)
+        GrievanceStatusCount.objects.filter(status='RESOLVED').delete()
+        GrievanceStatusCount.objects.create(municipality_id=key[0], department_id=key[1], status='CLOSED', count=1)
+        drift = {key + ('OPEN',): (5, 2), key + ('RESOLVED',): (None, 1), key + ('CLOSED',): (1, 0)}
+        with self.assertRaises(CommandError):
+            call_command('reconcile_grievance_counters', stdout=io.StringIO())
+        self.assertEqual(reconcile_counters(self.municipality.pk), drift)
+        self.assertEqual(reconcile_counters(repair=True), drift)
+        self.assertEqual(reconcile_counters(), {})
+        self.assertEqual(
+            dict(GrievanceStatusCount.objects.filter(count__gt=0).values_list('status', 'count')),
+            {'OPEN': 2, 'RESOLVED': 1},
+        )
+
+
+class FeedbackRollupCascadeTests(TestCase):
+    # Deleting a department or municipality removes its rollups before the
+    # feedback that cascades with it; the feedback's decrements must not
+    # recreate them.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.roads, cls.water = Department.objects.bulk_create([Department(name='Roads'), Department(name='Water')])
+        citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        for department in (cls.roads, cls.water):
+            for rating in (2, 5):
+                Feedback.objects.create(
+                    user=citizen, municipality=cls.municipality, department=department, rating=rating, comment='ok',
+                )
+            Grievance.objects.create(
+                title='Pothole', description=f'{department.name} problem', municipality=cls.municipality,
+                department=department, user=citizen,
+            )
+
+    def test_delete_department_then_municipality(self):
+        self.roads.delete()
+        self.assertEqual(list(FeedbackRollup.objects.values_list('department_id', 'count')), [(self.water.pk, 2)])
+        self.municipality.delete()
+        self.assertFalse(FeedbackRollup.objects.exists())
+        self.assertFalse(Feedback.objects.exists())
+        self.assertEqual(reconcile_counters(), {})
+
+
+class GrievanceSearchTests(TestCase):
+    # FTS5Backend and MemoryBackend must agree on matching, ranking and
+    # scoping; MemoryBackend stands in where SQLite lacks FTS5.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.other = Municipality.objects.create(name='Bhaktapur', state=state)
+        department = Department.objects.create(name='Water')
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        neighbour = CustomUser.objects.create_user('neighbour', 'neighbour@example.com', 'pass')
+        grievance = lambda title, description, municipality=cls.municipality, user=cls.citizen: Grievance.objects.create(
+            title=title, description=description, municipality=municipality, department=department, user=user,
+        )
+        # Same words, swapped between title and description
+        cls.in_title = grievance('Water leak', 'Burst pipe near school')
+        cls.in_description = grievance('Burst pipe', 'Water leak near school')
+        cls.neighbours = grievance('Water cut', 'No supply for days', user=neighbour)
+        cls.elsewhere = grievance('Water cut', 'No supply for days', municipality=cls.other)
+
+    def backends(self):
+        backends = [search.MemoryBackend()]
+        if search._fts5_available():
+            backends.append(search.FTS5Backend())
+        return backends
+
+    @contextlib.contextmanager
+    def using(self, backend):
+        with self.subTest(backend=backend.name), mock.patch.object(search, '_backend', backend):
+            backend.rebuild()
+            yield
+
+    def pks(self, backend, query, **scope):
+        return [pk for pk, _ in backend.search(query, **scope)]
+
+    def test_title_matches_rank_first(self):
+        for backend in self.backends():
+            with self.using(backend):
+                scope = {'municipality_id': self.municipality.pk}
+                self.assertEqual(self.pks(backend, 'water leak', **scope), [self.in_title.pk, self.in_description.pk])
+                self.assertEqual(self.pks(backend, 'burst pipe', **scope), [self.in_description.pk, self.in_title.pk])
+                self.assertEqual(self.pks(backend, 'wat', user_id=self.citizen.pk, **scope)[0], self.in_title.pk)
+                self.assertEqual(self.pks(backend, 'water drought', **scope), [])
+
+    def test_scoping(self):
+        for backend in self.backends():
+            with self.using(backend):
+                self.assertEqual(len(self.pks(backend, 'water')), 4)
+                self.assertEqual(
+                    sorted(self.pks(backend, 'water', municipality_id=self.municipality.pk)),
+                    [self.in_title.pk, self.in_description.pk, self.neighbours.pk],
+                )
+                self.assertEqual(self.pks(backend, 'water', municipality_id=self.other.pk), [self.elsewhere.pk])
+                self.assertEqual(len(self.pks(backend, 'water', user_id=self.citizen.pk)), 3)
+                self.assertEqual(self.pks(backend, 'supply', municipality_id=self.municipality.pk, user_id=self.citizen.pk), [])
+
+    def test_delete_removes_from_index(self):
+        for backend in self.backends():
+            with self.using(backend):
+                grievance = Grievance.objects.create(
+                    title='Broken streetlight', description='Dark lane', municipality=self.municipality,
+                    department=self.in_title.department, user=self.citizen,
+                )
+                self.assertEqual(self.pks(backend, 'streetlight'), [grievance.pk])
+                grievance.delete()
+                self.assertEqual(self.pks(backend, 'streetlight'), [])
+
+    def test_memory_fallback_without_fts5(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {search.FTS_TABLE}')  # Rolled back with the test
+        with mock.patch.object(search, '_backend', None):
+            self.assertIsInstance(search.get_search_backend(), search.MemoryBackend)
+            client = APIClient()
+            client.force_authenticate(self.official)
+            response = client.get('/api/grievances/search/', {'q': 'water'})
+            self.assertEqual(response.status_code, 200)
+            results = [result['id'] for result in response.data['results']]
+            self.assertEqual(results[0], self.in_title.pk)
+            self.assertCountEqual(results, [self.in_title.pk, self.in_description.pk, self.neighbours.pk])
+            client.force_authenticate(self.citizen)
+            response = client.get('/api/grievances/search/', {'q': 'water'})
+            self.assertCountEqual(
+                [result['id'] for result in response.data['results']],
+                [self.in_title.pk, self.in_description.pk, self.elsewhere.pk],
+            )
+
+
+class GrievanceDuplicateTests(TestCase):
+    # A new grievance is linked to an active near-identical one in the same
+    # municipality and department.
+    pothole = 'Large pothole on Ring Road near the Pulchowk bus stop is damaging vehicles every day'
+    pothole_again = 'Large pothole on the Ring Road near Pulchowk bus stop, damaging vehicles every day'
+
+    @classmethod
+    def setUpTestData(cls):
+        get_duplicate_index().clear()
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.other = Municipality.objects.create(name='Bhaktapur', state=state)
+        cls.roads, cls.water = Department.objects.bulk_create([Department(name='Roads'), Department(name='Water')])
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        cls.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        cls.canonical = cls.file(cls.pothole)
+
+    @classmethod
+    def file(cls, description, municipality=None, department=None):
+        return Grievance.objects.create(
+            title='Pothole', description=description, municipality=municipality or cls.municipality,
+            department=department or cls.roads, user=cls.citizen,
+        )
+
+    def setUp(self):
+        get_duplicate_index().clear()  # Partitions reload from the rows this test sees
+        self.client = APIClient()
+        self.client.force_authenticate(self.official)
+
+    def test_links_near_duplicate(self):
+        duplicate = self.file(self.pothole_again)
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.duplicate_of_id, self.canonical.pk)
+        # Later copies join the group rather than chaining
+        again = self.file(self.pothole)
+        again.refresh_from_db()
+        self.assertEqual(again.duplicate_of_id, self.canonical.pk)
+        unrelated = self.file('Streetlights in Jhamsikhel have been off for a week')
+        unrelated.refresh_from_db()
+        self.assertIsNone(unrelated.duplicate_of_id)
+
+    def test_other_partition_not_linked(self):
+        for grievance in (self.file(self.pothole_again, municipality=self.other), self.file(self.pothole_again, department=self.water)):
+            grievance.refresh_from_db()
+            self.assertIsNone(grievance.duplicate_of_id)
+
+    def test_closed_grievance_not_linked(self):
+        self.canonical.status = 'CLOSED'
+        self.canonical.save()
+        duplicate = self.file(self.pothole_again)
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.duplicate_of_id)
+
+    def test_groups(self):
+        duplicate = self.file(self.pothole_again)
+        self.file(self.pothole_again, municipality=self.other)
+        response = self.client.get('/api/grievances/duplicates/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['canonical']['id'], self.canonical.pk)
+        self.assertEqual([member['id'] for member in response.data[0]['duplicates']], [duplicate.pk])
+        self.client.force_authenticate(self.citizen)
+        self.assertEqual(self.client.get('/api/grievances/duplicates/').data, [])
+
+    def test_resolve(self):
+        duplicate = self.file(self.pothole_again)
+        closed = self.file(self.pothole)
+        Grievance.objects.filter(pk=closed.pk).update(status='CLOSED')
+        path = f'/api/grievances/{duplicate.pk}/duplicates/resolve/'
+        self.assertEqual(self.client.post(path, {'status': 'OPEN'}, format='json').status_code, 400)
+        response = self.client.post(path, {'status': 'RESOLVED'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['canonical'], self.canonical.pk)
+        self.assertEqual(sorted(response.data['ids']), [self.canonical.pk, duplicate.pk, closed.pk])
+        self.assertEqual((response.data['updated'], response.data['not_allowed']), (2, [closed.pk]))
+        self.assertEqual(
+            dict(Grievance.objects.values_list('id', 'status')),
+            {self.canonical.pk: 'RESOLVED', duplicate.pk: 'RESOLVED', closed.pk: 'CLOSED'},
+        )
+        self.assertEqual(self.client.get('/api/grievances/duplicates/').data, [])
+        elsewhere = self.file(self.pothole, municipality=self.other)
+        self.assertEqual(self.client.post(f'/api/grievances/{elsewhere.pk}/duplicates/resolve/', {'status': 'CLOSED'}, format='json').status_code, 404)
+        self.client.force_authenticate(self.citizen)
+        self.assertEqual(self.client.post(path, {'status': 'CLOSED'}, format='json').status_code, 403)
+
+
+@override_settings(STATELESS_JWT_AUTH=True)
+class GrievanceEventTests(TestCase):
+    # Status changes reach long-poll and SSE clients watching the grievance's
+    # municipality, and nobody else. Clients wait on their own thread, which
+    # cannot see this test's transaction; stateless tokens keep them off the
+    # database.
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Bagmati')
+        cls.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        cls.other = Municipality.objects.create(name='Bhaktapur', state=state)
+        department = Department.objects.create(name='Roads')
+        cls.official = CustomUser.objects.create_user('official', 'official@example.com', 'pass', municipality=cls.municipality)
+        cls.official.groups.add(Group.objects.get_or_create(name=OFFICIALS_GROUP)[0])
+        citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        cls.grievance, cls.elsewhere = (
+            Grievance.objects.create(
+                title='Pothole', description='Main road', municipality=municipality, department=department, user=citizen,
+            )
+            for municipality in (cls.municipality, cls.other)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.hub = events.LocalEventHub(100)
+        patcher = mock.patch.object(events, '_hub', self.hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = RoleTokenObtainPairSerializer.get_token(self.official).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def start_work(self, grievance):
+        grievance = Grievance.objects.get(pk=grievance.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            grievance.status = 'IN_PROGRESS'
+            grievance.save()
+
+    def client_thread(self, path, params, headers=None):
+        # Starts a GET on a thread and returns it with the dict that will
+        # hold the response and its body.
+        result = {}
+
+        async def fetch():
+            response = await self.async_client.get(path, params, headers={**self.headers, **(headers or {})})
+            if response.streaming:
+                body = b''.join([chunk async for chunk in response.streaming_content])
+            else:
+                body = response.content
+            result.update(response=response, body=body.decode())
+
+        thread = threading.Thread(target=async_to_sync(fetch))
+        thread.start()
+        self.addCleanup(thread.join)
+        return thread, result
+
+    def wait_parked(self):
+        deadline = time.monotonic() + 5
+        while not self.hub._waiters:
+            self.assertLess(time.monotonic(), deadline, 'The client never waited on the hub')
+            time.sleep(0.01)
+
+    def test_poll_wakes_on_save(self):
+        thread, result = self.client_thread('/api/events/poll/', {'last_event_id': 0, 'timeout': 10})
+        self.wait_parked()
+        started = time.monotonic()
+        self.start_work(self.grievance)
+        thread.join()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(result['response'].status_code, 200)
+        self.assertEqual(json.loads(result['body']), {
+            'events': [{'id': 1, 'type': 'grievance.status', 'data': {
+                'grievance': self.grievance.pk, 'municipality': self.municipality.pk,
+                'status': 'IN_PROGRESS', 'previous_status': 'OPEN',
+            }}],
+            'last_event_id': 1,
+            'reset': False,
+        })
+
+    def test_poll_timeout(self):
+        started = time.monotonic()
+        thread, result = self.client_thread('/api/events/poll/', {'last_event_id': 0, 'timeout': 1})
+        thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.assertEqual(json.loads(result['body']), {'events': [], 'last_event_id': 0, 'reset': False})
+
+    def test_other_municipality_not_delivered(self):
+        thread, result = self.client_thread('/api/events/poll/', {'last_event_id': 0, 'timeout': 1})
+        self.wait_parked()
+        self.start_work(self.elsewhere)
+        thread.join()
+        # The cursor moves past the event without handing it over
+        self.assertEqual(json.loads(result['body']), {'events': [], 'last_event_id': 1, 'reset': False})
+
+    def test_stream(self):
+        thread, result = self.client_thread('/api/events/', {'timeout': 2}, {'Last-Event-ID': '0'})
+        self.wait_parked()
+        self.start_work(self.elsewhere)
+        self.start_work(self.grievance)
+        thread.join()
+        self.assertEqual(result['response']['Content-Type'], 'text/event-stream')
+        body = result['body']
+        self.assertTrue(body.startswith('retry: 3000\n\n'))
+        self.assertIn(
+            'id: 2\nevent: grievance.status\ndata: ' + json.dumps({
+                'grievance': self.grievance.pk, 'municipality': self.municipality.pk,
+                'status': 'IN_PROGRESS', 'previous_status': 'OPEN',
+            }) + '\n\n',
+            body,
+        )
+        self.assertNotIn('id: 1\n', body)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class FeedbackSpoolTests(TransactionTestCase):
+    # Transactions really commit here: SQLite checks foreign keys at commit.
+
+    def setUp(self):
+        state = State.objects.create(name='Bagmati')
+        self.municipality = Municipality.objects.create(name='Lalitpur', state=state)
+        self.department = Department.objects.create(name='Roads')
+        self.citizen = CustomUser.objects.create_user('citizen', 'citizen@example.com', 'pass')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.spool = FeedbackSpool(self.directory, flush_interval=3600)
+        self.addCleanup(self.spool.stop)
+
+    def record(self, rating=4, **overrides):
+        return dict({
+            'user_id': self.citizen.pk, 'municipality_id': self.municipality.pk,
+            'department_id': self.department.pk, 'rating': rating, 'comment': 'ok',
+        }, **overrides)
+
+    def write_segment(self, name, records, tail=''):
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        (self.directory / name).write_text(lines + tail)
+
+    def files(self):
+        return sorted(path.name for path in self.directory.iterdir())
+
+    def test_append_and_flush(self):
+        ids = [self.spool.append(self.record(rating)) for rating in (1, 3, 5)]
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual(self.files(), [f'current-{os.getpid()}.ndjson'])
+        self.assertEqual(self.spool.metrics()['queue_depth'], 3)
+        self.spool.flush()
+        self.assertEqual(sorted(Feedback.objects.values_list('rating', flat=True)), [1, 3, 5])
+        self.assertEqual(FeedbackRollup.objects.get().count, 3)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(FeedbackSpoolBatch.objects.exists())
+        self.assertEqual(self.spool.metrics()['flushed_total'], 3)
+
+    def test_replay_after_crash(self):
+        # A dead process's current file, ending in a torn write, is replayed.
+        self.write_segment(f'current-{dead_pid()}.ndjson', [self.record(2), self.record(4)], tail='{"user_id": ')
+        self.spool.recover_orphans()
+        self.spool.flush()
+        self.assertEqual(sorted(Feedback.objects.values_list('rating', flat=True)), [2, 4])
+        self.assertEqual(self.files(), [])
+
+    def test_committed_before_crash(self):
+        self.write_segment('1-1.pending', [self.record()])
+        FeedbackSpoolBatch.objects.create(segment='1-1.pending', count=1)
+        self.spool.flush()
+        self.assertFalse(Feedback.objects.exists())
+        self.assertEqual(self.files(), [])
+        self.assertFalse(FeedbackSpoolBatch.objects.exists())
+
+    def test_claims(self):
+        # A live process's claim is left alone; a dead one's is flushed.
+        self.write_segment(f'1-1.{os.getppid()}.flushing', [self.record(1)])
+        self.write_segment(f'2-1.{dead_pid()}.flushing', [self.record(2)])
+        self.spool.recover_orphans()
+        self.spool.flush()
+        self.assertEqual(list(Feedback.objects.values_list('rating', flat=True)), [2])
+        self.assertEqual(self.files(), [f'1-1.{os.getppid()}.flushing'])
+
+    def test_rejected_records_set_aside(self):
+        missing_municipality = self.record(2, municipality_id=self.municipality.pk + 100)
+        malformed = {'rating': 3}
+        self.write_segment('1-1.pending', [self.record(1), missing_municipality, malformed, self.record(5)])
+        # Only failing at commit, where SQLite checks the foreign keys
+        self.write_segment('2-1.pending', [self.record(4), missing_municipality])
+        self.spool.flush()
+        self.assertEqual(sorted(Feedback.objects.values_list('rating', flat=True)), [1, 4, 5])
+        self.assertEqual(FeedbackRollup.objects.get().count, 3)
+        self.assertEqual(self.files(), ['1-1.failed', '2-1.failed'])
+        failed = [json.loads(line) for line in (self.directory / '1-1.failed').read_text().splitlines()]
+        self.assertEqual(failed, [missing_municipality, malformed])
+        self.assertEqual(self.spool.metrics()['failed_records'], 3)
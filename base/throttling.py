@@ -0,0 +1,206 @@
+import contextlib
+import functools
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Token buckets on the submission routes, checked before authentication so a
+# flood is turned away without a query. Buckets are kept per route and per
+# scope: 'user' (the bearer token's user, or the client address without one)
+# and 'municipality' (from the URL, or the token's role claims; charged only
+# for requests with a verified token).
+Rate = namedtuple('Rate', ['capacity', 'per_second'])
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(value):
+    # '30/min': bursts of up to 30, refilled at 30 per minute.
+    count, _, period = value.partition('/')
+    return Rate(int(count), int(count) / PERIODS[period[0]])
+
+
+def _take(state, rate, now):
+    # (tokens, stamp) after spending one token, and the seconds until one is
+    # available if there was none to spend.
+    tokens, stamp = state if state is not None else (rate.capacity, now)
+    tokens = min(rate.capacity, tokens + (now - stamp) * rate.per_second)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) / rate.per_second
+
+
+class LocalBucketStore:
+    # Buckets spread over shards, each with its own lock, so requests for
+    # different keys rarely wait on each other. Buckets that have refilled
+    # are dropped as a shard grows.
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, shards=16):
+        self._shards = [(threading.Lock(), {}) for _ in range(shards)]
+        self._prune_at = [1024] * shards
+
+    def _index(self, key):
+        return hash(key) % len(self._shards)
+
+    def take(self, buckets):
+        # [(key, rate)] -> the wait for each bucket. A token is spent from
+        # every bucket only when each has one, so a rejected request drains
+        # none of them.
+        indexes = sorted({self._index(key) for key, _ in buckets})
+        with contextlib.ExitStack() as stack:
+            for index in indexes:  # In shard order, so two requests never deadlock
+                stack.enter_context(self._shards[index][0])
+            now = self.clock()
+            taken = []
+            for key, rate in buckets:
+                entry = self._shards[self._index(key)][1].get(key)
+                taken.append(_take(entry[0] if entry is not None else None, rate, now))
+            waits = [wait for _, wait in taken]
+            if any(waits):
+                return waits
+            for (key, rate), (state, _) in zip(buckets, taken):
+                # With the time it is full again
+                self._shards[self._index(key)][1][key] = (state, now + (rate.capacity - state[0]) / rate.per_second)
+            for index in indexes:
+                self._prune(index, now)
+        return waits
+
+    def _prune(self, index, now):
+        buckets = self._shards[index][1]
+        if len(buckets) > self._prune_at[index]:
+            for stale in [k for k, (_, full_at) in buckets.items() if full_at <= now]:
+                del buckets[stale]
+            self._prune_at[index] = max(1024, 2 * len(buckets))
+
+
+class CacheBucketStore:
+    # Shares buckets between processes through the default cache. The read
+    # and write are not atomic, so processes racing on one bucket can each
+    # spend its last token: limits hold approximately.
+    clock = staticmethod(time.time)
+
+    def _key(self, key):
+        return 'throttle:' + ':'.join(str(part) for part in key)
+
+    def take(self, buckets):
+        cache_keys = [self._key(key) for key, _ in buckets]
+        stored = cache.get_many(cache_keys)
+        now = self.clock()
+        taken = [_take(stored.get(cache_key), rate, now) for cache_key, (_, rate) in zip(cache_keys, buckets)]
+        waits = [wait for _, wait in taken]
+        if not any(waits):
+            for cache_key, (_, rate), (state, _) in zip(cache_keys, buckets, taken):
+                cache.set(cache_key, state, math.ceil(rate.capacity / rate.per_second) + 1)
+        return waits
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if getattr(settings, 'THROTTLE_BACKEND', 'local') == 'cache':
+                    _store = CacheBucketStore()
+                else:
+                    _store = LocalBucketStore(getattr(settings, 'THROTTLE_SHARDS', 16))
+    return _store
+
+
+_rejections = Counter()
+_rejections_lock = threading.Lock()
+
+
+def rejections():
+    # {(route, scope): requests rejected} since the process started.
+    with _rejections_lock:
+        return dict(_rejections)
+
+
+def throttle_route(url_name):
+    # A THROTTLE_ROUTES entry naming another route shares that route's buckets.
+    target = getattr(settings, 'THROTTLE_ROUTES', {}).get(url_name)
+    return target if isinstance(target, str) else url_name
+
+
+def route_rates(route):
+    overrides = getattr(settings, 'THROTTLE_ROUTES', {}).get(route)
+    if overrides is None:
+        return {}
+    rates = dict(getattr(settings, 'THROTTLE_DEFAULT_RATES', {}), **overrides)
+    return {scope: parse_rate(value) for scope, value in rates.items() if value is not None}
+
+
+_jwt = JWTAuthentication()
+_ident = BaseThrottle()
+
+
+def token_claims(request):
+    # The bearer token's claims once its signature and expiry check out;
+    # no database access.
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return _jwt.get_validated_token(raw_token)
+    except InvalidToken:
+        return None  # Authentication rejects it
+
+
+def throttle_idents(request, view_kwargs):
+    # scope -> ident. 'user' is the verified token's user, or the client
+    # address without one (see NUM_PROXIES). Only a verified token is charged
+    # to a municipality's bucket, so anonymous floods cannot exhaust it for
+    # the municipality's users.
+    claims = token_claims(request)
+    if claims is None:
+        return {'user': f'ip{_ident.get_ident(request)}'}
+    return {
+        'user': f'u{claims.get(api_settings.USER_ID_CLAIM)}',
+        'municipality': view_kwargs.get('municipality_id') or claims.get('municipality_id'),
+    }
+
+
+def check_throttles(request, view_kwargs):
+    # Spends a token from each of the route's buckets, or from none of them
+    # if any is empty, and then raises Throttled with the longest wait.
+    if not getattr(settings, 'THROTTLE_ENABLED', True):
+        return
+    match = request.resolver_match
+    route = throttle_route(match.url_name if match is not None else None)
+    rates = route_rates(route)
+    if not rates:
+        return
+    idents = throttle_idents(request, view_kwargs)
+    scopes = [scope for scope in rates if idents.get(scope) is not None]
+    waits = get_bucket_store().take([((route, scope, idents[scope]), rates[scope]) for scope in scopes])
+    if not any(waits):
+        return
+    with _rejections_lock:
+        for scope, wait in zip(scopes, waits):
+            if wait:
+                _rejections[(route, scope)] += 1
+    raise Throttled(wait=math.ceil(max(waits)))
+
+
+class ThrottledViewMixin:
+    # For APIViews: throttles ahead of APIView.initial(), which authenticates
+    # (loading the user) and runs permission checks.
+    def initial(self, request, *args, **kwargs):
+        check_throttles(request, kwargs)
+        super().initial(request, *args, **kwargs)
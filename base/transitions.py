@@ -0,0 +1,108 @@
+from collections import defaultdict, namedtuple
+
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Grievance, GrievanceTransition
+from .signals import grievances_transitioned
+
+# status -> statuses it may move to. A resolved grievance can be reopened;
+# a closed one is final.
+TRANSITIONS = {
+    'OPEN': {'IN_PROGRESS', 'RESOLVED', 'CLOSED'},
+    'IN_PROGRESS': {'RESOLVED', 'CLOSED'},
+    'RESOLVED': {'IN_PROGRESS', 'CLOSED'},
+    'CLOSED': set(),
+}
+
+MAX_BULK_TRANSITION = 1000
+
+Result = namedtuple('Result', ['transitions', 'not_found', 'not_allowed'])
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The grievance status changed meanwhile; reload and retry.'
+    default_code = 'transition_conflict'
+
+
+def status_param(data):
+    value = data.get('status')
+    if value not in TRANSITIONS:
+        raise ValidationError({'status': f'Must be one of {", ".join(TRANSITIONS)}.'})
+    return value
+
+
+def ids_param(data):
+    values = data.getlist('ids') if hasattr(data, 'getlist') else data.get('ids')
+    if not isinstance(values, list) or not values:
+        raise ValidationError({'ids': 'A non-empty list of grievance ids is required.'})
+    if len(values) > MAX_BULK_TRANSITION:
+        raise ValidationError({'ids': f'At most {MAX_BULK_TRANSITION} ids per request.'})
+    try:
+        if any(isinstance(value, bool) for value in values):
+            raise TypeError
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        raise ValidationError({'ids': 'Ids must be integers.'})
+
+
+def allowed_sources(to_status):
+    return sorted(status for status, targets in TRANSITIONS.items() if to_status in targets)
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def transition_grievances(ids, to_status, user_id, municipality_id):
+    # Moves the municipality's grievances in `ids` to `to_status` with a
+    # guarded UPDATE per source status, and audits them with one
+    # bulk_create. Must run in a transaction (serialized_write). Returns the
+    # audit rows and the ids that were skipped; ids whose status changed
+    # between the read and the UPDATE count as not allowed.
+    ids = list(dict.fromkeys(ids))
+    sources = allowed_sources(to_status)
+    rows = Grievance.objects.filter(id__in=ids, municipality_id=municipality_id)
+    if connection.features.has_select_for_update:
+        rows = rows.select_for_update()
+    found = {
+        pk: (user_id, status, department_id)
+        for pk, user_id, status, department_id in rows.values_list('id', 'user_id', 'status', 'department_id')
+    }
+    eligible = [pk for pk in ids if pk in found and found[pk][1] in sources]
+    not_allowed = [pk for pk in ids if pk in found and found[pk][1] not in sources]
+    result = Result([], [pk for pk in ids if pk not in found], not_allowed)
+    if not eligible:
+        return result
+
+    # One UPDATE per status read, each guarded by it, so a row another
+    # writer changed since the read is left alone. When the row counts come
+    # up short the moved rows are told apart by the `updated` stamp.
+    now = timezone.now()
+    by_status = defaultdict(list)
+    for pk in eligible:
+        by_status[found[pk][1]].append(pk)
+    moved = sum(
+        Grievance.objects.filter(id__in=pks, status=from_status).update(status=to_status, updated=now)
+        for from_status, pks in by_status.items()
+    )
+    if moved < len(eligible):
+        kept = set(Grievance.objects.filter(id__in=eligible, status=to_status, updated=now).values_list('id', flat=True))
+        not_allowed.extend(pk for pk in eligible if pk not in kept)
+        eligible = [pk for pk in eligible if pk in kept]
+        if not eligible:
+            return result
+
+    result.transitions.extend(
+        GrievanceTransition(grievance_id=pk, user_id=user_id, from_status=found[pk][1], to_status=to_status)
+        for pk in eligible
+    )
+    GrievanceTransition.objects.bulk_create(result.transitions)
+    grievances_transitioned.send(
+        sender=Grievance, transitions=result.transitions, municipality_id=municipality_id,
+        owners={pk: found[pk][0] for pk in eligible}, departments={pk: found[pk][2] for pk in eligible},
+    )
+    return result
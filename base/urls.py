@@ -3,8 +3,16 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.routers import DefaultRouter
 from .views import (
     StateViewSet, MunicipalityViewSet, CustomRegisterView,
-    FeedbackAPIView, GrievanceAPIView, GrievanceListAPIView,
-    GrievanceResponseAPIView, GrievanceStatusUpdateAPIView, UserProfileView
+    FeedbackAPIView, GrievanceAPIView, GrievanceListAPIView, GrievanceDetailAPIView,
+    GrievanceResponseAPIView, GrievanceStatusUpdateAPIView, GrievanceTransitionAPIView, UserProfileView,
+    BulkIngestAPIView, FeedbackSpoolMetricsView, MetricsView, FeedbackStatsAPIView,
+    ExportAPIView, GrievanceSearchAPIView, DuplicateGroupsAPIView, DuplicateGroupResolveAPIView,
+    GrievanceDashboardAPIView,
+)
+from .async_views import (
+    AsyncStateListView, AsyncMunicipalityListView, AsyncMunicipalityDepartmentsView, AsyncUserProfileView,
+    AsyncGrievanceListView, AsyncGrievanceCreateView, AsyncFeedbackCreateView,
+    AsyncGrievanceEventStreamView, AsyncGrievanceEventPollView
 )
 
 app_name = 'base'
@@ -20,8 +28,29 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/municipalities/<int:municipality_id>/departments/<int:department_id>/feedback/', FeedbackAPIView.as_view(), name='feedback_api'),
     path('api/municipalities/<int:municipality_id>/departments/<int:department_id>/grievance/', GrievanceAPIView.as_view(), name='grievance_api'),
+    path('api/feedback/stats/', FeedbackStatsAPIView.as_view(), name='feedback_stats_api'),
+    path('api/feedback/export/<str:fmt>/', ExportAPIView.as_view(kind='feedback'), name='feedback_export_api'),
     path('api/grievances/', GrievanceListAPIView.as_view(), name='grievance_list_api'),
+    path('api/grievances/<int:pk>/', GrievanceDetailAPIView.as_view(), name='grievance_detail_api'),
+    path('api/grievances/search/', GrievanceSearchAPIView.as_view(), name='grievance_search_api'),
+    path('api/grievances/duplicates/', DuplicateGroupsAPIView.as_view(), name='grievance_duplicates_api'),
+    path('api/grievances/<int:pk>/duplicates/resolve/', DuplicateGroupResolveAPIView.as_view(), name='grievance_duplicates_resolve_api'),
+    path('api/grievances/dashboard/', GrievanceDashboardAPIView.as_view(), name='grievance_dashboard_api'),
+    path('api/grievances/transitions/', GrievanceTransitionAPIView.as_view(), name='grievance_transitions_api'),
+    path('api/grievances/export/<str:fmt>/', ExportAPIView.as_view(kind='grievances'), name='grievance_export_api'),
     path('api/grievances/<int:grievance_id>/respond/', GrievanceResponseAPIView.as_view(), name='grievance_response_api'),
     path('api/grievances/<int:pk>/status/', GrievanceStatusUpdateAPIView.as_view(), name='grievance_status_update_api'),
     path('api/user/profile/', UserProfileView.as_view(), name='user_profile'),
+    path('api/bulk/<str:kind>/', BulkIngestAPIView.as_view(), name='bulk_ingest_api'),
+    path('api/admin/feedback-spool/', FeedbackSpoolMetricsView.as_view(), name='feedback_spool_metrics'),
+    path('api/admin/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/async/states/', AsyncStateListView.as_view(), name='async_state_list'),
+    path('api/async/municipalities/', AsyncMunicipalityListView.as_view(), name='async_municipality_list'),
+    path('api/async/municipalities/<int:pk>/departments/', AsyncMunicipalityDepartmentsView.as_view(), name='async_municipality_departments'),
+    path('api/async/municipalities/<int:municipality_id>/departments/<int:department_id>/feedback/', AsyncFeedbackCreateView.as_view(), name='async_feedback_api'),
+    path('api/async/municipalities/<int:municipality_id>/departments/<int:department_id>/grievance/', AsyncGrievanceCreateView.as_view(), name='async_grievance_api'),
+    path('api/async/grievances/', AsyncGrievanceListView.as_view(), name='async_grievance_list_api'),
+    path('api/events/', AsyncGrievanceEventStreamView.as_view(), name='grievance_events'),
+    path('api/events/poll/', AsyncGrievanceEventPollView.as_view(), name='grievance_events_poll'),
+    path('api/async/user/profile/', AsyncUserProfileView.as_view(), name='async_user_profile'),
 ]
\ No newline at end of file
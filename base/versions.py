@@ -0,0 +1,65 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date
+
+# Change stamps for grievance lists, one per municipality (officials' view)
+# and one per user (citizens' view). Any write to a grievance or its responses
+# bumps both. Stamps expire after GRIEVANCE_VERSION_TTL so that, with a
+# per-process cache, another process's writes are picked up within that window.
+
+
+def _key(scope, ident):
+    return f'grievance-version:{scope}:{ident}'
+
+
+def _ttl():
+    return getattr(settings, 'GRIEVANCE_VERSION_TTL', 60)
+
+
+def bump_versions(municipality_ids=(), user_ids=()):
+    # Stamped once the surrounding transaction commits. Stamped before, a poll
+    # landing before the commit would read the old rows under the new stamp
+    # and then get 304s for them until the stamp expired.
+    keys = [_key('m', ident) for ident in set(municipality_ids) if ident is not None]
+    keys += [_key('u', ident) for ident in set(user_ids) if ident is not None]
+    if keys:
+        transaction.on_commit(partial(_stamp, keys))
+
+
+def _stamp(keys):
+    stamp = time.time()
+    cache.set_many(dict.fromkeys(keys, stamp), _ttl())
+
+
+def current_version(scope, ident):
+    key = _key(scope, ident)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time(), _ttl())
+        stamp = cache.get(key)
+    return stamp
+
+
+def validators(scope, ident, request):
+    # ETag covers the stamp plus everything else the body depends on; the
+    # Last-Modified date is withheld while the stamp's second is still open,
+    # since a later write in that second would share it.
+    stamp = current_version(scope, ident)
+    variant = hashlib.sha1(
+        '|'.join([request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]).encode('utf-8')
+    ).hexdigest()[:16]
+    etag = f'"grievances-{scope}{ident}-{int(stamp * 1000000)}-{variant}"'
+    last_modified = int(stamp) if int(stamp) < int(time.time()) else None
+    return etag, last_modified
+
+
+def apply_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,70 +1,250 @@
+import itertools
+import json
+
+from django.db.models import Q
+from django.utils.cache import get_conditional_response
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, generics, status
+from rest_framework.generics import get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.contrib.auth.models import Group
-from .models import State, Municipality, Feedback, Grievance, GrievanceResponse, CustomUser
+from .models import (
+    State, Municipality, Department, Feedback, FeedbackRollup, Grievance, GrievanceResponse, GrievanceStatusCount,
+    ArchivedGrievance, CustomUser,
+)
 from .serializers import (
-    StateSerializer, MunicipalitySerializer, FeedbackSerializer,
+    StateSerializer, MunicipalitySerializer, DepartmentSerializer, FeedbackSerializer,
     GrievanceSerializer, GrievanceResponseSerializer, CustomRegisterSerializer
 )
 from .permissions import IsOfficialForMunicipality
+from .roles import get_role
+from .pagination import KeysetPagination
+from .filters import (
+    GRIEVANCE_EXPANSIONS, date_param, expand_grievances, expand_param, fieldset_param,
+    filter_grievances, flag_param, int_param, only_fieldset, only_grievance_fieldset,
+)
+from .ingest import INGEST_TARGETS, ingest_ndjson
+from .spool import get_spool, write_behind_enabled
+from .rollups import summarize
+from .search import get_search_backend
+from .refcache import cached_response, reference_cache
+from .writer import serialized_write
+from .versions import apply_validators, validators
+from .profiling import ProfiledViewMixin, prometheus_text
+from .throttling import ThrottledViewMixin, rejections
+from .transitions import TransitionConflict, can_transition, ids_param, status_param, transition_grievances
+from .exports import ARCHIVE_MODELS, EXPORT_FIELDS, EXPORT_FORMATS, EXPORT_MODELS, export_rows, filter_export
+
+class FieldsetMixin:
+    # ?fields= and ?omit= for the response (see base.filters.fieldset_param).
+    def get_fieldset(self):
+        return fieldset_param(self.request.query_params, self.get_serializer_class())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_fieldset()
+        return context
 
-class CustomRegisterView(generics.CreateAPIView):
+class CustomRegisterView(ProfiledViewMixin, generics.CreateAPIView):
     serializer_class = CustomRegisterSerializer
 
-class StateViewSet(viewsets.ModelViewSet):
+class StateViewSet(ProfiledViewMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = State.objects.all()
     serializer_class = StateSerializer
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
-class MunicipalityViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        entry = reference_cache.get(
+            ('states', fieldset),
+            lambda: self.get_serializer(only_fieldset(self.filter_queryset(self.get_queryset()), fieldset), many=True).data,
+        )
+        return cached_response(request, entry)
+
+class MunicipalityViewSet(ProfiledViewMixin, FieldsetMixin, viewsets.ModelViewSet):
     queryset = Municipality.objects.all()
     serializer_class = MunicipalitySerializer
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        state_id = self.request.query_params.get('state')
-        if state_id:
+        state_id = int_param(self.request.query_params, 'state')
+        if state_id is not None:
             queryset = queryset.filter(state_id=state_id)
+        district_id = int_param(self.request.query_params, 'district')
+        if district_id is not None:
+            queryset = queryset.filter(district_id=district_id)
         return queryset
 
-class FeedbackAPIView(generics.CreateAPIView):
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        fieldset = self.get_fieldset()
+        entry = reference_cache.get(
+            ('municipalities', int_param(params, 'state'), int_param(params, 'district'), fieldset),
+            lambda: self.get_serializer(only_fieldset(self.filter_queryset(self.get_queryset()), fieldset), many=True).data,
+        )
+        return cached_response(request, entry)
+
+    @action(detail=True)
+    def departments(self, request, pk=None):
+        try:
+            municipality_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        fieldset = fieldset_param(request.query_params, DepartmentSerializer)
+
+        def load():
+            if not Municipality.objects.filter(pk=municipality_id).exists():
+                return None
+            departments = Department.objects.filter(municipalities=municipality_id).order_by('name', 'id')
+            departments = only_fieldset(departments, fieldset)
+            return DepartmentSerializer(departments, many=True, context={'fields': fieldset}).data
+
+        response = cached_response(request, reference_cache.get(('departments', municipality_id, fieldset), load))
+        if response is None:
+            raise NotFound()
+        return response
+
+class FeedbackAPIView(ProfiledViewMixin, ThrottledViewMixin, FieldsetMixin, generics.CreateAPIView):
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
     permission_classes = [IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        if not write_behind_enabled():
+            return super().create(request, *args, **kwargs)
+        # Write-behind: acknowledge once the record is durable in the local
+        # spool; the flusher inserts it into Feedback shortly after.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        provisional_id = get_spool().append({
+            'user_id': request.user.pk,
+            'municipality_id': data['municipality'].pk,
+            'department_id': data['department'].pk,
+            'rating': data['rating'],
+            'comment': data['comment'],
+        })
+        return Response(
+            dict(serializer.data, id=None, user=request.user.pk, provisional_id=provisional_id),
+            status=status.HTTP_202_ACCEPTED,
+        )
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # One transaction keeps the rating rollup in step with the insert
+        serialized_write(serializer.save, user_id=self.request.user.pk)
 
-class GrievanceAPIView(generics.CreateAPIView):
+class GrievanceAPIView(ProfiledViewMixin, ThrottledViewMixin, FieldsetMixin, generics.CreateAPIView):
     queryset = Grievance.objects.all()
     serializer_class = GrievanceSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # One transaction commits the search entry and duplicate link with the row
+        serialized_write(serializer.save, user_id=self.request.user.pk)
+
+def scoped_grievances(request, model=Grievance):
+    # model=ArchivedGrievance for the archive
+    role = get_role(request)
+    if role.is_official and role.municipality_id:
+        return model.objects.filter(municipality_id=role.municipality_id)
+    return model.objects.filter(user_id=request.user.pk)  # Citizens see their own grievances
 
-class GrievanceListAPIView(generics.ListAPIView):
+def scoped_municipality(request):
+    # The municipality an aggregate view reports on: ?municipality= for
+    # admins, the official's own for officials (who may not ask for another).
+    requested = int_param(request.query_params, 'municipality')
+    role = get_role(request)
+    if request.user.is_staff:
+        municipality_id = requested or role.municipality_id
+        if municipality_id is None:
+            raise ValidationError({'municipality': 'This parameter is required.'})
+        return municipality_id
+    if not (role.is_official and role.municipality_id):
+        raise PermissionDenied('Only officials and administrators can read municipality figures.')
+    if requested is not None and requested != role.municipality_id:
+        raise PermissionDenied('Officials can only read their own municipality.')
+    return role.municipality_id
+
+class GrievanceListAPIView(ProfiledViewMixin, FieldsetMixin, generics.ListAPIView):
     serializer_class = GrievanceSerializer
     permission_classes = [IsOfficialForMunicipality]
+    pagination_class = KeysetPagination  # Opt-in with ?page_size= or ?cursor=
+    replica_reads = True  # A lagging replica is bounded by GRIEVANCE_VERSION_TTL for pollers
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.groups.filter(name='Officials').exists() and user.municipality:
-            return Grievance.objects.filter(municipality=user.municipality)
-        return Grievance.objects.filter(user=user)  # Citizens see their own grievances
+    def get_queryset(self, model=Grievance):
+        params = self.request.query_params
+        expand = expand_param(params)
+        queryset = expand_grievances(filter_grievances(scoped_grievances(self.request, model), params), expand)
+        return only_grievance_fieldset(queryset, self.get_fieldset(), expand)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = expand_param(self.request.query_params)
+        return context
+
+    def list(self, request, *args, **kwargs):
+        # Answer conditional polls from the change stamp without running the list query.
+        role = get_role(request)
+        if role.is_official and role.municipality_id:
+            etag, last_modified = validators('m', role.municipality_id, request)
+        else:
+            etag, last_modified = validators('u', request.user.pk, request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return apply_validators(not_modified, etag, last_modified)
+        if flag_param(request.query_params, 'include_archived'):
+            return apply_validators(self.list_with_archive(request), etag, last_modified)
+        return apply_validators(super().list(request, *args, **kwargs), etag, last_modified)
+
+    def list_with_archive(self, request):
+        # ?include_archived=true: archived grievances too, flagged `archived`.
+        querysets = [self.get_queryset(), self.get_queryset(ArchivedGrievance)]
+        page = self.paginator.paginate_querysets(querysets, request, self)
+        rows = page if page is not None else sorted(itertools.chain(*querysets), key=lambda row: row.pk)
+        data = self.get_serializer(rows, many=True).data
+        for row, item in zip(rows, data):
+            item['archived'] = isinstance(row, ArchivedGrievance)
+        return self.get_paginated_response(data) if page is not None else Response(data)
+
+class GrievanceDetailAPIView(ProfiledViewMixin, FieldsetMixin, generics.RetrieveAPIView):
+    serializer_class = GrievanceSerializer
+    permission_classes = [IsOfficialForMunicipality]
+
+    def get_queryset(self, model=Grievance):
+        queryset = expand_grievances(scoped_grievances(self.request, model), GRIEVANCE_EXPANSIONS)
+        return only_grievance_fieldset(queryset, self.get_fieldset(), GRIEVANCE_EXPANSIONS)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = GRIEVANCE_EXPANSIONS
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pass
+        # Archived grievances keep their ids, so links to them still work
+        instance = get_object_or_404(self.get_queryset(ArchivedGrievance), pk=kwargs['pk'])
+        self.check_object_permissions(request, instance)
+        return Response(dict(self.get_serializer(instance).data, archived=True))
 
-class GrievanceResponseAPIView(generics.CreateAPIView):
+class GrievanceResponseAPIView(ProfiledViewMixin, ThrottledViewMixin, generics.CreateAPIView):
     queryset = GrievanceResponse.objects.all()
     serializer_class = GrievanceResponseSerializer
     permission_classes = [IsOfficialForMunicipality]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serialized_write(serializer.save, user_id=self.request.user.pk)
 
-class GrievanceStatusUpdateAPIView(generics.UpdateAPIView):
+class GrievanceStatusUpdateAPIView(ProfiledViewMixin, generics.UpdateAPIView):
     queryset = Grievance.objects.all()
     serializer_class = GrievanceSerializer
     permission_classes = [IsOfficialForMunicipality]
@@ -72,22 +252,302 @@ class GrievanceStatusUpdateAPIView(generics.UpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance, data={'status': request.data.get('status')}, partial=True)
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-        return Response(serializer.data)
+        new_status = status_param(request.data)
+        if new_status == instance.status:
+            return Response(self.get_serializer(instance).data)  # Retries of a PATCH that already applied
+        if not can_transition(instance.status, new_status):
+            raise ValidationError({'status': f'Cannot move a grievance from {instance.status} to {new_status}.'})
+        result = serialized_write(transition_grievances, [instance.pk], new_status, request.user.pk, instance.municipality_id)
+        if not result.transitions:
+            raise TransitionConflict()
+        instance.status = new_status
+        return Response(self.get_serializer(instance).data)
+
+class GrievanceTransitionAPIView(ProfiledViewMixin, ThrottledViewMixin, APIView):
+    # POST {"ids": [...], "status": "..."}: moves the official's grievances
+    # along base.transitions.TRANSITIONS with one UPDATE and one audit insert.
+    # Ids outside their municipality or whose status cannot move there are
+    # reported back rather than failing the request.
+    permission_classes = [IsOfficialForMunicipality]
 
-class UserProfileView(APIView):
+    def post(self, request):
+        role = get_role(request)
+        new_status = status_param(request.data)
+        ids = ids_param(request.data)
+        result = serialized_write(transition_grievances, ids, new_status, request.user.pk, role.municipality_id)
+        return Response({
+            'status': new_status,
+            'updated': len(result.transitions),
+            'ids': [transition.grievance_id for transition in result.transitions],
+            'not_found': result.not_found,
+            'not_allowed': result.not_allowed,
+        })
+
+class UserProfileView(ProfiledViewMixin, APIView):
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
     def get(self, request):
         user = request.user
-        is_official = user.groups.filter(name='Officials').exists()
+        role = get_role(request)
         data = {
             'username': user.username,
             'email': user.email,
-            'is_official': is_official,
-            'municipality': user.municipality.id if user.municipality else None,
-            'municipality_name': user.municipality.name if user.municipality else None,
+            'is_official': role.is_official,
+            'municipality': role.municipality_id,
+            'municipality_name': role.municipality_name,
         }
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+class BulkIngestAPIView(ProfiledViewMixin, ThrottledViewMixin, APIView):
+    # POST NDJSON, one FeedbackSerializer/GrievanceSerializer payload per line.
+    # Responds with one NDJSON result per input line as the batches commit.
+    permission_classes = [IsOfficialForMunicipality]
+
+    def post(self, request, kind):
+        if kind not in INGEST_TARGETS:
+            raise NotFound(f'Unknown record type "{kind}".')
+        batch_size = request.query_params.get('batch_size')
+        try:
+            batch_size = int(batch_size) if batch_size else None
+        except ValueError:
+            raise ValidationError({'batch_size': 'Batch size must be an integer.'})
+        if batch_size is not None and batch_size <= 0:
+            raise ValidationError({'batch_size': 'Batch size must be positive.'})
+
+        stream = request.stream
+        lines = iter(stream.readline, b'') if stream is not None else iter(())
+        results = ingest_ndjson(
+            kind, lines, request.user.pk,
+            batch_size=batch_size,
+            municipality_id=get_role(request).municipality_id,
+        )
+        return StreamingHttpResponse(
+            (json.dumps(result) + '\n' for result in results),
+            content_type='application/x-ndjson',
+        )
+
+
+class FeedbackSpoolMetricsView(ProfiledViewMixin, APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if not write_behind_enabled():
+            return Response({'enabled': False})
+        return Response(get_spool().metrics())
+
+
+class MetricsView(ProfiledViewMixin, APIView):
+    # Prometheus scrape target: per-route latency, phase and query metrics
+    # from ProfilingMiddleware (REQUEST_PROFILING), throttling rejections and
+    # feedback spool state.
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        extra = {
+            'fng_throttled_requests_total': (
+                'counter', 'Requests rejected by submission throttling, by route and scope.',
+                {(('route', route), ('scope', scope)): count for (route, scope), count in rejections().items()},
+            ),
+        }
+        if write_behind_enabled():
+            spool = get_spool().metrics()
+            extra.update({
+                'fng_feedback_spool_queue_depth': ('gauge', 'Feedback records waiting in the spool.', spool['queue_depth']),
+                'fng_feedback_spool_pending_segments': ('gauge', 'Spool segment files not yet flushed.', spool['pending_segments']),
+                'fng_feedback_spool_flushed_total': ('counter', 'Feedback records flushed to the database.', spool['flushed_total']),
+                'fng_feedback_spool_flushes_total': ('counter', 'Spool segment flushes.', spool['flush_count']),
+                'fng_feedback_spool_failed_records_total': (
+                    'counter', 'Spooled feedback records the database rejected, set aside in .failed files.', spool['failed_records'],
+                ),
+                'fng_feedback_spool_last_flush_seconds': ('gauge', 'Duration of the last spool flush.', spool['last_flush_seconds']),
+            })
+        return HttpResponse(prometheus_text(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class FeedbackStatsAPIView(ProfiledViewMixin, APIView):
+    # Rating count, mean, variance and histogram from the daily rollups for
+    # the official's municipality (admins pick one with ?municipality=);
+    # ?department=, ?start= and ?end= (inclusive ISO dates) narrow the range.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        municipality_id = scoped_municipality(request)
+        rollups = FeedbackRollup.objects.filter(municipality_id=municipality_id)
+        department_id = int_param(params, 'department')
+        if department_id is not None:
+            rollups = rollups.filter(department_id=department_id)
+        start, end = date_param(params, 'start'), date_param(params, 'end')
+        if start:
+            rollups = rollups.filter(day__gte=start)
+        if end:
+            rollups = rollups.filter(day__lte=end)
+
+        data = summarize(rollups.only('count', 'rating_sum', 'rating_sum_sq', 'histogram'))
+        data.update(municipality=municipality_id, department=department_id, start=start, end=end)
+        return Response(data)
+
+
+class GrievanceDashboardAPIView(ProfiledViewMixin, APIView):
+    # Grievance counts per department and status, read from the counters
+    # base.counters keeps: one indexed query however many grievances there
+    # are. Officials see their municipality, admins pick one with
+    # ?municipality=; ?department= narrows it to one department.
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        municipality_id = scoped_municipality(request)
+        department_id = int_param(params, 'department')
+        etag, last_modified = validators('m', municipality_id, request)  # Bumped by every grievance write
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return apply_validators(not_modified, etag, last_modified)
+
+        counters = GrievanceStatusCount.objects.filter(municipality_id=municipality_id)
+        if department_id is not None:
+            counters = counters.filter(department_id=department_id)
+        statuses = [value for value, _ in Grievance._meta.get_field('status').choices]
+        totals = dict.fromkeys(statuses, 0)
+        departments = {}
+        for dept_id, name, status_value, count in counters.values_list('department_id', 'department__name', 'status', 'count'):
+            if not count:
+                continue
+            if dept_id not in departments:
+                departments[dept_id] = {'department': dept_id, 'department_name': name, 'counts': dict.fromkeys(statuses, 0)}
+            departments[dept_id]['counts'][status_value] = count
+            totals[status_value] = totals.get(status_value, 0) + count
+        rows = sorted(departments.values(), key=lambda row: (row['department_name'], row['department']))
+        for row in rows:
+            row['total'] = sum(row['counts'].values())
+        return apply_validators(Response({
+            'municipality': municipality_id,
+            'department': department_id,
+            'totals': totals,
+            'total': sum(totals.values()),
+            'departments': rows,
+        }), etag, last_modified)
+
+
+class ExportAPIView(ProfiledViewMixin, APIView):
+    # Streams every matching row as CSV or NDJSON with flat memory use.
+    # Officials export their municipality, citizens their own records;
+    # ?include_archived=true adds archived grievances.
+    permission_classes = [IsAuthenticated]
+    kind = 'grievances'
+
+    def get(self, request, fmt):
+        if fmt not in EXPORT_FORMATS:
+            raise NotFound(f'Unknown export format "{fmt}".')
+        role = get_role(request)
+        params = request.query_params
+        models = [EXPORT_MODELS[self.kind]]
+        if self.kind in ARCHIVE_MODELS and flag_param(params, 'include_archived'):
+            models.append(ARCHIVE_MODELS[self.kind])  # Archived rows follow the live ones
+        querysets = []
+        for model in models:
+            queryset = model.objects.all()
+            if role.is_official and role.municipality_id:
+                queryset = queryset.filter(municipality_id=role.municipality_id)
+            else:
+                queryset = queryset.filter(user_id=request.user.pk)
+            querysets.append(filter_export(self.kind, queryset, params))
+
+        render_lines, content_type = EXPORT_FORMATS[fmt]
+        fields = EXPORT_FIELDS[self.kind]
+        rows = itertools.chain.from_iterable(export_rows(queryset, fields) for queryset in querysets)
+        response = StreamingHttpResponse(render_lines(fields, rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.kind}.{fmt}"'
+        return response
+
+
+class GrievanceSearchAPIView(ProfiledViewMixin, APIView):
+    # ?q= keywords, BM25-ranked over title and description; the last word
+    # (or any word ending in *) matches as a prefix. Paged with ?page=.
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        page = int_param(request.query_params, 'page') or 1
+        page_size = min(int_param(request.query_params, 'page_size') or self.page_size, self.max_page_size)
+        if page < 1 or page_size < 1:
+            raise ValidationError({'page': 'Page and page size must be positive.'})
+
+        role = get_role(request)
+        scope = {'municipality_id': role.municipality_id} if role.is_official and role.municipality_id else {'user_id': request.user.pk}
+        hits = get_search_backend().search(query, limit=page_size + 1, offset=(page - 1) * page_size, **scope)
+        has_next = len(hits) > page_size
+        hits = hits[:page_size]
+
+        grievances = Grievance.objects.in_bulk([pk for pk, _ in hits])
+        results = []
+        for pk, score in hits:
+            if pk in grievances:
+                results.append(dict(GrievanceSerializer(grievances[pk]).data, score=score))
+        return Response({
+            'page': page,
+            'next': page + 1 if has_next else None,
+            'results': results,
+        })
+
+
+class DuplicateGroupsAPIView(ProfiledViewMixin, APIView):
+    # Open duplicate groups in the official's municipality: each canonical
+    # grievance with the grievances linked to it.
+    permission_classes = [IsOfficialForMunicipality]
+
+    def get(self, request):
+        role = get_role(request)
+        if not (role.is_official and role.municipality_id):
+            return Response([])
+        duplicates = (
+            Grievance.objects
+            .filter(municipality_id=role.municipality_id, duplicate_of__isnull=False)
+            .exclude(status__in=['RESOLVED', 'CLOSED'])
+            .order_by('duplicate_of_id', 'id')
+        )
+        groups = {}
+        for duplicate in duplicates:
+            groups.setdefault(duplicate.duplicate_of_id, []).append(duplicate)
+        canonicals = Grievance.objects.in_bulk(list(groups))
+        return Response([
+            {
+                'canonical': GrievanceSerializer(canonicals[pk]).data,
+                'duplicates': GrievanceSerializer(members, many=True).data,
+            }
+            for pk, members in groups.items() if pk in canonicals
+        ])
+
+class DuplicateGroupResolveAPIView(ProfiledViewMixin, APIView):
+    # Sets one status on a canonical grievance and all of its duplicates with a
+    # single bulk transition.
+    permission_classes = [IsOfficialForMunicipality]
+
+    def post(self, request, pk):
+        role = get_role(request)
+        new_status = request.data.get('status')
+        if new_status not in {'IN_PROGRESS', 'RESOLVED', 'CLOSED'}:
+            raise ValidationError({'status': 'Must be one of IN_PROGRESS, RESOLVED or CLOSED.'})
+        canonical = Grievance.objects.filter(pk=pk, municipality_id=role.municipality_id).only('id', 'duplicate_of_id').first()
+        if canonical is None:
+            raise NotFound()
+        root = canonical.duplicate_of_id or canonical.pk
+
+        def resolve():
+            group = Grievance.objects.filter(Q(pk=root) | Q(duplicate_of_id=root), municipality_id=role.municipality_id)
+            ids = list(group.values_list('id', flat=True))
+            return ids, transition_grievances(ids, new_status, request.user.pk, role.municipality_id)
+
+        ids, result = serialized_write(resolve)
+        return Response({
+            'canonical': root,
+            'status': new_status,
+            'updated': len(result.transitions),
+            'ids': ids,
+            'not_allowed': result.not_allowed,
+        })
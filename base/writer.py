@@ -0,0 +1,68 @@
+import contextlib
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# SQLite allows one writer at a time. Writes in this process queue on one lock
+# instead of racing for the database lock, and each runs in an IMMEDIATE
+# transaction (see DATABASES) so it never has to upgrade a read lock, which is
+# what fails with "database is locked" straight away. Other processes are
+# covered by busy_timeout and the bounded retry below.
+_lock = threading.RLock()
+
+
+class DatabaseBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The database is busy, please retry.'
+    default_code = 'database_busy'
+
+
+def _serialize():
+    return connection.vendor == 'sqlite'
+
+
+@contextlib.contextmanager
+def writer_lock():
+    if not _serialize():
+        yield
+        return
+    if not _lock.acquire(timeout=getattr(settings, 'DB_WRITE_LOCK_TIMEOUT', 10)):
+        raise DatabaseBusy()
+    try:
+        yield
+    finally:
+        _lock.release()
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def serialized_write(func, *args, **kwargs):
+    # Runs func in its own transaction on the writer path, retrying lock
+    # errors DB_WRITE_RETRIES times with jittered exponential backoff.
+    retries = getattr(settings, 'DB_WRITE_RETRIES', 3)
+    delay = getattr(settings, 'DB_WRITE_RETRY_DELAY', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            with writer_lock(), transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            if not _is_lock_error(exc) or connection.in_atomic_block:
+                raise  # The caller's transaction is already broken; let it roll back
+            if attempt == retries:
+                raise DatabaseBusy() from exc
+        time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+async def aserialized_write(func, *args, **kwargs):
+    # serialized_write for async views. The write and its signal handlers run
+    # on the thread that owns the connection, inside the same transaction.
+    return await sync_to_async(serialized_write)(func, *args, **kwargs)